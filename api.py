@@ -1,14 +1,35 @@
+import time
+
+# Startup metrics are measured from the moment this module starts importing
+_import_started = time.perf_counter()
+
 import os
 import logging
 import requests
 import json
-from datetime import datetime
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+from fastapi import FastAPI, HTTPException, Header, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import asyncio
 
+import core
+from config import cfg as analysis_cfg
+from paper import PaperEngine, PaperInbox
+import streaming
+import leader
+import snapshot
+from pubsub import SignalHub, SIGNALS_TOPIC, parse_topics
+from delivery import DeliveryStore, DeliveryWorker, PermanentDeliveryError
+import shared_cache
+import backtest
+import model
+import jobs
+import formats
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,6 +41,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+startup_metrics = {
+    "import_seconds": None,
+    "startup_seconds": None,
+    "first_healthy_seconds": None,
+    "first_signal_seconds": None,
+    "first_warm_signal_seconds": None,
+    "snapshot": None,
+}
+
+def _since_import() -> float:
+    return round(time.perf_counter() - _import_started, 4)
+
+# Latest analysis result per "PAIR:tf", persisted in the warm-start snapshot; with the
+# shared cache on, the copy every worker reads lives in signal_relay
+latest_signals: Dict[str, Any] = {}
+
+# Push subscribers (WebSocket/SSE) for analysis results and signals
+signal_hub = SignalHub()
+signal_relay = None  # shared_cache.SignalRelay, set with the shared cache below
+
+def push(topic: str, message):
+    """Send a message to this worker's push subscribers and, via the relay, every other worker's"""
+    signal_hub.publish(topic, message)
+    if signal_relay is not None:
+        signal_relay.publish(topic, message)
+
+def record_signal(result: dict, warm: bool = False):
+    """Remember the latest result, push it if new, and note the first (warm) signal served"""
+    if "error" in result:
+        return
+    topic = f"{result['pair']}:{result['timeframe']}"
+    previous = latest_signals.get(topic)
+    latest_signals[topic] = result
+    if signal_relay is not None and result != previous:
+        signal_relay.record(topic, result)
+    if (previous is None or previous.get("bar_time") != result.get("bar_time")
+            or previous.get("direction") != result.get("direction")):
+        # Every worker analyzing this bar gets here; only the first one pushes it
+        if signal_relay is None or signal_relay.claim_push(topic, result.get("bar_time"), result.get("direction")):
+            push(topic, build_analysis_response(result))
+    if startup_metrics["first_signal_seconds"] is None:
+        startup_metrics["first_signal_seconds"] = _since_import()
+    if warm and startup_metrics["first_warm_signal_seconds"] is None:
+        startup_metrics["first_warm_signal_seconds"] = _since_import()
+
+def shared_latest_signals() -> dict:
+    """Latest result per topic across workers (blocking); this worker's own when the relay is off or down"""
+    if signal_relay is None:
+        return dict(latest_signals)
+    try:
+        return dict(latest_signals, **signal_relay.latest())
+    except Exception as e:
+        logger.error(f"Shared latest signals unavailable: {str(e)}")
+        return dict(latest_signals)
+
 # Configuration class for reading environment variables
 class Config:
     def __init__(self):
@@ -48,7 +124,8 @@ config = Config()
 app = FastAPI(
     title="AI Forex Bot API",
     description="FastAPI endpoints for AI-powered forex trading bot with Telegram alerts",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=formats.FastJSONResponse
 )
 
 # Add CORS middleware
@@ -58,6 +135,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Pydantic models
@@ -69,11 +147,29 @@ class ForexSignal(BaseModel):
     timestamp: Optional[str] = None
     stop_loss: Optional[float] = None
     take_profit: Optional[float] = None
+    timeframe: Optional[str] = None  # used to match subscriber timeframe filters
 
 class TelegramAlert(BaseModel):
     message: str
     priority: Optional[str] = "normal"  # low, normal, high, urgent
 
+class Subscription(BaseModel):
+    chat_id: str
+    pairs: List[str] = ["*"]
+    timeframes: List[str] = ["*"]
+    min_confidence: float = 0.0  # 0-1, same scale as ForexSignal.confidence
+
+class BacktestSpec(BaseModel):
+    pairs: Optional[List[str]] = None  # default: all configured pairs
+    tf: str = "5m"
+    lookback: Optional[str] = None     # live data source history, e.g. "30d"
+    file: Optional[str] = None         # recorded bar file under JOBS_HISTORY_DIR instead
+    window: int = 500                  # bars of history scored at each step
+    risk: Dict[str, float] = {}        # overrides of config RISK
+
+class SweepSpec(BacktestSpec):
+    grid: Dict[str, List[float]]       # RISK setting -> values to try, e.g. {"atr_tp_mult": [2, 3, 4]}
+
 class HealthCheck(BaseModel):
     status: str
     timestamp: str
@@ -86,22 +182,32 @@ class TelegramService:
         self.chat_id = chat_id
         self.base_url = f"https://api.telegram.org/bot{bot_token}"
     
-    async def send_message(self, message: str, parse_mode: str = "HTML") -> bool:
-        """Send message to Telegram chat"""
+    async def send_message(self, message: str, parse_mode: str = "HTML", chat_id: str = None,
+                           raise_permanent: bool = False) -> bool:
+        """Send message to a Telegram chat (the configured one by default).
+
+        With raise_permanent, a 4xx answer other than 429 (chat not found, bot
+        blocked, bad markup) raises PermanentDeliveryError instead of returning False.
+        """
         try:
             url = f"{self.base_url}/sendMessage"
             payload = {
-                "chat_id": self.chat_id,
+                "chat_id": chat_id or self.chat_id,
                 "text": message,
                 "parse_mode": parse_mode
             }
             
-            response = requests.post(url, json=payload, timeout=10)
+            # Run the blocking HTTP call off the event loop
+            response = await asyncio.to_thread(requests.post, url, json=payload, timeout=10)
+            if raise_permanent and 400 <= response.status_code < 500 and response.status_code != 429:
+                raise PermanentDeliveryError(f"HTTP {response.status_code}: {response.text[:200]}")
             response.raise_for_status()
             
             logger.info(f"Telegram message sent successfully")
             return True
             
+        except PermanentDeliveryError:
+            raise
         except Exception as e:
             logger.error(f"Failed to send Telegram message: {str(e)}")
             return False
@@ -125,18 +231,225 @@ class TelegramService:
         
         return message
 
+def build_analysis_response(result: dict) -> dict:
+    """Shape an analyze_pair_tf result for /analyze clients (Telegram bot, n8n)"""
+    if "error" in result:
+        return result
+    return {
+        "pair": result["pair"],
+        "timeframe": result["timeframe"],
+        "current_price": result["entry"],
+        "timestamp": datetime.fromtimestamp(result["bar_time"], tz=timezone.utc).isoformat(),
+        "analysis": {
+            "direction": result["direction"],
+            "confidence": result["confidence"],
+            "model_confidence": result.get("model_confidence"),
+            "indicators": result["indicators"],
+            "levels": result.get("levels", {}),
+            "entry_price": result["entry"],
+            "stop_loss": result["stop_loss"],
+            "take_profit": result["take_profit"],
+            "sl_pips": result["sl_pips"],
+            "tp_pips": result["tp_pips"],
+            "risk_reward": result["rr"],
+            "reasons": result["reasons"],
+        },
+    }
+
+# Conditional GET: analysis only changes when the bars or the config change
+ANALYSIS_CONFIG_HASH = hashlib.sha1(json.dumps(
+    dict({k: analysis_cfg[k] for k in ("risk", "thresholds")},
+         model=dict(analysis_cfg["model"], version=model.fingerprint(analysis_cfg["model"]["path"]))),
+    sort_keys=True
+).encode()).hexdigest()[:12]
+
+def analysis_etag(pair: str, tf: str, bars) -> str:
+    """Weak ETag for (pair, tf, last bar, config hash).
+
+    The last bar is still forming, so its high/low/close are part of the tag
+    along with its timestamp: every price update yields a new tag.
+    """
+    i = len(bars) - 1
+    raw = (f"{pair.upper()}|{tf.lower()}|{int(bars.time[i])}|{float(bars.high[i])!r}|"
+           f"{float(bars.low[i])!r}|{float(bars.close[i])!r}|{ANALYSIS_CONFIG_HASH}")
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+def combined_etag(etags: list) -> str:
+    """Weak ETag of a multi-pair response, from the per-pair tags in request order"""
+    return 'W/"' + hashlib.sha1("|".join(etags).encode()).hexdigest()[:20] + '"'
+
+def parse_if_none_match(header: Optional[str]) -> set:
+    """Opaque tags from an If-None-Match header (weak comparison, so W/ is dropped)"""
+    if not header:
+        return set()
+    tags = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.add(tag)
+    return tags
+
+def etag_matches(etag: str, tags: set) -> bool:
+    return "*" in tags or etag[2:] in tags
+
+def analyze_with_etag(pair: str, tf: str) -> tuple:
+    """Fetch bars once; return (bars, etag) so callers can skip unchanged analyses"""
+    bars = core.get_bars(pair, tf)
+    etag = analysis_etag(pair, tf, bars) if len(bars) else None
+    return bars, etag
+
+# Bars, analyses, latest signals and push messages shared across worker processes (SHARED_CACHE_URL)
+try:
+    core.SHARED_CACHE = shared_cache.cache_from_url(analysis_cfg["shared_cache"]["url"])
+    if core.SHARED_CACHE is not None:
+        signal_relay = shared_cache.SignalRelay(core.SHARED_CACHE.backend)
+except Exception as e:
+    logger.error(f"Shared cache disabled: {str(e)}")
+
+def encode_analysis(result: dict):
+    # Per-pair failures are retried by the next request, not shared for the TTL
+    return None if "error" in result else shared_cache.encode_json(result)
+
+def analyze_shared(items: list) -> list:
+    """core.analyze_batch over [(pair, tf, bars, etag)] as one model batch.
+
+    With the shared cache on, each (pair, tf, last bar) is computed once across
+    workers; the ETag already identifies it together with the config.
+    """
+    def compute(indexes):
+        return core.analyze_batch([items[i][:3] for i in indexes], analysis_cfg)
+    
+    if core.SHARED_CACHE is None:
+        return compute(range(len(items)))
+    results = [None] * len(items)
+    keyed = [i for i, item in enumerate(items) if item[3] is not None]
+    shared = core.SHARED_CACHE.get_or_compute_many(
+        [f"analysis:{items[i][3][3:-1]}" for i in keyed], analysis_cfg["shared_cache"]["analysis_ttl"],
+        lambda indexes: compute([keyed[j] for j in indexes]),
+        encode_analysis, shared_cache.decode_json)
+    for i, result in zip(keyed, shared):
+        results[i] = result
+    rest = [i for i, item in enumerate(items) if item[3] is None]
+    for i, result in zip(rest, compute(rest)):
+        results[i] = result
+    return results
+
 # Initialize Telegram service
 telegram_service = None
 if config.telegram_bot_token and config.telegram_chat_id:
     telegram_service = TelegramService(config.telegram_bot_token, config.telegram_chat_id)
 
-# Background task for sending alerts
-async def send_telegram_alert(message: str):
-    """Background task to send Telegram alerts"""
-    if telegram_service:
-        await telegram_service.send_message(message)
+# Subscriber registry and durable alert queue, drained by delivery_worker in the one
+# API worker holding the "delivery" role
+delivery_store = None
+delivery_task = None
+if telegram_service:
+    delivery_store = DeliveryStore(analysis_cfg["delivery"]["db_path"])
+    delivery_store.ensure_subscriber(config.telegram_chat_id)
+
+# Paper-trading engine fed by analysis results. It lives in memory in the one worker
+# holding the "paper" role; the others hand their results over through the inbox
+paper_cfg = analysis_cfg["paper"]
+paper_engine = None    # set while this worker owns the engine
+paper_view = None      # read-only copy of the owner's state for the other workers
+paper_task = None
+paper_inbox = PaperInbox(paper_cfg["state_path"] + ".inbox") if paper_cfg["enabled"] else None
+
+def track_paper_trade(result: dict, bars=None):
+    """Resolve open paper positions on the bars since the last poll, then open one for a BUY/SELL result"""
+    if paper_inbox is None or "error" in result:
+        return
+    try:
+        if bars is None:
+            bars = core.get_bars(result["pair"], result["timeframe"])
+        engine = paper_engine
+        if engine is None:
+            paper_inbox.submit(result, bars)
+            return
+        if len(bars):
+            engine.on_bars(result["pair"], result["timeframe"], bars.time, bars.high, bars.low)
+        engine.open_from_signal(result)
+    except Exception as e:
+        logger.error(f"Paper trading update failed for {result['pair']}: {str(e)}")
+
+def apply_paper_inbox(engine: PaperEngine):
+    """Feed the results other workers handed over to the engine (owner only)"""
+    for entry in paper_inbox.drain():
+        result = entry["result"]
+        try:
+            engine.on_bars(result["pair"], result["timeframe"], entry["time"], entry["high"], entry["low"])
+            engine.open_from_signal(result)
+        except Exception as e:
+            logger.error(f"Paper trading update failed for {result['pair']}: {str(e)}")
+
+async def run_paper_engine():
+    """Load the engine and apply inbox entries until cancelled (the "paper" role)"""
+    global paper_engine
+    engine = await asyncio.to_thread(
+        PaperEngine, paper_cfg["state_path"], paper_cfg["trades_path"], paper_cfg["save_interval"])
+    paper_engine = engine
+    try:
+        while True:
+            await asyncio.to_thread(apply_paper_inbox, engine)
+            await asyncio.sleep(paper_cfg["poll_interval"])
+    finally:
+        paper_engine = None
+        engine.save()
+
+def paper_state() -> PaperEngine:
+    """The engine when this worker owns it, otherwise the owner's last journaled state"""
+    global paper_view
+    if paper_engine is not None:
+        return paper_engine
+    if paper_view is None:
+        paper_view = PaperEngine(paper_cfg["state_path"])
     else:
-        logger.warning("Telegram service not configured, alert not sent")
+        paper_view.reload_if_changed()
+    return paper_view
+
+# Streaming pipeline (STREAM_FEED set): run by the one worker holding the "stream" role
+stream_pipeline = None
+stream_task = None
+
+def on_stream_signal(result: dict, bars):
+    """Listener for bar-close analysis results from the streaming pipeline (executor thread)"""
+    record_signal(result, warm=True)
+    track_paper_trade(result, bars)
+
+async def run_stream_pipeline():
+    """Connect the configured feed and analyze every closed bar (the "stream" role)"""
+    global stream_pipeline
+    stream_cfg = analysis_cfg["stream"]
+    pipeline = streaming.StreamingPipeline(
+        streaming.feed_from_spec(stream_cfg["feed"], stream_cfg["speed"]), analysis_cfg)
+    pipeline.add_listener(on_stream_signal)
+    if stream_cfg["seed_history"]:
+        await asyncio.to_thread(pipeline.seed_from_history, analysis_cfg["pairs"])
+    stream_pipeline = pipeline
+    logger.info(f"Streaming ingestion started from {stream_cfg['feed']}")
+    await pipeline.run()
+
+async def send_via_telegram(message: str, parse_mode: str, chat_id: str) -> bool:
+    """Sender used by the delivery worker"""
+    return await telegram_service.send_message(message, parse_mode, chat_id=chat_id, raise_permanent=True)
+
+def make_delivery_worker() -> DeliveryWorker:
+    delivery_cfg = analysis_cfg["delivery"]
+    return DeliveryWorker(delivery_store, send_via_telegram, rate=delivery_cfg["rate"],
+                          per_chat_interval=delivery_cfg["per_chat_interval"],
+                          concurrency=delivery_cfg["concurrency"],
+                          max_attempts=delivery_cfg["max_attempts"])
+delivery_worker = None
+
+async def run_delivery_worker():
+    """Drain the delivery queue (the "delivery" role: one rate limit for all workers)"""
+    global delivery_worker
+    delivery_worker = make_delivery_worker()
+    pending = await asyncio.to_thread(delivery_store.pending)
+    logger.info(f"Telegram delivery worker started ({pending} alerts pending)")
+    await delivery_worker.run()
 
 # API Endpoints
 @app.get("/", response_model=HealthCheck)
@@ -153,6 +466,8 @@ async def root():
 async def health_check():
     """Detailed health check"""
     logger.info("Detailed health check requested")
+    if startup_metrics["first_healthy_seconds"] is None:
+        startup_metrics["first_healthy_seconds"] = _since_import()
     return HealthCheck(
         status="healthy",
         timestamp=datetime.now().isoformat(),
@@ -160,7 +475,7 @@ async def health_check():
     )
 
 @app.post("/forex/signal")
-async def create_forex_signal(signal: ForexSignal, background_tasks: BackgroundTasks):
+async def create_forex_signal(signal: ForexSignal):
     """Create and process a new forex signal"""
     try:
         logger.info(f"Received forex signal: {signal.pair} - {signal.action} at {signal.price}")
@@ -169,19 +484,23 @@ async def create_forex_signal(signal: ForexSignal, background_tasks: BackgroundT
         if not signal.timestamp:
             signal.timestamp = datetime.now().isoformat()
         
-        # Format and send Telegram alert
-        if telegram_service:
+        # Queue the Telegram alert for every matching subscriber
+        recipients = 0
+        if telegram_service and delivery_store is not None:
             alert_message = telegram_service.format_forex_signal(signal)
-            background_tasks.add_task(send_telegram_alert, alert_message)
+            recipients = await asyncio.to_thread(delivery_store.fan_out, alert_message, signal.pair,
+                                                 signal.timeframe, signal.confidence)
         
-        # Log the signal
+        # Log the signal and push it to subscribers
         logger.info(f"Forex signal processed: {signal.dict()}")
+        push(SIGNALS_TOPIC, signal.dict())
         
         return {
             "status": "success",
             "message": "Forex signal processed successfully",
             "signal_id": f"{signal.pair}_{int(datetime.now().timestamp())}",
-            "telegram_alert_sent": telegram_service is not None
+            "telegram_alert_sent": telegram_service is not None,
+            "telegram_recipients": recipients
         }
         
     except Exception as e:
@@ -189,12 +508,12 @@ async def create_forex_signal(signal: ForexSignal, background_tasks: BackgroundT
         raise HTTPException(status_code=500, detail=f"Failed to process signal: {str(e)}")
 
 @app.post("/alerts/telegram")
-async def send_custom_alert(alert: TelegramAlert, background_tasks: BackgroundTasks):
+async def send_custom_alert(alert: TelegramAlert):
     """Send custom Telegram alert"""
     try:
         logger.info(f"Custom alert requested: {alert.priority} priority")
         
-        if not telegram_service:
+        if not telegram_service or delivery_store is None:
             raise HTTPException(status_code=503, detail="Telegram service not configured")
         
         # Format message based on priority
@@ -208,7 +527,7 @@ async def send_custom_alert(alert: TelegramAlert, background_tasks: BackgroundTa
         emoji = priority_emoji.get(alert.priority, "📝")
         formatted_message = f"{emoji} <b>ALERT</b> {emoji}\n\n{alert.message}\n\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         
-        background_tasks.add_task(send_telegram_alert, formatted_message)
+        await asyncio.to_thread(delivery_store.enqueue, [telegram_service.chat_id], formatted_message)
         
         logger.info("Custom alert queued for sending")
         
@@ -224,6 +543,446 @@ async def send_custom_alert(alert: TelegramAlert, background_tasks: BackgroundTa
         logger.error(f"Error sending custom alert: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to send alert: {str(e)}")
 
+def _require_delivery():
+    if delivery_store is None:
+        raise HTTPException(status_code=503, detail="Telegram service not configured")
+    return delivery_store
+
+@app.post("/telegram/subscribers")
+async def add_subscriber(subscription: Subscription):
+    """Subscribe a chat to alerts for the given pairs/timeframes ("*" for all)"""
+    store = _require_delivery()
+    await asyncio.to_thread(store.add_subscriber, subscription.chat_id, subscription.pairs,
+                            subscription.timeframes, subscription.min_confidence)
+    logger.info(f"Telegram subscriber {subscription.chat_id} updated")
+    return {"status": "success", "chat_id": subscription.chat_id}
+
+@app.get("/telegram/subscribers")
+async def list_subscribers(limit: int = 100, offset: int = 0):
+    """Registered chats and their filters, paginated"""
+    store = _require_delivery()
+    return {"subscribers": await asyncio.to_thread(store.subscribers, min(limit, 1000), offset),
+            "limit": limit, "offset": offset}
+
+@app.delete("/telegram/subscribers/{chat_id}")
+async def remove_subscriber(chat_id: str):
+    """Unsubscribe a chat; alerts already queued for it are still delivered"""
+    store = _require_delivery()
+    if not await asyncio.to_thread(store.remove_subscriber, chat_id):
+        raise HTTPException(status_code=404, detail=f"Unknown subscriber {chat_id}")
+    return {"status": "success", "chat_id": chat_id}
+
+@app.get("/telegram/delivery")
+async def get_delivery_status():
+    """Alert queue depth, failures and worker counters (on the worker draining the queue)"""
+    store = _require_delivery()
+    stats = await asyncio.to_thread(store.stats)
+    stats["draining_here"] = delivery_worker is not None
+    if delivery_worker is not None:
+        stats["worker"] = delivery_worker.stats()
+    return stats
+
+@app.get("/analyze/{pair}/{tf}")
+def analyze_single(pair: str, tf: str, response: Response,
+                   if_none_match: Optional[str] = Header(None)):
+    """Run the technical analysis for one pair and timeframe.
+
+    Honours If-None-Match: a 304 is returned while no new bar has arrived.
+    """
+    logger.info(f"Analysis requested: {pair} {tf}")
+    pair = pair.upper()
+    try:
+        warm = core.bars_cached(pair, tf)
+        bars, etag = analyze_with_etag(pair, tf)
+        if etag and etag_matches(etag, parse_if_none_match(if_none_match)):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        result = analyze_shared([(pair, tf, bars, etag)])[0]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error analyzing {pair} {tf}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to analyze {pair}: {str(e)}")
+    
+    if "error" in result:
+        raise HTTPException(status_code=503, detail=result["error"])
+    track_paper_trade(result, bars)
+    record_signal(result, warm)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return build_analysis_response(result)
+
+@app.get("/analyze")
+def analyze_many(pairs: Optional[str] = None, tf: str = "5m",
+                 if_none_match: Optional[str] = Header(None),
+                 fmt: Optional[str] = Query(None, alias="format"), accept: Optional[str] = Header(None)):
+    """Run the technical analysis for a comma-separated list of pairs.
+
+    Each result carries its own ETag. Clients send the ETags they already hold
+    in If-None-Match and only get pairs whose analysis changed; the unchanged
+    ones are listed by name. A 304 is returned when nothing changed, or when
+    If-None-Match holds the response's own ETag (for the same pair list).
+    Answers in JSON or MessagePack (Accept or ?format=msgpack).
+    """
+    pair_list = [p.strip().upper() for p in pairs.split(",") if p.strip()] if pairs else analysis_cfg["pairs"]
+    logger.info(f"Analysis requested: {len(pair_list)} pairs on {tf}")
+    fmt = negotiate_format(accept, fmt)
+    try:
+        core.tf_to_interval(tf)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    known = parse_if_none_match(if_none_match)
+    fetched = []
+    for p in pair_list:
+        try:
+            warm = core.bars_cached(p, tf)
+            bars, etag = analyze_with_etag(p, tf)
+        except Exception as e:
+            fetched.append((p, None, None, None, str(e)))
+            continue
+        fetched.append((p, bars, etag, warm, None))
+    
+    # The combined tag only exists when every pair has one, so a 304 never hides an error
+    etags = [etag for _, _, etag, _, _ in fetched]
+    combined = combined_etag(etags) if all(etags) else None
+    headers = {"Cache-Control": "no-cache"}
+    if combined:
+        headers["ETag"] = combined
+        if etag_matches(combined, known):
+            return Response(status_code=304, headers=headers)
+    
+    results, unchanged, pending = [], [], []
+    for p, bars, etag, warm, error in fetched:
+        if error is not None:
+            results.append({"pair": p, "timeframe": tf, "error": error})
+            continue
+        if etag and etag_matches(etag, known):
+            unchanged.append(p)
+            continue
+        results.append(None)
+        pending.append((len(results) - 1, p, bars, etag, warm))
+    
+    # Changed pairs are analyzed together: one model call for the whole request
+    try:
+        analyzed = analyze_shared([(p, tf, bars, etag) for _, p, bars, etag, _ in pending])
+    except Exception as e:
+        analyzed = [{"pair": p, "timeframe": tf, "error": str(e)} for _, p, _, _, _ in pending]
+    for (slot, p, bars, etag, warm), r in zip(pending, analyzed):
+        if "error" in r:
+            results[slot] = build_analysis_response(r)
+            continue
+        track_paper_trade(r, bars)
+        record_signal(r, warm)
+        out = build_analysis_response(r)
+        if etag:
+            out["etag"] = etag
+        results[slot] = out
+    
+    if not results and unchanged:
+        return Response(status_code=304, headers=headers)
+    return formats.respond({
+        "timeframe": tf,
+        "results": results,
+        "unchanged": unchanged,
+        "timestamp": datetime.now().isoformat()
+    }, fmt, headers=headers)
+
+def negotiate_format(accept: Optional[str], fmt: Optional[str], allowed=formats.DOCUMENT) -> str:
+    try:
+        return formats.negotiate(accept, fmt, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+@app.get("/history/{pair}/{tf}")
+def get_history(pair: str, tf: str, lookback: Optional[str] = None, start: Optional[int] = None,
+                indicators: bool = False, fmt: Optional[str] = Query(None, alias="format"),
+                accept: Optional[str] = Header(None)):
+    """Bars for one pair as columns, optionally with every indicator and the rule score.
+
+    `start` keeps bars opened at or after that Unix time. Streamed in chunks
+    as JSON rows, MessagePack column arrays or an Arrow IPC stream (Accept or
+    ?format=json|msgpack|arrow).
+    """
+    pair = pair.upper()
+    fmt = negotiate_format(accept, fmt, formats.COLUMNAR)
+    try:
+        bars = core.get_bars(pair, tf, lookback)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error loading history for {pair} {tf}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to load history for {pair}: {str(e)}")
+    
+    price = "float" if bars.close.dtype.itemsize == 4 else "double"
+    columns = [("time", "timestamp[s]"), ("open", price), ("high", price), ("low", price), ("close", price)]
+    arrays = [bars.time, bars.open, bars.high, bars.low, bars.close]
+    if indicators:
+        # Computed on the full history so the first returned rows are warmed up
+        ind = core.compute_indicators(bars)
+        columns += [(name, "float") for name in ind.__slots__] + [("score", "float")]
+        arrays += [getattr(ind, name) for name in ind.__slots__] + [core.score_series(bars, ind)]
+    first = int(bars.time.searchsorted(start)) if start else 0
+    meta = {"pair": pair, "timeframe": tf, "count": len(bars) - first}
+    return formats.stream_table(fmt, meta, columns, formats.array_chunks([a[first:] for a in arrays]))
+
+@app.get("/paper/summary")
+async def get_paper_summary():
+    """Paper-trading PnL summary"""
+    if paper_inbox is None:
+        raise HTTPException(status_code=503, detail="Paper trading disabled")
+    engine = await asyncio.to_thread(paper_state)
+    return dict(engine.summary(), timestamp=datetime.now().isoformat())
+
+@app.get("/paper/positions")
+async def get_paper_positions(pair: Optional[str] = None):
+    """Open paper-trading positions"""
+    if paper_inbox is None:
+        raise HTTPException(status_code=503, detail="Paper trading disabled")
+    engine = await asyncio.to_thread(paper_state)
+    positions = engine.open_positions(pair)
+    return {"positions": positions, "count": len(positions)}
+
+# Background jobs (backtests, sweeps); the job database is opened on first use
+job_manager = None
+
+def get_job_manager() -> jobs.JobManager:
+    global job_manager
+    if job_manager is None:
+        jobs_cfg = analysis_cfg["jobs"]
+        job_manager = jobs.JobManager(jobs_cfg["db_path"], jobs_cfg["workers"], jobs_cfg["nice"])
+    return job_manager
+
+def validate_job_spec(spec: BacktestSpec) -> dict:
+    out = spec.dict()
+    out["pairs"] = [p.upper() for p in spec.pairs] if spec.pairs else list(analysis_cfg["pairs"])
+    core.tf_to_interval(spec.tf)
+    if spec.window < backtest.MIN_BARS:
+        raise ValueError(f"window must be at least {backtest.MIN_BARS} bars")
+    if spec.file:
+        history_dir = os.path.realpath(analysis_cfg["jobs"]["history_dir"])
+        path = os.path.realpath(os.path.join(history_dir, spec.file))
+        if not path.startswith(history_dir + os.sep) or not os.path.isfile(path):
+            raise ValueError(f"No bar file '{spec.file}' in the history directory")
+        out["file"] = path
+    backtest.with_overrides(analysis_cfg, spec.risk)
+    if isinstance(spec, SweepSpec):
+        backtest.with_overrides(analysis_cfg, dict.fromkeys(spec.grid, 0.0))
+        backtest.grid(out)
+    return out
+
+async def submit_job(kind: str, spec: BacktestSpec) -> dict:
+    try:
+        validated = validate_job_spec(spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await asyncio.to_thread(get_job_manager().submit, kind, validated, analysis_cfg)
+
+def _require_job(job_id: str) -> dict:
+    job = get_job_manager().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.post("/jobs/backtest")
+async def create_backtest_job(spec: BacktestSpec):
+    """Queue a backtest of the live signal path; poll /jobs/{job_id} for progress"""
+    return await submit_job("backtest", spec)
+
+@app.post("/jobs/sweep")
+async def create_sweep_job(spec: SweepSpec):
+    """Queue a sweep over risk settings (one backtest per grid combination)"""
+    return await submit_job("sweep", spec)
+
+@app.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 50, offset: int = 0):
+    """Jobs, newest first"""
+    items = await asyncio.to_thread(get_job_manager().store.list, status, min(limit, 500), offset)
+    return {"jobs": items, "limit": limit, "offset": offset}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and (once finished) summary of a job"""
+    return await asyncio.to_thread(_require_job, job_id)
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 500):
+    """Result rows (available while the job runs), paginated; rows are arrays under `columns`"""
+    job = await asyncio.to_thread(_require_job, job_id)
+    rows = await asyncio.to_thread(get_job_manager().store.rows, job_id, offset, min(limit, 5000))
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "columns": job["columns"],
+        "rows": rows,
+        "offset": offset,
+        "next_offset": offset + len(rows),
+        "total": job["rows"],
+    }
+
+@app.get("/jobs/{job_id}/results/export")
+async def export_job_results(job_id: str, fmt: Optional[str] = Query(None, alias="format"),
+                             accept: Optional[str] = Header(None)):
+    """Every result row stored so far, streamed in chunks as JSON or MessagePack"""
+    fmt = negotiate_format(accept, fmt)
+    job = await asyncio.to_thread(_require_job, job_id)
+    store = get_job_manager().store
+    meta = {"job_id": job_id, "status": job["status"]}
+    chunks = formats.row_chunks(lambda offset, limit: store.rows(job_id, offset, limit))
+    return formats.stream_table(fmt, meta, [(c, None) for c in job["columns"] or []], chunks)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, offset: int = 0):
+    """Server-sent progress events and result rows until the job finishes"""
+    await asyncio.to_thread(_require_job, job_id)
+    store = get_job_manager().store
+    
+    async def events():
+        cursor = offset
+        last = None
+        while True:
+            job = await asyncio.to_thread(store.get, job_id)
+            rows = await asyncio.to_thread(store.rows, job_id, cursor, 1000)
+            if rows:
+                yield f"event: rows\ndata: {json.dumps({'offset': cursor, 'rows': rows})}\n\n"
+                cursor += len(rows)
+                continue
+            state = (job["status"], job["progress"])
+            if state != last:
+                last = state
+                yield f"event: progress\ndata: {json.dumps({'status': job['status'], 'progress': job['progress']})}\n\n"
+            if job["status"] in jobs.TERMINAL:
+                yield f"event: done\ndata: {json.dumps({'status': job['status'], 'summary': job['summary'], 'error': job['error']})}\n\n"
+                return
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a job; a running job stops at its next progress update"""
+    await asyncio.to_thread(_require_job, job_id)
+    status = await asyncio.to_thread(get_job_manager().cancel, job_id)
+    return {"job_id": job_id, "status": status}
+
+@app.get("/signals/latest")
+async def get_latest_signals(pair: Optional[str] = None, fmt: Optional[str] = Query(None, alias="format"),
+                             accept: Optional[str] = Header(None)):
+    """Latest analysis result per pair/timeframe, from any worker with the shared cache on
+    (survives restarts via the warm-start snapshot)"""
+    fmt = negotiate_format(accept, fmt)
+    latest = await asyncio.to_thread(shared_latest_signals)
+    signals = [s for s in latest.values() if pair is None or s["pair"] == pair.upper()]
+    return formats.respond({"signals": signals, "count": len(signals)}, fmt)
+
+@app.get("/metrics/startup")
+async def get_startup_metrics():
+    """Import, startup, first-healthy and first-warm-signal timings (seconds since import)"""
+    return startup_metrics
+
+@app.get("/cache/status")
+async def get_cache_status():
+    """Shared cache counters for this worker (hits, computed here, waited for another worker)"""
+    if core.SHARED_CACHE is None:
+        return {"enabled": False}
+    return dict(core.SHARED_CACHE.stats(), enabled=True)
+
+@app.websocket("/ws/signals")
+async def ws_signals(websocket: WebSocket, topics: Optional[str] = None):
+    """Push analysis results and signals for the subscribed topics.
+
+    Topics: "PAIR:tf", "PAIR", "signals" or "*", from the `topics` query
+    parameter or control messages {"action": "subscribe"|"unsubscribe", "topics": [...]}.
+    A malformed control message is answered with {"error": ...} and ignored.
+
+    The hub is per process; with the shared cache on, the signal relay forwards
+    what other workers publish, so every client sees every signal. Without it
+    a client only receives what its own worker publishes.
+    """
+    await websocket.accept()
+    if signal_hub.loop is None:
+        signal_hub.bind_loop(asyncio.get_running_loop())
+    sub = signal_hub.subscribe(parse_topics(topics))
+    
+    async def pump():
+        while True:
+            message = await sub.next_message()
+            if message is None:
+                # Too slow to keep up; the client should reconnect
+                await websocket.close(code=1013)
+                return
+            await websocket.send_text(message)
+    
+    sender = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                control = json.loads(await websocket.receive_text())
+            except ValueError:
+                await websocket.send_text(json.dumps({"error": "control message must be JSON"}))
+                continue
+            if not isinstance(control, dict):
+                await websocket.send_text(json.dumps({"error": "control message must be a JSON object"}))
+                continue
+            topics_spec = control.get("topics")
+            if topics_spec is not None and not (
+                    isinstance(topics_spec, str)
+                    or isinstance(topics_spec, list) and all(isinstance(t, str) for t in topics_spec)):
+                await websocket.send_text(json.dumps({"error": "topics must be a string or a list of strings"}))
+                continue
+            requested = parse_topics(topics_spec)
+            if control.get("action") == "subscribe":
+                signal_hub.add_topics(sub, requested)
+            elif control.get("action") == "unsubscribe":
+                signal_hub.remove_topics(sub, requested)
+            else:
+                await websocket.send_text(json.dumps({"error": "action must be subscribe or unsubscribe"}))
+                continue
+            await websocket.send_text(json.dumps({"topics": sorted(sub.topics)}))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        sender.cancel()
+        signal_hub.unsubscribe(sub)
+
+@app.get("/sse/signals")
+async def sse_signals(topics: str = "*"):
+    """Server-sent events variant of /ws/signals for clients without WebSocket support"""
+    if signal_hub.loop is None:
+        signal_hub.bind_loop(asyncio.get_running_loop())
+    wanted = parse_topics(topics)
+    
+    async def events():
+        # Subscribed only once the response streams: a client that is gone before
+        # then never starts the generator, and its finally would never run
+        sub = signal_hub.subscribe(wanted)
+        try:
+            while True:
+                message = await sub.next_message()
+                if message is None:
+                    return
+                yield f"data: {message}\n\n"
+        finally:
+            signal_hub.unsubscribe(sub)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.get("/push/status")
+async def get_push_status():
+    """Push subscriber counts per topic on this worker, and relay counters"""
+    relay = signal_relay.stats() if signal_relay is not None else {"enabled": False}
+    return dict(signal_hub.stats(), relay=relay)
+
+@app.get("/stream/status")
+async def get_stream_status():
+    """Streaming ingestion counters and close-to-signal latency (on the worker running the stream)"""
+    if stream_task is None:
+        return {"enabled": False}
+    if stream_pipeline is None:
+        return {"enabled": True, "leader": False, "running": False}
+    return dict(stream_pipeline.stats(), enabled=True, leader=True, running=not stream_task.done())
+
 @app.get("/config/status")
 async def get_config_status():
     """Get configuration status"""
@@ -270,8 +1029,29 @@ async def get_recent_logs(lines: int = 50):
 async def startup_event():
     """Startup event handler"""
     logger.info("Starting AI Forex Bot API...")
+    signal_hub.bind_loop(asyncio.get_running_loop())
+    if signal_relay is not None:
+        await asyncio.to_thread(signal_relay.start, signal_hub.publish)
+    startup_metrics["import_seconds"] = round(_import_done - _import_started, 4)
+    
+    model_path = analysis_cfg["model"]["path"]
+    if model_path:
+        try:
+            await asyncio.to_thread(model.load, model_path)
+        except Exception as e:
+            logger.error(f"Failed to load model {model_path}; using rule confidence only: {str(e)}")
     
     try:
+        warm_cfg = analysis_cfg["warm_start"]
+        if warm_cfg["enabled"]:
+            try:
+                signals, stats = await asyncio.to_thread(snapshot.load, warm_cfg["path"], warm_cfg["max_age"])
+                latest_signals.update(signals)
+                startup_metrics["snapshot"] = stats
+                logger.info(f"Warm-start snapshot: {stats}")
+            except Exception as e:
+                logger.error(f"Failed to load warm-start snapshot: {str(e)}")
+        
         # Validate configuration (but don't fail if optional configs are missing)
         if config.telegram_bot_token and config.telegram_chat_id:
             logger.info("Telegram service configured")
@@ -283,11 +1063,28 @@ async def startup_event():
         else:
             logger.warning("Forex API not configured")
         
-        # Send startup notification
+        if analysis_cfg["stream"]["feed"]:
+            # One feed connection per deployment, whatever the number of workers
+            global stream_task
+            stream_task = asyncio.create_task(
+                leader.lead("stream", run_stream_pipeline, analysis_cfg["roles"]["lock_dir"]))
+        
+        if paper_inbox is not None:
+            global paper_task
+            paper_task = asyncio.create_task(
+                leader.lead("paper", run_paper_engine, analysis_cfg["roles"]["lock_dir"]))
+        
+        if delivery_store is not None and telegram_service:
+            global delivery_task
+            delivery_task = asyncio.create_task(
+                leader.lead("delivery", run_delivery_worker, analysis_cfg["roles"]["lock_dir"]))
+        
+        # Send startup notification without holding up readiness
         if telegram_service:
             startup_message = "🚀 <b>AI Forex Bot Started</b> 🚀\n\nThe forex bot API is now running and ready to process signals."
-            await telegram_service.send_message(startup_message)
+            asyncio.create_task(telegram_service.send_message(startup_message))
         
+        startup_metrics["startup_seconds"] = _since_import()
         logger.info("AI Forex Bot API started successfully")
         
     except Exception as e:
@@ -299,6 +1096,28 @@ async def shutdown_event():
     """Shutdown event handler"""
     logger.info("Shutting down AI Forex Bot API...")
     
+    if stream_task is not None:
+        stream_task.cancel()
+    if signal_relay is not None:
+        signal_relay.stop()
+    if job_manager is not None:
+        job_manager.shutdown()
+    if delivery_task is not None:
+        # Alerts being sent are retried after their lease expires on the next start
+        delivery_task.cancel()
+    if paper_task is not None:
+        paper_task.cancel()
+    if paper_engine is not None:
+        paper_engine.save()
+    
+    warm_cfg = analysis_cfg["warm_start"]
+    if warm_cfg["enabled"]:
+        try:
+            stats = snapshot.save(warm_cfg["path"], shared_latest_signals())
+            logger.info(f"Warm-start snapshot saved: {stats}")
+        except Exception as e:
+            logger.error(f"Failed to save warm-start snapshot: {str(e)}")
+    
     # Send shutdown notification
     if telegram_service:
         shutdown_message = "🛑 <b>AI Forex Bot Stopped</b> 🛑\n\nThe forex bot API has been shut down."
@@ -306,6 +1125,8 @@ async def shutdown_event():
     
     logger.info("AI Forex Bot API shut down successfully")
 
+_import_done = time.perf_counter()
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,174 @@
+"""Backtests and parameter sweeps of the live signal path.
+
+A backtest walks each pair's history bar by bar, runs the same scoring as
+`core.analyze_bars` on the trailing `window` bars and feeds the results to an
+in-memory `PaperEngine`, so trades follow the live paper-trading rules. A
+sweep scores every bar once and then re-runs only `core.finalize_signal` and
+the simulation for each combination of risk settings, since scoring does not
+depend on them.
+
+Both report through `progress(done, total, rows)`; the job runner uses it to
+record progress, store partial results and stop cancelled jobs.
+"""
+import itertools
+
+import core
+import model
+from paper import PaperEngine
+
+DEFAULT_WINDOW = 500
+MIN_BARS = 60
+MAX_COMBINATIONS = 500
+TRADE_COLUMNS = ("id", "pair", "timeframe", "direction", "entry", "stop_loss", "take_profit",
+                 "opened_at", "closed_at", "exit_price", "outcome", "pnl_pips")
+SUMMARY_COLUMNS = ("closed_trades", "wins", "losses", "win_rate", "total_pips", "open_positions")
+
+
+def load_history(spec: dict) -> dict:
+    """pair -> Bars from a recorded bar file (spec["file"]) or the live data source"""
+    tf = spec.get("tf", "5m")
+    if spec.get("file"):
+        from replay import load_bars  # numpy-heavy; keeps importing api fast
+        history = load_bars(spec["file"], tf)
+        return {p: history[p] for p in spec["pairs"] if p in history}
+    return {p: core.fetch_bar_arrays(p, tf, lookback=spec.get("lookback") or core.default_lookback(tf))
+            for p in spec["pairs"]}
+
+
+def with_overrides(cfg: dict, risk: dict) -> dict:
+    unknown = set(risk) - set(cfg["risk"])
+    if unknown:
+        raise ValueError(f"Unknown risk settings: {', '.join(sorted(unknown))}")
+    return dict(cfg, risk=dict(cfg["risk"], **risk))
+
+
+def score_history(bars, window: int, progress=None) -> list:
+    """[(index, SignalResult, model probability)] for every bar with enough history.
+
+    Indicator arrays are dropped after scoring (keeping them would cost a
+    window of floats per bar); model features are taken first and the whole
+    history is scored by the model in one batch.
+    """
+    scored = []
+    rows = []
+    for i in range(MIN_BARS - 1, len(bars)):
+        res = core.score_signal(bars[max(0, i + 1 - window):i + 1])
+        if model.MODEL is not None:
+            rows.append(model.features(res))
+        res.indicators = None
+        scored.append((i, res))
+        if progress is not None:
+            progress(1)
+    probs = model.predict(rows) or [None] * len(scored)
+    return [(i, res, p) for (i, res), p in zip(scored, probs)]
+
+
+def simulate(pair: str, tf: str, bars, scored: list, cfg: dict) -> tuple:
+    """Paper-trade the scored bars; returns (engine, closed positions)"""
+    engine = PaperEngine()
+    closed = []
+    high, low, times = bars.high, bars.low, bars.time
+    for i, res, prob in scored:
+        t = int(times[i])
+        closed += engine.on_bar(pair, tf, t, float(high[i]), float(low[i]))
+        engine.open_from_signal(core.finalize_signal(pair, tf, res, t, cfg, prob))
+    return engine, closed
+
+
+def trade_row(pos) -> list:
+    return [round(v, 5) if isinstance(v, float) else v for v in (getattr(pos, c) for c in TRADE_COLUMNS)]
+
+
+def summary_row(summary: dict) -> list:
+    return [summary[c] for c in SUMMARY_COLUMNS]
+
+
+def combine(engines: list) -> dict:
+    """PaperEngine.summary() across per-pair engines"""
+    pairs = {}
+    for engine in engines:
+        pairs.update(engine.summary()["pairs"])
+    closed = sum(p["closed"] for p in pairs.values())
+    wins = sum(p["wins"] for p in pairs.values())
+    return {
+        "closed_trades": closed,
+        "wins": wins,
+        "losses": closed - wins,
+        "win_rate": round(100.0 * wins / closed, 1) if closed else 0.0,
+        "total_pips": round(sum(p["pips"] for p in pairs.values()), 1),
+        "open_positions": sum(p["open"] for p in pairs.values()),
+        "pairs": pairs,
+    }
+
+
+class _Progress:
+    def __init__(self, total: int, report):
+        self.done = 0
+        self.total = total
+        self.report = report
+
+    def __call__(self, steps: int, rows: list = ()):
+        self.done += steps
+        if self.report is not None:
+            self.report(self.done, self.total, list(rows))
+
+
+def run_backtest(spec: dict, cfg: dict, progress=None) -> dict:
+    """Backtest spec {"pairs", "tf", "lookback" | "file", "window", "risk"}; trades go to progress rows"""
+    tf = spec.get("tf", "5m")
+    cfg = with_overrides(cfg, spec.get("risk") or {})
+    history = load_history(spec)
+    window = spec.get("window") or DEFAULT_WINDOW
+    tick = _Progress(sum(max(0, len(b) - MIN_BARS + 1) for b in history.values()), progress)
+    engines = []
+    for pair, bars in history.items():
+        scored = score_history(bars, window, tick)
+        engine, closed = simulate(pair, tf, bars, scored, cfg)
+        engines.append(engine)
+        tick(0, [trade_row(p) for p in closed])
+    return dict(combine(engines), bars={p: len(b) for p, b in history.items()})
+
+
+def grid(spec: dict) -> list:
+    """Risk-setting combinations for a sweep spec's {"grid": {name: [values]}}"""
+    names = sorted(spec["grid"])
+    combos = [dict(zip(names, values)) for values in itertools.product(*(spec["grid"][n] for n in names))]
+    if len(combos) > MAX_COMBINATIONS:
+        raise ValueError(f"Sweep has {len(combos)} combinations (max {MAX_COMBINATIONS})")
+    return combos
+
+
+def run_sweep(spec: dict, cfg: dict, progress=None) -> dict:
+    """One backtest per grid combination; one summary row per combination goes to progress"""
+    tf = spec.get("tf", "5m")
+    combos = grid(spec)
+    for combo in combos:
+        with_overrides(cfg, combo)
+    history = load_history(spec)
+    window = spec.get("window") or DEFAULT_WINDOW
+    score_steps = sum(max(0, len(b) - MIN_BARS + 1) for b in history.values())
+    tick = _Progress(score_steps + len(combos), progress)
+    scored = {pair: score_history(bars, window, tick) for pair, bars in history.items()}
+
+    best = None
+    for combo in combos:
+        combo_cfg = with_overrides(cfg, dict(spec.get("risk") or {}, **combo))
+        summary = combine([simulate(pair, tf, history[pair], scored[pair], combo_cfg)[0]
+                           for pair in history])
+        if best is None or summary["total_pips"] > best[1]["total_pips"]:
+            best = (combo, summary)
+        tick(1, [[combo[n] for n in sorted(combo)] + summary_row(summary)])
+    return {
+        "combinations": len(combos),
+        "best": {"params": best[0], **{c: best[1][c] for c in SUMMARY_COLUMNS}} if best else None,
+        "bars": {p: len(b) for p, b in history.items()},
+    }
+
+
+def result_columns(kind: str, spec: dict) -> list:
+    if kind == "sweep":
+        return sorted(spec["grid"]) + list(SUMMARY_COLUMNS)
+    return list(TRADE_COLUMNS)
+
+
+RUNNERS = {"backtest": run_backtest, "sweep": run_sweep}
@@ -0,0 +1,120 @@
+"""Compact array-backed bar container and result records.
+
+`Bars` holds OHLC prices as contiguous NumPy arrays with an int64 epoch-seconds
+index. FX volume from yfinance is always zero, so it is not stored. Use
+`Bars.from_frame` / `Bars.to_frame` to move between this and pandas.
+"""
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+OHLC = ("Open", "High", "Low", "Close")
+
+
+class Bars:
+    __slots__ = ("time", "open", "high", "low", "close")
+
+    def __init__(self, time, open, high, low, close, dtype="float64"):
+        self.time = np.ascontiguousarray(time, dtype=np.int64)
+        self.open = np.ascontiguousarray(open, dtype=dtype)
+        self.high = np.ascontiguousarray(high, dtype=dtype)
+        self.low = np.ascontiguousarray(low, dtype=dtype)
+        self.close = np.ascontiguousarray(close, dtype=dtype)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __getitem__(self, key) -> "Bars":
+        if isinstance(key, int):
+            key = slice(key, key + 1 if key != -1 else None)
+        return Bars(self.time[key], self.open[key], self.high[key], self.low[key],
+                    self.close[key], dtype=self.close.dtype)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.time) == 0
+
+    @property
+    def nbytes(self) -> int:
+        return (self.time.nbytes + self.open.nbytes + self.high.nbytes
+                + self.low.nbytes + self.close.nbytes)
+
+    @classmethod
+    def empty_bars(cls, dtype="float64") -> "Bars":
+        z = np.empty(0)
+        return cls(z, z, z, z, z, dtype=dtype)
+
+    @classmethod
+    def from_frame(cls, df, dtype="float64") -> "Bars":
+        """Build from a DataFrame with a DatetimeIndex and Open/High/Low/Close columns"""
+        if df is None or len(df) == 0:
+            return cls.empty_bars(dtype)
+        index = df.index
+        if getattr(index, "tz", None) is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        time = index.values.astype("datetime64[s]").astype(np.int64)
+        cols = [np.asarray(df[c]).reshape(len(df), -1)[:, 0] for c in OHLC]
+        return cls(time, *cols, dtype=dtype)
+
+    def to_frame(self):
+        """Pandas adapter for code that still expects a DataFrame"""
+        import pandas as pd
+        index = pd.DatetimeIndex(self.time.astype("datetime64[s]"), name="Datetime")
+        return pd.DataFrame({
+            "Open": self.open, "High": self.high, "Low": self.low, "Close": self.close,
+        }, index=index)
+
+    def tail(self, n: int) -> "Bars":
+        return self[-n:] if n < len(self) else self
+
+    def append(self, other: "Bars") -> "Bars":
+        """Return a new container with bars from `other` newer than our last bar"""
+        if other.empty:
+            return self
+        if self.empty:
+            return other
+        newer = other.time > self.time[-1]
+        return Bars(
+            np.concatenate((self.time, other.time[newer])),
+            np.concatenate((self.open, other.open[newer])),
+            np.concatenate((self.high, other.high[newer])),
+            np.concatenate((self.low, other.low[newer])),
+            np.concatenate((self.close, other.close[newer])),
+            dtype=self.close.dtype,
+        )
+
+
+class SignalResult:
+    """Output of `core.score_signal`"""
+    __slots__ = ("score", "direction", "price", "atr", "reasons", "indicators", "levels")
+
+    def __init__(self, score: float, direction: str, price: float, atr: float, reasons: list,
+                 indicators=None, levels=None):
+        self.score = score
+        self.direction = direction
+        self.price = price
+        self.atr = atr
+        self.reasons = reasons
+        self.indicators = indicators  # indicators.Indicators
+        self.levels = levels or {}     # support/resistance from patterns.key_levels
+
+    # Keep dict-style access working for callers written against the old dict result
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def as_dict(self) -> dict:
+        d = {k: getattr(self, k) for k in self.__slots__}
+        if self.indicators is not None:
+            d["indicators"] = self.indicators.summary()
+        return d
+
+    def __repr__(self) -> str:
+        return f"SignalResult({self.as_dict()!r})"
@@ -52,6 +52,70 @@ API = {
     'timeout': 30
 }
 
+# Paper trading (Week 4): simulated positions from BUY/SELL analysis results
+PAPER = {
+    'enabled': os.getenv('PAPER_TRADING', 'true').lower() == 'true',
+    'state_path': os.getenv('PAPER_STATE_PATH', 'data/paper_state.json'),
+    'trades_path': os.getenv('PAPER_TRADES_PATH', 'data/logs/paper_trades.jsonl'),
+    'save_interval': float(os.getenv('PAPER_SAVE_INTERVAL', '30')),   # seconds between snapshots
+    'poll_interval': float(os.getenv('PAPER_POLL_INTERVAL', '1'))     # owner's inbox poll, seconds
+}
+
+# Streaming ingestion: 'ws://host:port/path' or a tick replay file; empty disables it
+STREAM = {
+    'feed': os.getenv('STREAM_FEED', ''),
+    'speed': float(os.getenv('STREAM_SPEED', '0')),   # replay speed multiple, 0 = max
+    'seed_history': os.getenv('STREAM_SEED', 'true').lower() == 'true'
+}
+
+# Warm start: caches and latest signals saved on shutdown and reloaded on startup
+WARM_START = {
+    'enabled': os.getenv('WARM_START', 'true').lower() == 'true',
+    'path': os.getenv('WARM_START_PATH', 'data/warm_start.npz'),
+    'max_age': float(os.getenv('WARM_START_MAX_AGE', '300'))  # ignore older snapshots (seconds)
+}
+
+# Telegram fan-out: subscriber registry and durable delivery queue (SQLite)
+DELIVERY = {
+    'db_path': os.getenv('TELEGRAM_DB_PATH', 'data/telegram.db'),
+    'rate': float(os.getenv('TELEGRAM_RATE', '25')),                       # messages/second overall
+    'per_chat_interval': float(os.getenv('TELEGRAM_PER_CHAT_INTERVAL', '1.0')),  # seconds between messages to one chat
+    'concurrency': int(os.getenv('TELEGRAM_SEND_CONCURRENCY', '8')),
+    'max_attempts': int(os.getenv('TELEGRAM_MAX_ATTEMPTS', '8'))
+}
+
+# Cache shared by API worker processes: 'redis://host:6379/0', 'sqlite:///data/shared_cache.db' or empty
+SHARED_CACHE = {
+    'url': os.getenv('SHARED_CACHE_URL', ''),
+    'analysis_ttl': float(os.getenv('SHARED_CACHE_ANALYSIS_TTL', '900'))  # seconds an analysis stays shared
+}
+
+# Background jobs (backtests, sweeps): local process pool, or Celery when a broker is set
+JOBS = {
+    'db_path': os.getenv('JOBS_DB_PATH', 'data/jobs.db'),
+    'workers': int(os.getenv('JOBS_WORKERS', '1')),
+    'nice': int(os.getenv('JOBS_NICE', '10')),           # lower CPU priority of job processes
+    'celery_broker': os.getenv('JOBS_CELERY_BROKER', ''),
+    'history_dir': os.getenv('JOBS_HISTORY_DIR', 'data/history')  # recorded bar files jobs may read
+}
+
+# Model-scoring stage: a trained model file (.npz, .joblib/.pkl, .keras/.h5) blended into confidence
+MODEL = {
+    'path': os.getenv('MODEL_PATH', ''),
+    'blend': float(os.getenv('MODEL_BLEND', '0.5'))  # weight of the model's confidence (0-1)
+}
+
+# Memory-mapped training features and SL/TP labels (feature_store.py)
+FEATURE_STORE = {
+    'path': os.getenv('FEATURE_STORE_PATH', 'data/features'),
+    'horizon': int(os.getenv('FEATURE_HORIZON', '96'))   # bars a label waits for SL or TP
+}
+
+# Background roles run by one API worker only (leader.py): lock files live here
+ROLES = {
+    'lock_dir': os.getenv('ROLE_LOCK_DIR', 'data/locks')
+}
+
 # Main configuration dictionary that core.py expects
 config = {
     'pairs': PAIRS,
@@ -59,7 +123,16 @@ config = {
     'thresholds': THRESHOLDS,
     'risk': RISK,
     'telegram': TELEGRAM,
-    'api': API
+    'api': API,
+    'paper': PAPER,
+    'stream': STREAM,
+    'warm_start': WARM_START,
+    'delivery': DELIVERY,
+    'shared_cache': SHARED_CACHE,
+    'jobs': JOBS,
+    'model': MODEL,
+    'feature_store': FEATURE_STORE,
+    'roles': ROLES
 }
 
 # Alternative variable names for backward compatibility
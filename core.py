@@ -1,6 +1,36 @@
-import pandas as pd
-import numpy as np
-import yfinance as yf
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from bars import Bars, SignalResult
+from indicators import compute_indicators, rolling_mean, true_range
+from lazy import lazy_import
+import model
+import patterns
+import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Heavy modules load on first use so importing core (and api) stays fast
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+yf = lazy_import("yfinance")
+
+# Stored price precision for cached bars (and the feature store's prices, so live and
+# training features see the same values); indicator kernels upcast to float64
+BAR_DTYPE = "float32"
+# Per the data-stack notes: cache the last fetch per minute
+BAR_CACHE_TTL = 60.0
+BAR_CACHE_MAX = 256  # entries; lookback is client-supplied, so the key space is open-ended
+BAR_CACHE = OrderedDict()  # (pair, tf, lookback) -> (fetched_at, Bars), least recently used first
+_BAR_CACHE_LOCK = threading.Lock()
+# Optional stand-in for the yfinance download (replay, load tests): fn(pair, tf, lookback) -> DataFrame
+BAR_SOURCE = None
+# Optional cross-process tier behind BAR_CACHE (shared_cache.SharedCache), set by api.py
+SHARED_CACHE = None
 
 def pip_value(pair: str) -> float:
     return 0.01 if "JPY" in pair.upper() else 0.0001
@@ -19,6 +49,8 @@ def symbol_to_yf(pair: str) -> str:
     return pair.upper() + "=X"
 
 def fetch_bars(pair: str, tf: str, lookback: str = "7d") -> pd.DataFrame:
+    if BAR_SOURCE is not None:
+        return BAR_SOURCE(pair, tf, lookback)
     symbol = symbol_to_yf(pair)
     interval = tf_to_interval(tf)
     df = yf.download(symbol, period=lookback, interval=interval, progress=False)
@@ -35,28 +67,91 @@ def fetch_bars(pair: str, tf: str, lookback: str = "7d") -> pd.DataFrame:
         }).dropna()
     return df
 
-def rsi(series: pd.Series, period: int = 14) -> pd.Series:
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(period).mean()
-    rs = gain / loss.replace(0, np.nan)
+def fetch_bar_arrays(pair: str, tf: str, lookback: str = "7d", dtype=BAR_DTYPE) -> Bars:
+    return Bars.from_frame(fetch_bars(pair, tf, lookback=lookback), dtype=dtype)
+
+def default_lookback(tf: str) -> str:
+    return "14d" if tf.lower() != "4h" else "90d"
+
+def bars_cached(pair: str, tf: str, lookback: str = None) -> bool:
+    """True when get_bars would be served from the cache"""
+    key = (pair.upper(), tf.lower(), lookback or default_lookback(tf))
+    hit = BAR_CACHE.get(key)
+    return hit is not None and time.time() - hit[0] < BAR_CACHE_TTL
+
+def _cached_bars(key: tuple, now: float):
+    with _BAR_CACHE_LOCK:
+        hit = BAR_CACHE.get(key)
+        if hit is None or now - hit[0] >= BAR_CACHE_TTL:
+            return None
+        BAR_CACHE.move_to_end(key)
+        return hit[1]
+
+def cache_bars(key: tuple, fetched_at: float, bars: Bars):
+    """Store bars in BAR_CACHE, dropping expired entries and then the least recently used"""
+    with _BAR_CACHE_LOCK:
+        BAR_CACHE[key] = (fetched_at, bars)
+        BAR_CACHE.move_to_end(key)
+        now = time.time()
+        for k in [k for k, (t, _) in BAR_CACHE.items() if k != key and now - t >= BAR_CACHE_TTL]:
+            del BAR_CACHE[k]
+        while len(BAR_CACHE) > BAR_CACHE_MAX:
+            BAR_CACHE.popitem(last=False)
+
+def get_bars(pair: str, tf: str, lookback: str = None) -> Bars:
+    lookback = lookback or default_lookback(tf)
+    key = (pair.upper(), tf.lower(), lookback)
+    now = time.time()
+    cached = _cached_bars(key, now)
+    if cached is not None:
+        return cached
+    if SHARED_CACHE is not None and BAR_CACHE_TTL > 0:
+        # fetched_at travels with the bars, so every worker expires them together
+        fetched_at, bars = SHARED_CACHE.get_or_compute(
+            f"bars:{key[0]}:{key[1]}:{lookback}", BAR_CACHE_TTL,
+            lambda: (time.time(), fetch_bar_arrays(pair, tf, lookback=lookback)),
+            shared_cache.encode_bars, shared_cache.decode_bars)
+    else:
+        fetched_at, bars = now, fetch_bar_arrays(pair, tf, lookback=lookback)
+    cache_bars(key, fetched_at, bars)
+    return bars
+
+def _as_float(x) -> np.ndarray:
+    return np.asarray(x, dtype=np.float64)
+
+def rsi_array(close: np.ndarray, period: int = 14) -> np.ndarray:
+    delta = np.diff(_as_float(close), prepend=np.nan)
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), period)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain / np.where(loss == 0, np.nan, loss)
     return 100 - (100 / (1 + rs))
 
-def atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
-    high_low = df["High"] - df["Low"]
-    high_close = np.abs(df["High"] - df["Close"].shift())
-    low_close = np.abs(df["Low"] - df["Close"].shift())
-    ranges = pd.concat([high_low, high_close, low_close], axis=1)
-    true_range = np.max(ranges, axis=1)
-    return true_range.rolling(period).mean()
-
-def score_signal(df: pd.DataFrame) -> dict:
-    close = df["Close"]
-    rsi_val = rsi(close).iloc[-1]
-    sma_20 = close.rolling(20).mean().iloc[-1]
-    sma_50 = close.rolling(50).mean().iloc[-1]
-    current_price = close.iloc[-1]
-    atr_val = atr(df).iloc[-1]
+def atr_array(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    return rolling_mean(true_range(_as_float(high), _as_float(low), _as_float(close)), period)
+
+def rsi(series, period: int = 14):
+    if isinstance(series, pd.Series):
+        return pd.Series(rsi_array(series.values, period), index=series.index)
+    if isinstance(series, Bars):
+        series = series.close
+    return rsi_array(series, period)
+
+def atr(df, period: int = 14):
+    if isinstance(df, pd.DataFrame):
+        return pd.Series(atr_array(df["High"].values, df["Low"].values, df["Close"].values, period),
+                         index=df.index)
+    return atr_array(df.high, df.low, df.close, period)
+
+def score_signal(bars, pair: str = None, tf: str = None) -> SignalResult:
+    if not isinstance(bars, Bars):
+        bars = Bars.from_frame(bars)
+    ind = compute_indicators(bars)
+    rsi_val = ind.last("rsi")
+    sma_20 = ind.last("sma20")
+    sma_50 = ind.last("sma50")
+    current_price = float(bars.close[-1])
+    atr_val = ind.last("atr")
     
     score = 0
     reasons = []
@@ -77,6 +172,11 @@ def score_signal(df: pd.DataFrame) -> dict:
         score -= 1
         reasons.append("Bearish MA alignment")
     
+    # Chart patterns confirmed on the latest bars
+    for hit in patterns.detect(bars, atr=ind.atr):
+        score += hit.weight
+        reasons.append(hit.reason())
+    
     # Determine direction based on score
     if score >= 2:
         direction = "BUY"
@@ -85,13 +185,32 @@ def score_signal(df: pd.DataFrame) -> dict:
     else:
         direction = "HOLD"
     
-    return {
-        "score": score,
-        "direction": direction,
-        "price": current_price,
-        "atr": atr_val,
-        "reasons": reasons
-    }
+    levels = patterns.key_levels(current_price,
+                                 patterns.pivots(bars, "daily", pair, tf),
+                                 patterns.pivots(bars, "weekly", pair, tf))
+    return SignalResult(score, direction, current_price, atr_val, reasons, ind, levels)
+
+def score_series(bars: Bars, ind=None) -> np.ndarray:
+    """score_signal's score for every bar at once (same rules, one pass over the history)"""
+    if ind is None:
+        ind = compute_indicators(bars)
+    close = np.asarray(bars.close, dtype=np.float64)
+    n = len(close)
+    score = np.zeros(n)
+    score[ind.rsi < 30] += 2
+    score[ind.rsi > 70] -= 2
+    score[(close > ind.sma20) & (ind.sma20 > ind.sma50)] += 1
+    score[(close < ind.sma20) & (ind.sma20 < ind.sma50)] -= 1
+    # A pattern counts on the bar it confirms and the next RECENT_BARS - 1 bars
+    hits = patterns.scan(bars, atr=ind.atr)
+    for name, weight in patterns.PATTERN_WEIGHTS.items():
+        confirmed = np.zeros(n, dtype=bool)
+        confirmed[[h.index for h in hits if h.name == name]] = True
+        recent = confirmed.copy()
+        for lag in range(1, patterns.RECENT_BARS):
+            recent[lag:] |= confirmed[:-lag]
+        score[recent] += weight
+    return score
 
 def sl_tp_from_atr(entry: float, direction: str, atr_val: float, sl_mult: float, tp_mult: float, pip_value: float) -> tuple:
     if direction == "BUY":
@@ -108,21 +227,55 @@ def sl_tp_from_atr(entry: float, direction: str, atr_val: float, sl_mult: float,
     return sl, tp, sl_pips, tp_pips, rr
 
 def analyze_pair_tf(pair: str, tf: str, cfg: dict) -> dict:
-    lookback = "14d" if tf.lower() != "4h" else "90d"
-    df = fetch_bars(pair, tf, lookback=lookback)
-    if df is None or df.empty or len(df) < 60:
-        return {"pair": pair, "timeframe": tf, "error": "not_enough_data"}
-    
-    res = score_signal(df)
-    entry = res["price"]
-    direction = res["direction"]
-    atr_val = res["atr"]
+    return analyze_bars(pair, tf, get_bars(pair, tf), cfg)
+
+def analyze_bars(pair: str, tf: str, bars: Bars, cfg: dict) -> dict:
+    return analyze_batch([(pair, tf, bars)], cfg)[0]
+
+def analyze_batch(items: list, cfg: dict) -> list:
+    """Analyze [(pair, tf, bars)], scoring every item with one batched model call.
+
+    A pair that fails gets an {"pair", "timeframe", "error"} entry; the rest of
+    the batch is unaffected. If the model call fails, confidence is rule-only.
+    """
+    results = [None] * len(items)
+    scored = []
+    for k, (pair, tf, bars) in enumerate(items):
+        if bars is None or len(bars) < 60:
+            results[k] = {"pair": pair, "timeframe": tf, "error": "not_enough_data"}
+            continue
+        try:
+            scored.append((k, pair, tf, score_signal(bars, pair, tf), int(bars.time[-1])))
+        except Exception as e:
+            logger.error(f"Scoring {pair} {tf} failed: {str(e)}")
+            results[k] = {"pair": pair, "timeframe": tf, "error": str(e)}
+    probs = None
+    if model.MODEL is not None and scored:
+        try:
+            probs = model.predict([model.features(s[3]) for s in scored])
+        except Exception as e:
+            logger.error(f"Model scoring failed; using rule confidence only: {str(e)}")
+    for j, (k, pair, tf, res, bar_time) in enumerate(scored):
+        try:
+            results[k] = finalize_signal(pair, tf, res, bar_time, cfg, probs[j] if probs else None)
+        except Exception as e:
+            logger.error(f"Finalizing {pair} {tf} failed: {str(e)}")
+            results[k] = {"pair": pair, "timeframe": tf, "error": str(e)}
+    return results
+
+def finalize_signal(pair: str, tf: str, res: SignalResult, bar_time: int, cfg: dict,
+                    model_prob: float = None) -> dict:
+    """Confidence, SL/TP and threshold guards for a scored bar; leaves `res` unchanged"""
+    entry = res.price
+    direction = res.direction
+    atr_val = res.atr
     pv = pip_value(pair)
+    reasons = res.reasons
     sl = tp = None
     sl_pips = tp_pips = rr = 0.0
     
     # Calculate confidence based on absolute score
-    abs_score = abs(res["score"])
+    abs_score = abs(res.score)
     if abs_score <= 1.5:
         conf = 50 + 10 * abs_score
     elif abs_score <= 2.5:
@@ -130,6 +283,13 @@ def analyze_pair_tf(pair: str, tf: str, cfg: dict) -> dict:
     else:
         conf = min(95, 85 + 5 * (abs_score - 3))
     
+    # Blend in the model's view before the guards, so they apply to the final confidence
+    model_conf = None
+    if model_prob is not None:
+        model_conf = model.directional_confidence(model_prob, res.score)
+        blend = cfg["model"]["blend"]
+        conf = (1 - blend) * conf + blend * model_conf
+    
     # STRONG SIGNAL THRESHOLD GUARDS - CRITICAL SAFETY FILTERS
     # Define minimum thresholds for strong signals
     MIN_SCORE_THRESHOLD = 2.0  # Minimum absolute score for BUY/SELL
@@ -162,7 +322,7 @@ def analyze_pair_tf(pair: str, tf: str, cfg: dict) -> dict:
                 threshold_reasons.append(f"Risk-reward {rr:.2f} below threshold {MIN_RR_THRESHOLD}")
             
             # Update reasons to include threshold failures
-            res["reasons"] = res["reasons"] + ["THRESHOLD GUARD: " + "; ".join(threshold_reasons)]
+            reasons = reasons + ["THRESHOLD GUARD: " + "; ".join(threshold_reasons)]
     
     # If signal is still weak after all checks, provide clear feedback
     if direction == "HOLD" and abs_score < 1.0:
@@ -179,14 +339,23 @@ def analyze_pair_tf(pair: str, tf: str, cfg: dict) -> dict:
         "tp_pips": round(tp_pips, 1),
         "rr": round(rr, 2),
         "confidence": round(conf, 1),
-        "reasons": res["reasons"]
+        "model_confidence": round(model_conf, 1) if model_conf is not None else None,
+        "reasons": reasons,
+        "bar_time": bar_time,
+        "indicators": res.indicators.summary() if res.indicators is not None else {},
+        "levels": res.levels
     }
 
-def analyze(pairs: list, tf: str, cfg: dict) -> list:
+def analyze(pairs: list, tf, cfg: dict) -> list:
+    """Analyze every pair on one timeframe or a list of them, as one model batch"""
     results = []
-    for p in pairs:
-        try:
-            results.append(analyze_pair_tf(p, tf, cfg))
-        except Exception as e:
-            results.append({"pair": p, "timeframe": tf, "error": str(e)})
-    return results
+    items = []
+    for t in ([tf] if isinstance(tf, str) else tf):
+        for p in pairs:
+            try:
+                items.append((p, t, get_bars(p, t)))
+                results.append(None)
+            except Exception as e:
+                results.append({"pair": p, "timeframe": t, "error": str(e)})
+    batch = iter(analyze_batch(items, cfg))
+    return [r if r is not None else next(batch) for r in results]
@@ -0,0 +1,330 @@
+"""Telegram subscriber registry and durable delivery queue.
+
+Subscribers are chats with the pairs, timeframes and minimum confidence they
+want alerts for ("*" matches everything). Fanning out a signal is a single
+INSERT ... SELECT into the `deliveries` table, so thousands of chats are
+queued in one transaction and nothing is lost if the process restarts.
+
+`DeliveryWorker` drains the queue: a global rate limit (Telegram allows about
+30 messages/second per bot), a minimum interval between messages to the same
+chat, and retries with exponential backoff. Claimed rows are leased rather
+than deleted, so a crash mid-send means the row is retried once the lease
+expires (at-least-once delivery). A sender raises `PermanentDeliveryError`
+for errors no retry can fix (chat not found, bot blocked, malformed message);
+those rows are dead-lettered (`failed = 1`) at once. Rate limits are per
+process, so the API runs the worker in one process only (the "delivery"
+role in leader.py).
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ANY = "*"
+CLAIM_BATCH = 100
+LEASE_SECONDS = 30.0
+MAX_BACKOFF = 300.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id TEXT PRIMARY KEY,
+    pairs TEXT NOT NULL DEFAULT '*',        -- ',EURUSD,GBPUSD,' or '*'
+    timeframes TEXT NOT NULL DEFAULT '*',   -- ',5m,4h,' or '*'
+    min_confidence REAL NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    parse_mode TEXT NOT NULL DEFAULT 'HTML',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created_at REAL NOT NULL,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS deliveries_due ON deliveries (failed, next_attempt, id);
+"""
+
+_MATCH = """
+    active = 1 AND min_confidence <= ?
+    AND (pairs = '*' OR instr(pairs, ?) > 0)
+    AND (timeframes = '*' OR ? IS NULL OR instr(timeframes, ?) > 0)
+"""
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a sender when retrying the message cannot succeed"""
+
+
+def _pack(values, upper: bool) -> str:
+    """List of pairs/timeframes as ',A,B,' (so instr matches whole items), or '*'"""
+    if not values or ANY in values:
+        return ANY
+    values = sorted({v.strip().upper() if upper else v.strip().lower() for v in values if v.strip()})
+    return "," + ",".join(values) + "," if values else ANY
+
+
+def _unpack(packed: str) -> list:
+    return [ANY] if packed == ANY else packed.strip(",").split(",")
+
+
+class DeliveryStore:
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Subscriber registry
+
+    def add_subscriber(self, chat_id: str, pairs=None, timeframes=None, min_confidence: float = 0.0):
+        """Create or replace a chat's subscription; min_confidence is a 0-1 fraction"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO subscribers (chat_id, pairs, timeframes, min_confidence, active, created_at)"
+                " VALUES (?, ?, ?, ?, 1, ?) ON CONFLICT (chat_id) DO UPDATE SET"
+                " pairs = excluded.pairs, timeframes = excluded.timeframes,"
+                " min_confidence = excluded.min_confidence, active = 1",
+                (str(chat_id), _pack(pairs, True), _pack(timeframes, False),
+                 float(min_confidence), time.time()))
+
+    def ensure_subscriber(self, chat_id: str):
+        """Register a chat for everything unless it already has a subscription"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO subscribers (chat_id, created_at) VALUES (?, ?)",
+                (str(chat_id), time.time()))
+
+    def remove_subscriber(self, chat_id: str) -> bool:
+        with self._lock:
+            cur = self._db.execute("DELETE FROM subscribers WHERE chat_id = ?", (str(chat_id),))
+            return cur.rowcount > 0
+
+    def subscribers(self, limit: int = 100, offset: int = 0) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT chat_id, pairs, timeframes, min_confidence, active FROM subscribers"
+                " ORDER BY created_at, chat_id LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [{"chat_id": c, "pairs": _unpack(p), "timeframes": _unpack(t),
+                 "min_confidence": m, "active": bool(a)} for c, p, t, m, a in rows]
+
+    def match(self, pair: str, timeframe: str = None, confidence: float = 1.0) -> list:
+        """Chat ids subscribed to this pair/timeframe at this confidence"""
+        with self._lock:
+            rows = self._db.execute(f"SELECT chat_id FROM subscribers WHERE {_MATCH}",
+                                    self._match_args(pair, timeframe, confidence)).fetchall()
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def _match_args(pair: str, timeframe: str, confidence: float) -> tuple:
+        tf = f",{timeframe.lower()}," if timeframe else None
+        return (float(confidence), f",{pair.upper()},", tf, tf)
+
+    # Delivery queue
+
+    def fan_out(self, message: str, pair: str, timeframe: str = None, confidence: float = 1.0,
+                parse_mode: str = "HTML") -> int:
+        """Queue one message for every matching subscriber; returns how many were queued"""
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO deliveries (chat_id, message, parse_mode, next_attempt, created_at)"
+                f" SELECT chat_id, ?, ?, ?, ? FROM subscribers WHERE {_MATCH}",
+                (message, parse_mode, now, now) + self._match_args(pair, timeframe, confidence))
+            return cur.rowcount
+
+    def enqueue(self, chat_ids, message: str, parse_mode: str = "HTML") -> int:
+        now = time.time()
+        rows = [(str(c), message, parse_mode, now, now) for c in chat_ids]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT INTO deliveries (chat_id, message, parse_mode, next_attempt, created_at)"
+                " VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+        return len(rows)
+
+    def claim(self, limit: int = CLAIM_BATCH, lease: float = LEASE_SECONDS) -> list:
+        """Lease up to `limit` due deliveries: [(id, chat_id, message, parse_mode, attempts)]"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, chat_id, message, parse_mode, attempts FROM deliveries"
+                    " WHERE failed = 0 AND next_attempt <= ? ORDER BY next_attempt, id LIMIT ?",
+                    (now, limit)).fetchall()
+                if rows:
+                    self._db.executemany("UPDATE deliveries SET next_attempt = ? WHERE id = ?",
+                                         [(now + lease, r[0]) for r in rows])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+
+    def ack(self, delivery_id: int):
+        with self._lock:
+            self._db.execute("DELETE FROM deliveries WHERE id = ?", (delivery_id,))
+
+    def defer(self, delivery_id: int, until: float):
+        with self._lock:
+            self._db.execute("UPDATE deliveries SET next_attempt = ? WHERE id = ?", (until, delivery_id))
+
+    def dead_letter(self, delivery_id: int, attempts: int):
+        """Give up on a delivery without further retries"""
+        with self._lock:
+            self._db.execute("UPDATE deliveries SET attempts = ?, failed = 1 WHERE id = ?",
+                             (attempts, delivery_id))
+
+    def retry(self, delivery_id: int, attempts: int, max_attempts: int):
+        """Record a failed attempt: back off exponentially, or give up after max_attempts"""
+        with self._lock:
+            if attempts >= max_attempts:
+                self._db.execute("UPDATE deliveries SET attempts = ?, failed = 1 WHERE id = ?",
+                                 (attempts, delivery_id))
+            else:
+                delay = min(2.0 ** attempts, MAX_BACKOFF)
+                self._db.execute("UPDATE deliveries SET attempts = ?, next_attempt = ? WHERE id = ?",
+                                 (attempts, time.time() + delay, delivery_id))
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM deliveries WHERE failed = 0").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            subs = self._db.execute("SELECT count(*), sum(active) FROM subscribers").fetchone()
+            pending, failed, oldest = self._db.execute(
+                "SELECT sum(failed = 0), sum(failed = 1), min(CASE WHEN failed = 0 THEN created_at END)"
+                " FROM deliveries").fetchone()
+        return {
+            "subscribers": subs[0],
+            "active_subscribers": subs[1] or 0,
+            "pending": pending or 0,
+            "failed": failed or 0,
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+
+class DeliveryWorker:
+    """Drains a DeliveryStore through `send(message, parse_mode, chat_id) -> bool`.
+
+    `send` returns False (or raises) for failures worth retrying and raises
+    PermanentDeliveryError for the rest.
+    """
+
+    def __init__(self, store: DeliveryStore, send, rate: float = 25.0, per_chat_interval: float = 1.0,
+                 concurrency: int = 8, max_attempts: int = 8, poll_interval: float = 0.5,
+                 lease: float = LEASE_SECONDS):
+        self.store = store
+        self.send = send
+        self.rate = rate                            # messages/second overall, 0 = unlimited
+        self.per_chat_interval = per_chat_interval  # seconds between messages to one chat
+        self.lease = lease                          # seconds a claimed row stays hidden from claim()
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._slots = asyncio.Semaphore(concurrency)
+        self._next_slot = 0.0
+        self._chat_ready = {}   # chat_id -> earliest time the next message may go out
+        self._inflight = set()
+        self.sent = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    async def run(self):
+        while True:
+            if not await self.drain_once():
+                await asyncio.sleep(self.poll_interval)
+
+    async def drain(self):
+        """Deliver until the queue holds nothing due (for replays and tests)"""
+        while True:
+            if await self.drain_once():
+                continue
+            if not self._inflight:
+                return
+            await self._wait_inflight()
+
+    async def drain_once(self) -> int:
+        """Claim one batch and start sending it; returns the number of rows claimed"""
+        claimed = time.monotonic()
+        rows = await asyncio.to_thread(self.store.claim, self.claim_limit(), self.lease)
+        for delivery_id, chat_id, message, parse_mode, attempts in rows:
+            now = time.monotonic()
+            ready = self._chat_ready.get(chat_id, 0.0)
+            if ready > now:
+                await asyncio.to_thread(self.store.defer, delivery_id, time.time() + (ready - now))
+                continue
+            self._chat_ready[chat_id] = now + self.per_chat_interval
+            await self._throttle()
+            await self._slots.acquire()
+            if time.monotonic() - claimed > self.lease / 2:
+                # Throttling or busy slots ate into the lease: extend it so the row
+                # is not claimed again (and sent twice) while this send is running
+                await asyncio.to_thread(self.store.defer, delivery_id, time.time() + self.lease)
+            task = asyncio.create_task(self._deliver(delivery_id, chat_id, message, parse_mode, attempts))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        if len(self._chat_ready) > 10000:
+            now = time.monotonic()
+            self._chat_ready = {c: t for c, t in self._chat_ready.items() if t > now}
+        return len(rows)
+
+    def claim_limit(self) -> int:
+        """Rows per claim: no more than the rate limit lets us start within half a lease"""
+        if not self.rate:
+            return CLAIM_BATCH
+        return max(1, min(CLAIM_BATCH, int(self.rate * self.lease / 2)))
+
+    async def _throttle(self):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        slot = max(self._next_slot, now)
+        self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _deliver(self, delivery_id: int, chat_id: str, message: str, parse_mode: str, attempts: int):
+        try:
+            try:
+                ok = await self.send(message, parse_mode, chat_id)
+            except PermanentDeliveryError as e:
+                logger.error(f"Telegram delivery to {chat_id} failed permanently, dead-lettered: {str(e)}")
+                self.dead_lettered += 1
+                await asyncio.to_thread(self.store.dead_letter, delivery_id, attempts + 1)
+                return
+            except Exception as e:
+                logger.error(f"Telegram delivery to {chat_id} raised: {str(e)}")
+                ok = False
+            if ok:
+                self.sent += 1
+                await asyncio.to_thread(self.store.ack, delivery_id)
+            else:
+                self.failed += 1
+                await asyncio.to_thread(self.store.retry, delivery_id, attempts + 1, self.max_attempts)
+        finally:
+            self._slots.release()
+
+    async def _wait_inflight(self):
+        if self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed_attempts": self.failed, "dead_lettered": self.dead_lettered,
+                "in_flight": len(self._inflight)}
@@ -0,0 +1,329 @@
+"""Versioned, memory-mapped feature matrices and labels for model training.
+
+For every pair/timeframe the store keeps the bars it was built from plus one
+row per bar of `model.FEATURES` (computed exactly as the live scoring stage
+does) and forward SL/TP outcomes for a long and a short entry at that bar's
+close, with levels from `core.sl_tp_from_atr`. Training reads the files with
+`np.memmap`, so opening years of history costs nothing up front.
+
+Layout (one writer per series at a time):
+  <root>/<version>/<PAIR>_<tf>/time.i64     bar open times, (n,)
+                              ohlc.f32     (n, 4) at core.BAR_DTYPE, as live analysis sees them
+                              X.f32        (n, len(FEATURES))
+                              labels.i8    (n, 2) long/short: 1 TP, -1 SL, 2 expired, 0 pending
+                              meta.json    row count and build settings, written last
+
+The version directory is a hash of the feature list and label settings, so
+changing either starts a fresh store instead of mixing rows. `update` only
+computes rows for the last stored bar, which may still have been forming
+when it was stored, and the bars after it (indicators warm up on a tail of
+stored bars), and re-labels the rows that were still inside the label
+horizon.
+
+  python feature_store.py update --file bars.csv --tf 5m     # or live data: --lookback 60d
+  python feature_store.py info
+  python feature_store.py train --tf 5m --out data/models/logistic.npz
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+import core
+import model
+from bars import Bars
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 3
+CONTEXT_BARS = 1000   # stored bars re-read to warm up indicators for new rows (EMA200 settles well within)
+WARMUP_BARS = 200     # rows before this have incomplete indicators and are left out of training
+LABELS = ("long", "short")
+TP, SL, EXPIRED, PENDING = 1, -1, 2, 0   # label values
+
+_FILES = {
+    "time": (np.int64, ()),
+    "ohlc": (np.float32, (4,)),   # core.BAR_DTYPE
+    "X": (np.float32, (len(model.FEATURES),)),
+    "labels": (np.int8, (len(LABELS),)),
+}
+_EXT = {"time": "i64", "ohlc": "f32", "X": "f32", "labels": "i8"}
+
+
+def forward_outcomes(high, low, close, atr, sl_mult: float, tp_mult: float, horizon: int) -> np.ndarray:
+    """(n, 2) int8 outcome of a long and a short entered at each close.
+
+    TP (1) when take-profit is reached first, SL (-1) when the stop is,
+    EXPIRED (2) when neither within `horizon` bars, PENDING (0) while fewer
+    than `horizon` bars follow (or there is no ATR to place the levels). A bar
+    crossing both levels counts as a loss, as in `PaperEngine.on_bar`.
+    """
+    n = len(close)
+    out = np.zeros((n, 2), dtype=np.int8)
+    levels = []
+    for direction in ("BUY", "SELL"):
+        # Offsets per ATR of price, so one call serves every bar
+        sl_off, tp_off = core.sl_tp_from_atr(0.0, direction, 1.0, sl_mult, tp_mult, 1.0)[:2]
+        levels.append((close + sl_off * atr, close + tp_off * atr))
+    (long_sl, long_tp), (short_sl, short_tp) = levels
+    open_ = np.isfinite(atr) & (atr > 0)
+    for j in range(1, min(horizon, n - 1) + 1):
+        m = n - j
+        hi, lo = high[j:], low[j:]
+        for col, stop_hit, target_hit in (
+                (0, lo <= long_sl[:m], hi >= long_tp[:m]),
+                (1, hi >= short_sl[:m], lo <= short_tp[:m])):
+            pending = open_[:m] & (out[:m, col] == PENDING)
+            out[:m, col][pending & stop_hit] = SL
+            out[:m, col][pending & target_hit & ~stop_hit] = TP
+    # Rows with a whole horizon of bars after them and no hit have expired
+    observed = open_ & (np.arange(n) < n - horizon)
+    out[observed[:, None] & (out == PENDING)] = EXPIRED
+    return out
+
+
+def feature_rows(bars: Bars) -> tuple:
+    """(model.FEATURES matrix, ATR) for every bar of a history; row i is what
+    model.features gives for a window ending at bar i"""
+    ind = core.compute_indicators(bars)
+    score = core.score_series(bars, ind)
+    close = np.asarray(bars.close, dtype=np.float64)
+    columns = model.feature_columns(score, close, {name: getattr(ind, name) for name in ind.__slots__})
+    return model.feature_matrix(np.column_stack(columns)), ind.atr
+
+
+class FeatureSet:
+    """Read-only memory-mapped view of one pair/timeframe"""
+
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self.meta = meta
+        n = meta["rows"]
+        for name, (dtype, shape) in _FILES.items():
+            arr = (np.memmap(os.path.join(path, f"{name}.{_EXT[name]}"), dtype=dtype, mode="r",
+                             shape=(n,) + shape) if n else np.empty((0,) + shape, dtype=dtype))
+            setattr(self, name, arr)
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def training_rows(self, label: str = "long") -> np.ndarray:
+        """Indexes of warmed-up rows whose `label` outcome is known (TP, SL or expired)"""
+        y = self.labels[:, LABELS.index(label)]
+        idx = np.flatnonzero(y != PENDING)
+        return idx[idx >= WARMUP_BARS]
+
+
+class FeatureStore:
+    def __init__(self, root: str, horizon: int = 96, sl_mult: float = 2.0, tp_mult: float = 3.0):
+        self.root = root
+        self.horizon = int(horizon)
+        self.sl_mult = float(sl_mult)
+        self.tp_mult = float(tp_mult)
+        self.settings = {"store": STORE_VERSION, "features": list(model.FEATURES), "horizon": self.horizon,
+                         "sl_mult": self.sl_mult, "tp_mult": self.tp_mult}
+        self.version = f"v{STORE_VERSION}-" + hashlib.sha1(
+            json.dumps(self.settings, sort_keys=True).encode()).hexdigest()[:10]
+        self.path = os.path.join(root, self.version)
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "FeatureStore":
+        return cls(cfg["feature_store"]["path"], cfg["feature_store"]["horizon"],
+                   cfg["risk"]["atr_sl_mult"], cfg["risk"]["atr_tp_mult"])
+
+    def series_path(self, pair: str, tf: str) -> str:
+        return os.path.join(self.path, f"{pair.upper()}_{tf}")
+
+    def _read_meta(self, path: str):
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def series(self) -> list:
+        """(pair, tf) of every series in this version"""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(tuple(d.rsplit("_", 1)) for d in os.listdir(self.path)
+                      if self._read_meta(os.path.join(self.path, d)))
+
+    def open(self, pair: str, tf: str) -> FeatureSet:
+        path = self.series_path(pair, tf)
+        meta = self._read_meta(path)
+        if meta is None:
+            raise KeyError(f"No features stored for {pair.upper()} {tf} in {self.path}")
+        return FeatureSet(path, meta)
+
+    def update(self, pair: str, tf: str, bars: Bars) -> int:
+        """Append rows for bars newer than the stored ones, rewriting the stored last
+        bar from `bars` (it may have been fetched still forming); returns the number added"""
+        path = self.series_path(pair, tf)
+        os.makedirs(path, exist_ok=True)
+        meta = self._read_meta(path) or dict(self.settings, pair=pair.upper(), tf=tf, rows=0, last_time=None)
+        n = meta["rows"]
+        files = {name: os.path.join(path, f"{name}.{_EXT[name]}") for name in _FILES}
+        for name, file in files.items():
+            # Drop rows of an update that died before its meta.json was written
+            with open(file, "ab") as f:
+                f.truncate(n * _row_size(name))
+
+        times = np.asarray(bars.time, dtype=np.int64)
+        first = int(np.searchsorted(times, meta["last_time"])) if meta["last_time"] is not None else 0
+        if first == len(times):
+            return 0
+        fresh = bars[first:]
+        # Rows are written from `row` on: the stored last bar is replaced when `bars` has it
+        row = n - 1 if n and times[first] == meta["last_time"] else n
+
+        ctx = min(row, max(CONTEXT_BARS, self.horizon))
+        if ctx:
+            stored = self.open(pair, tf)
+            ohlc = np.asarray(stored.ohlc[row - ctx:row])
+            history = Bars(np.asarray(stored.time[row - ctx:row]), *ohlc.T, dtype=np.float32).append(fresh)
+        else:
+            history = Bars(fresh.time, fresh.open, fresh.high, fresh.low, fresh.close, dtype=np.float32)
+        X, atr = feature_rows(history)
+        close = np.asarray(history.close, dtype=np.float64)
+        labels = forward_outcomes(np.asarray(history.high, dtype=np.float64),
+                                  np.asarray(history.low, dtype=np.float64),
+                                  close, atr, self.sl_mult, self.tp_mult, self.horizon)
+
+        # Rows still within the horizon of the previous update get their labels redone
+        relabel = min(row, self.horizon)
+        ohlc = np.column_stack([history.open[ctx:], history.high[ctx:], history.low[ctx:], history.close[ctx:]])
+        _write_rows(files["time"], _row_size("time"), row, np.asarray(fresh.time, dtype=np.int64))
+        _write_rows(files["ohlc"], _row_size("ohlc"), row, ohlc)
+        _write_rows(files["X"], _row_size("X"), row, X[ctx:])
+        _write_rows(files["labels"], _row_size("labels"), row - relabel, labels[ctx - relabel:])
+
+        meta.update(rows=row + len(fresh), last_time=int(fresh.time[-1]), updated_at=time.time())
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+        return row + len(fresh) - n
+
+    def info(self) -> dict:
+        series = {}
+        for pair, tf in self.series():
+            fs = self.open(pair, tf)
+            labels = np.asarray(fs.labels)
+            series[f"{pair}_{tf}"] = {
+                "rows": len(fs),
+                "last_time": fs.meta["last_time"],
+                "outcomes": {name: {kind: int((labels[:, col] == value).sum())
+                                    for kind, value in (("tp", TP), ("sl", SL), ("expired", EXPIRED),
+                                                        ("pending", PENDING))}
+                             for col, name in enumerate(LABELS)},
+                "bytes": sum(os.path.getsize(os.path.join(fs.path, f"{name}.{_EXT[name]}")) for name in _FILES),
+            }
+        return {"version": self.version, "path": self.path, "settings": self.settings, "series": series}
+
+
+def _row_size(name: str) -> int:
+    dtype, shape = _FILES[name]
+    return np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+
+
+def _write_rows(path: str, row_size: int, row: int, arr: np.ndarray):
+    """Write rows from index `row` on, in place and past the end (a rewrite
+    that dies before meta.json is updated leaves the stored row count valid)"""
+    with open(path, "r+b") as f:
+        f.seek(row * row_size)
+        f.write(np.ascontiguousarray(arr).tobytes())
+
+
+def train_logistic(sets: list, epochs: int = 20, lr: float = 0.1, chunk: int = 65536) -> model.LogisticModel:
+    """Fit model.LogisticModel by minibatch gradient descent.
+
+    The target is the long outcome (take-profit before stop or expiry), i.e.
+    the up-move probability the scoring stage expects from a model; stopped
+    and expired rows are both negatives, pending rows are left out.
+
+    Rows are read from the memory-mapped sets one chunk at a time, so the
+    training set never has to fit in memory. Features are standardized while
+    fitting and the scaling is folded back into the saved weights.
+    """
+    parts = [(fs, fs.training_rows("long")) for fs in sets]
+    total = sum(len(idx) for _, idx in parts)
+    if not total:
+        raise ValueError("No resolved training rows in the selected series")
+
+    def chunks():
+        for fs, idx in parts:
+            for start in range(0, len(idx), chunk):
+                rows = idx[start:start + chunk]
+                yield np.asarray(fs.X[rows], dtype=np.float64), (fs.labels[rows, 0] == TP).astype(np.float64)
+
+    s1 = np.zeros(len(model.FEATURES))
+    s2 = np.zeros(len(model.FEATURES))
+    for X, _ in chunks():
+        s1 += X.sum(axis=0)
+        s2 += (X * X).sum(axis=0)
+    mean = s1 / total
+    std = np.sqrt(np.maximum(s2 / total - mean * mean, 0.0))
+    std[std == 0] = 1.0
+
+    w = np.zeros(len(model.FEATURES))
+    b = 0.0
+    for epoch in range(epochs):
+        loss = 0.0
+        for X, y in chunks():
+            Z = (X - mean) / std
+            p = 1.0 / (1.0 + np.exp(-(Z @ w + b)))
+            err = p - y
+            w -= lr * (Z.T @ err) / len(y)
+            b -= lr * err.mean()
+            loss -= (y * np.log(p + 1e-12) + (1 - y) * np.log(1 - p + 1e-12)).sum()
+        logger.info(f"epoch {epoch + 1}/{epochs}: log loss {loss / total:.4f}")
+    return model.LogisticModel(w / std, b - float((w * mean / std).sum()))
+
+
+def main():
+    from config import cfg
+
+    parser = argparse.ArgumentParser(description="Build and train from the memory-mapped feature store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("update", help="append rows for new bars (builds the store on first run)")
+    up.add_argument("--file", help="bar file to read (replay.py CSV); default: live data source")
+    up.add_argument("--lookback", help="live data lookback (default: per-timeframe default)")
+    sub.add_parser("info", help="list stored series")
+    tr = sub.add_parser("train", help="fit a logistic model usable as MODEL_PATH")
+    tr.add_argument("--out", required=True, help="output .npz path")
+    tr.add_argument("--epochs", type=int, default=20)
+    for p in (up, tr):
+        p.add_argument("--tf", default="5m")
+        p.add_argument("--pairs", help="comma-separated pairs (default: config pairs)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = FeatureStore.from_config(cfg)
+    if args.command == "info":
+        print(json.dumps(store.info(), indent=2))
+        return
+    pairs = [p.upper() for p in (args.pairs.split(",") if args.pairs else cfg["pairs"])]
+    if args.command == "update":
+        if args.file:
+            from replay import load_bars
+            history = load_bars(args.file, args.tf)
+        else:
+            history = {p: core.fetch_bar_arrays(p, args.tf, lookback=args.lookback or core.default_lookback(args.tf))
+                       for p in pairs}
+        for pair in pairs:
+            if pair in history:
+                added = store.update(pair, args.tf, history[pair])
+                print(f"{pair} {args.tf}: +{added} rows")
+        return
+    sets = [store.open(p, args.tf) for p in pairs if (p, args.tf) in store.series()]
+    fitted = train_logistic(sets, args.epochs)
+    fitted.save(args.out)
+    print(f"Saved {args.out} ({sum(len(fs) for fs in sets)} rows from {len(sets)} series, {store.version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Response encodings for bulk endpoints.
+
+JSON responses are encoded with orjson when it is installed (the standard
+encoder otherwise); either way NaN and infinities are written as null.
+`FastJSONResponse` is the app's default response class, so every endpoint gets
+the faster encoder, but FastAPI still runs `jsonable_encoder` over a plain
+dict an endpoint returns. Bulk endpoints skip that pass by returning
+`respond(...)` or `stream_table(...)` responses, which FastAPI sends as they
+are. They also negotiate compact binary formats, chosen by `?format=` or the
+Accept header:
+
+  json      application/json                       every endpoint
+  msgpack   application/msgpack                    bulk endpoints (needs `msgpack`)
+  arrow     application/vnd.apache.arrow.stream    columnar history (needs `pyarrow`)
+
+Tables (bar history, job results) are streamed `CHUNK_ROWS` rows at a time,
+so a large result is never encoded in memory as a whole:
+
+  json      {<meta>..., "columns": [...], "rows": [[...], ...]}
+  msgpack   a header map {<meta>..., "columns": [...]}, then one array of
+            column arrays per chunk (read with msgpack.Unpacker)
+  arrow     one IPC stream; meta in the schema metadata, one record batch per chunk
+"""
+import importlib.util
+import io
+import json
+import math
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+CHUNK_ROWS = 5000
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+_ACCEPT_ALIASES = {
+    "application/json": "json",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+_PACKAGES = {"msgpack": "msgpack", "arrow": "pyarrow"}
+
+DOCUMENT = ("json", "msgpack")       # whole-object responses
+COLUMNAR = ("json", "msgpack", "arrow")
+
+_orjson = None  # the orjson module once resolved, False when it is not installed
+
+
+def _default(obj):
+    # numpy arrays and scalars in analysis results
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def _finite(obj):
+    # Non-finite floats as null, like orjson; the stdlib encoder would emit bare NaN
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if hasattr(obj, "tolist"):
+        return _finite(obj.tolist())
+    return obj
+
+
+def dumps_json(content) -> bytes:
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    if _orjson:
+        return _orjson.dumps(content, default=_default,
+                             option=_orjson.OPT_SERIALIZE_NUMPY | _orjson.OPT_NON_STR_KEYS)
+    try:
+        return json.dumps(content, default=_default, separators=(",", ":"), allow_nan=False).encode()
+    except ValueError:
+        return json.dumps(_finite(content), default=_default, separators=(",", ":")).encode()
+
+
+def _packb(content) -> bytes:
+    import msgpack
+    return msgpack.packb(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+
+class MsgpackResponse(Response):
+    media_type = MEDIA_TYPES["msgpack"]
+
+    def render(self, content) -> bytes:
+        return _packb(content)
+
+
+def available(fmt: str) -> bool:
+    package = _PACKAGES.get(fmt)
+    return package is None or importlib.util.find_spec(package) is not None
+
+
+def negotiate(accept: str = None, fmt: str = None, allowed=DOCUMENT) -> str:
+    """Format name for a request: `fmt` (the ?format= value) wins over Accept.
+
+    Raises ValueError when nothing acceptable can be produced (HTTP 406).
+    """
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in allowed:
+            raise ValueError(f"Unsupported format '{fmt}' (use {', '.join(allowed)})")
+        if not available(fmt):
+            raise ValueError(f"The {fmt} format requires the '{_PACKAGES[fmt]}' package")
+        return fmt
+    if not accept:
+        return "json"
+    ranges = []
+    for part in accept.split(","):
+        media, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((media.strip().lower(), q))
+    for media, q in sorted(ranges, key=lambda r: -r[1]):
+        if q <= 0:
+            continue
+        if media in ("*/*", "application/*"):
+            return "json"
+        name = _ACCEPT_ALIASES.get(media)
+        if name in allowed and available(name):
+            return name
+    raise ValueError(f"None of the accepted media types can be produced (available: "
+                     f"{', '.join(MEDIA_TYPES[f] for f in allowed if available(f))})")
+
+
+def respond(content, fmt: str, headers: dict = None, status_code: int = 200) -> Response:
+    """Whole-object response in a negotiated format"""
+    cls = MsgpackResponse if fmt == "msgpack" else FastJSONResponse
+    return cls(content, status_code=status_code, headers=dict(headers or {}, Vary="Accept"))
+
+
+def _column_list(col) -> list:
+    return col.tolist() if hasattr(col, "tolist") else list(col)
+
+
+def _json_table(meta: dict, names: list, chunks):
+    head = dumps_json(dict(meta, columns=names))
+    yield head[:-1] + b',"rows":['
+    sep = b""
+    for cols in chunks:
+        rows = list(zip(*(_column_list(c) for c in cols)))
+        if rows:
+            yield sep + dumps_json(rows)[1:-1]
+            sep = b","
+    yield b"]}"
+
+
+def _msgpack_table(meta: dict, names: list, chunks):
+    yield _packb(dict(meta, columns=names))
+    for cols in chunks:
+        yield _packb([_column_list(c) for c in cols])
+
+
+def _arrow_table(meta: dict, columns: list, chunks):
+    import pyarrow as pa
+    schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in columns],
+                       metadata={k: json.dumps(v) for k, v in meta.items()})
+    sink = io.BytesIO()
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield drain()
+        for cols in chunks:
+            # Declared types may be narrower than the source (float64 indicators -> float32)
+            arrays = [pa.array(c).cast(field.type, safe=False) for c, field in zip(cols, schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield drain()
+    yield drain()
+
+
+def stream_table(fmt: str, meta: dict, columns: list, chunks, headers: dict = None) -> StreamingResponse:
+    """Stream a table encoded chunk by chunk.
+
+    columns: [(name, arrow type alias)], e.g. ("time", "timestamp[s]"); the
+    types only shape the Arrow schema. chunks: iterable of column sequences
+    in `columns` order, consumed lazily while the response is sent.
+    """
+    names = [name for name, _ in columns]
+    if fmt == "arrow":
+        body = _arrow_table(meta, columns, chunks)
+    elif fmt == "msgpack":
+        body = _msgpack_table(meta, names, chunks)
+    else:
+        body = _json_table(meta, names, chunks)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=dict(headers or {}, Vary="Accept"))
+
+
+def row_chunks(fetch, chunk: int = CHUNK_ROWS):
+    """Column chunks from a paged row source `fetch(offset, limit) -> [row, ...]`"""
+    offset = 0
+    while True:
+        rows = fetch(offset, chunk)
+        if not rows:
+            return
+        yield [list(c) for c in zip(*rows)]
+        offset += len(rows)
+        if len(rows) < chunk:
+            return
+
+
+def array_chunks(arrays: list, chunk: int = CHUNK_ROWS):
+    """Column chunks (views, no copies) of equal-length arrays"""
+    n = len(arrays[0]) if arrays else 0
+    for start in range(0, n, chunk):
+        yield [a[start:start + chunk] for a in arrays]
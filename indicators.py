@@ -0,0 +1,136 @@
+"""Week-1 indicator set computed in one fused pass over the bar arrays.
+
+RSI(14), MACD(12,26,9), EMA 20/50/200, ATR(14), Bollinger(20,2) and the
+SMA20/SMA50 used by `core.score_signal`. Shared intermediates are computed
+once: the close diff feeds RSI, the true range feeds ATR, a single cumulative
+sum of close and close^2 feeds SMA20/SMA50/Bollinger, and every EMA (including
+the MACD signal line) runs as a first-order IIR filter (`scipy.signal.lfilter`)
+instead of a Python loop over the bars.
+"""
+from __future__ import annotations
+
+import math
+
+from bars import Bars
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+scipy_signal = lazy_import("scipy.signal")
+
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+EMA_SPANS = (20, 50, 200)
+BB_PERIOD, BB_STD = 20, 2.0
+
+
+def _window_sum(c: np.ndarray, period: int, n: int) -> np.ndarray:
+    # c is a cumulative sum with a leading zero
+    out = np.full(n, np.nan)
+    if n >= period:
+        out[period - 1:] = c[period:] - c[:-period]
+    return out
+
+
+def rolling_mean(x: np.ndarray, period: int) -> np.ndarray:
+    return _window_sum(np.cumsum(np.concatenate(([0.0], x))), period, len(x)) / period
+
+
+def ema(x: np.ndarray, span: int, seed: float) -> np.ndarray:
+    """EMA seeded with `seed` before the first value (ewm(adjust=False) when seed == x[0])"""
+    a = 2.0 / (span + 1)
+    return scipy_signal.lfilter([a], [1.0, a - 1.0], x, zi=[(1.0 - a) * seed])[0]
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    tr = high - low
+    if len(tr) > 1:
+        prev = close[:-1]
+        tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - prev), np.abs(low[1:] - prev)))
+    return tr
+
+
+class Indicators:
+    __slots__ = ("rsi", "macd", "macd_signal", "macd_hist", "ema20", "ema50", "ema200",
+                 "atr", "sma20", "sma50", "bb_upper", "bb_mid", "bb_lower")
+
+    def last(self, name: str) -> float:
+        arr = getattr(self, name)
+        return float(arr[-1]) if len(arr) else float("nan")
+
+    def latest(self) -> dict:
+        return {name: self.last(name) for name in self.__slots__}
+
+    def summary(self) -> dict:
+        """Latest values with a BULLISH/BEARISH/NEUTRAL read per indicator"""
+        v = self.latest()
+        rsi_signal = "BULLISH" if v["rsi"] < 30 else "BEARISH" if v["rsi"] > 70 else "NEUTRAL"
+        macd_signal = ("BULLISH" if v["macd_hist"] > 0 else
+                       "BEARISH" if v["macd_hist"] < 0 else "NEUTRAL")
+        if v["ema20"] > v["ema50"] > v["ema200"]:
+            ema_signal = "BULLISH"
+        elif v["ema20"] < v["ema50"] < v["ema200"]:
+            ema_signal = "BEARISH"
+        else:
+            ema_signal = "NEUTRAL"
+        return {
+            "rsi": {"value": _clean(v["rsi"]), "signal": rsi_signal},
+            "macd": {"value": _clean(v["macd"]), "signal_line": _clean(v["macd_signal"]),
+                     "histogram": _clean(v["macd_hist"]), "signal": macd_signal},
+            "ema": {"ema20": _clean(v["ema20"]), "ema50": _clean(v["ema50"]),
+                    "ema200": _clean(v["ema200"]), "signal": ema_signal},
+            "atr": {"value": _clean(v["atr"])},
+            "bollinger": {"upper": _clean(v["bb_upper"]), "middle": _clean(v["bb_mid"]),
+                          "lower": _clean(v["bb_lower"])},
+        }
+
+
+def _clean(x: float):
+    # NaN is not valid JSON; report indicators still warming up as null
+    return None if math.isnan(x) else x
+
+
+def compute_indicators(bars: Bars) -> Indicators:
+    close = np.asarray(bars.close, dtype=np.float64)
+    high = np.asarray(bars.high, dtype=np.float64)
+    low = np.asarray(bars.low, dtype=np.float64)
+    n = len(close)
+    out = Indicators()
+
+    # Shared diff -> RSI (simple rolling means, matching core.rsi)
+    delta = np.diff(close, prepend=np.nan)
+    gains = np.cumsum(np.concatenate(([0.0], np.where(delta > 0, delta, 0.0))))
+    losses = np.cumsum(np.concatenate(([0.0], np.where(delta < 0, -delta, 0.0))))
+    gain = _window_sum(gains, RSI_PERIOD, n)
+    loss = _window_sum(losses, RSI_PERIOD, n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out.rsi = 100 - (100 / (1 + gain / np.where(loss == 0, np.nan, loss)))
+
+    # Shared true range -> ATR
+    out.atr = rolling_mean(true_range(high, low, close), ATR_PERIOD)
+
+    # Shared cumulative sums -> SMA20/SMA50/Bollinger(20, population std)
+    csum = np.cumsum(np.concatenate(([0.0], close)))
+    out.sma20 = _window_sum(csum, BB_PERIOD, n) / BB_PERIOD
+    out.sma50 = _window_sum(csum, 50, n) / 50
+    # Variance from sums of squares, shifted by the first close to limit cancellation
+    shifted = close - close[0] if n else close
+    csq = np.cumsum(np.concatenate(([0.0], shifted * shifted)))
+    mean_shift = out.sma20 - (close[0] if n else 0.0)
+    var = np.maximum(_window_sum(csq, BB_PERIOD, n) / BB_PERIOD - mean_shift * mean_shift, 0.0)
+    band = BB_STD * np.sqrt(var)
+    out.bb_mid = out.sma20
+    out.bb_upper = out.sma20 + band
+    out.bb_lower = out.sma20 - band
+
+    # Every EMA seeded with the first close, like ewm(adjust=False)
+    seed = float(close[0]) if n else 0.0
+    ema20, ema50, ema200 = (ema(close, span, seed) for span in EMA_SPANS)
+    ema_fast = ema(close, MACD_FAST, seed)
+    ema_slow = ema(close, MACD_SLOW, seed)
+    macd_sig = ema(ema_fast - ema_slow, MACD_SIGNAL, 0.0)
+    out.ema20, out.ema50, out.ema200 = ema20, ema50, ema200
+    out.macd = ema_fast - ema_slow
+    out.macd_signal = macd_sig
+    out.macd_hist = out.macd - macd_sig
+    return out
@@ -0,0 +1,367 @@
+"""Background jobs for backtests and parameter sweeps.
+
+Jobs run outside the API process so research never competes with the live
+signal path: on a local process pool by default (lower CPU priority), or on
+Celery workers when JOBS_CELERY_BROKER is set (`celery -A jobs.celery_app
+worker`; the workers must see the same job database).
+
+State lives in one SQLite file. A job row holds the spec, status, progress
+and final summary; results (trades for a backtest, one summary per
+combination for a sweep) are stored as JSON arrays under column names kept
+once per job, appended while the job runs so clients can page or stream
+partial results. Cancelling sets a flag that the running job checks on its
+next progress flush.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import backtest
+import model
+from config import cfg as default_cfg
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = ("succeeded", "failed", "cancelled")
+FLUSH_INTERVAL = 0.5     # seconds between progress/result writes from a running job
+FLUSH_ROWS = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER NOT NULL DEFAULT 0,
+    columns TEXT NOT NULL,
+    summary TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner_pid INTEGER,                -- API process that submitted it (local backend)
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS job_rows (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def create(self, kind: str, spec: dict, columns: list) -> str:
+        job_id = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, spec, status, columns, owner_pid, created_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(spec), json.dumps(columns), os.getpid(), time.time()))
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            cur = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cur.fetchone()
+            names = [d[0] for d in cur.description]
+        return _job_dict(dict(zip(names, row))) if row else None
+
+    def list(self, status: str = None, limit: int = 50, offset: int = 0) -> list:
+        query = "SELECT * FROM jobs"
+        args = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._lock:
+            cur = self._db.execute(query + " ORDER BY created_at DESC LIMIT ? OFFSET ?", args + (limit, offset))
+            names = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+        return [_job_dict(dict(zip(names, r)), brief=True) for r in rows]
+
+    def start(self, job_id: str) -> bool:
+        """Mark a queued job running; False if it was cancelled before it started"""
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'"
+                " AND cancel_requested = 0", (time.time(), job_id))
+            return cur.rowcount == 1
+
+    def progress(self, job_id: str, done: int, total: int, rows: list) -> bool:
+        """Record progress and append result rows; returns True if cancellation was requested"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                start = self._db.execute("SELECT rows FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+                if rows:
+                    self._db.executemany("INSERT INTO job_rows VALUES (?, ?, ?)",
+                                         [(job_id, start + i, json.dumps(r)) for i, r in enumerate(rows)])
+                self._db.execute("UPDATE jobs SET done = ?, total = ?, rows = ? WHERE id = ?",
+                                 (done, total, start + len(rows), job_id))
+                cancel = self._db.execute("SELECT cancel_requested FROM jobs WHERE id = ?",
+                                          (job_id,)).fetchone()[0]
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return bool(cancel)
+
+    def finish(self, job_id: str, status: str, summary: dict = None, error: str = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, summary = ?, error = ?, finished_at = ? WHERE id = ?"
+                " AND status NOT IN ('succeeded', 'failed', 'cancelled')",
+                (status, json.dumps(summary) if summary is not None else None, error, time.time(), job_id))
+
+    def request_cancel(self, job_id: str) -> str:
+        """Flag a job for cancellation; a queued job is cancelled at once. Returns its status"""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id))
+            row = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def rows(self, job_id: str, offset: int = 0, limit: int = 500) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM job_rows WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (job_id, offset, limit)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def fail_interrupted(self) -> int:
+        """Fail unfinished jobs whose submitting API process has exited (local backend only)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, owner_pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            orphans = [(time.time(), job_id) for job_id, pid in rows if not _alive(pid)]
+            self._db.executemany(
+                "UPDATE jobs SET status = 'failed', error = 'interrupted by restart', finished_at = ?"
+                " WHERE id = ?", orphans)
+        return len(orphans)
+
+
+def _alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _job_dict(row: dict, brief: bool = False) -> dict:
+    out = {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": round(row["done"] / row["total"], 4) if row["total"] else 0.0,
+        "rows": row["rows"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "error": row["error"],
+    }
+    if not brief:
+        out["spec"] = json.loads(row["spec"])
+        out["columns"] = json.loads(row["columns"])
+        out["summary"] = json.loads(row["summary"]) if row["summary"] else None
+        out["cancel_requested"] = bool(row["cancel_requested"])
+    return out
+
+
+class _Reporter:
+    """progress() callback for backtest runners: buffers rows and flushes periodically"""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.done = self.total = 0
+        self.buffer = []
+        self.last_flush = 0.0
+
+    def __call__(self, done: int, total: int, rows: list):
+        self.done, self.total = done, total
+        self.buffer += rows
+        if len(self.buffer) >= FLUSH_ROWS or time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self, check_cancel: bool = True):
+        rows, self.buffer = self.buffer, []
+        cancelled = self.store.progress(self.job_id, self.done, self.total, rows)
+        self.last_flush = time.monotonic()
+        if cancelled and check_cancel:
+            raise JobCancelled()
+
+
+def execute(job_id: str, db_path: str, cfg: dict = None):
+    """Run one job to completion in the current process (pool worker or Celery task)"""
+    store = JobStore(db_path)
+    try:
+        job = store.get(job_id)
+        if job is None or not store.start(job_id):
+            return
+        cfg = cfg or default_cfg
+        reporter = _Reporter(store, job_id)
+        try:
+            model.ensure_loaded(cfg["model"]["path"])
+            summary = backtest.RUNNERS[job["kind"]](job["spec"], cfg, reporter)
+            reporter.flush(check_cancel=False)
+            store.finish(job_id, "succeeded", summary)
+        except JobCancelled:
+            store.finish(job_id, "cancelled")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            reporter.flush(check_cancel=False)
+            store.finish(job_id, "failed", error=f"{type(e).__name__}: {e}")
+    finally:
+        store.close()
+
+
+def _lower_priority(nice: int):
+    try:
+        os.nice(nice)
+    except (AttributeError, OSError):
+        pass
+
+
+class LocalBackend:
+    """Process pool in this host; started on the first submitted job"""
+
+    def __init__(self, db_path: str, workers: int = 1, nice: int = 10):
+        self.db_path = db_path
+        self.workers = workers
+        self.nice = nice
+        self._pool = None
+        self._futures = {}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: the API process runs threads, which fork does not handle safely
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_lower_priority, initargs=(self.nice,))
+        return self._pool
+
+    def submit(self, job_id: str, cfg: dict, on_crash=None):
+        try:
+            future = self._executor().submit(execute, job_id, self.db_path, cfg)
+        except BrokenProcessPool:
+            self._pool = None
+            future = self._executor().submit(execute, job_id, self.db_path, cfg)
+        self._futures[job_id] = future
+
+        def done(f):
+            self._futures.pop(job_id, None)
+            if not f.cancelled() and f.exception() is not None and on_crash is not None:
+                on_crash(job_id, f.exception())
+        future.add_done_callback(done)
+
+    def cancel(self, job_id: str):
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()
+
+    def pending(self) -> list:
+        return list(self._futures)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CeleryBackend:
+    def __init__(self, db_path: str, app):
+        self.db_path = db_path
+        self.app = app
+
+    def submit(self, job_id: str, cfg: dict, on_crash=None):
+        # Workers read their own config; only the id and database path travel
+        self.app.send_task("forexbot.jobs.execute", args=(job_id, self.db_path), task_id=job_id)
+
+    def cancel(self, job_id: str):
+        self.app.control.revoke(job_id)
+
+    def shutdown(self):
+        pass
+
+
+def make_celery(broker: str):
+    try:
+        from celery import Celery
+    except ImportError:
+        raise RuntimeError("The Celery job backend requires the 'celery' package")
+    app = Celery("forexbot_jobs", broker=broker)
+    app.conf.task_acks_late = True
+    app.task(name="forexbot.jobs.execute")(execute)
+    return app
+
+
+celery_app = make_celery(default_cfg["jobs"]["celery_broker"]) if default_cfg["jobs"]["celery_broker"] else None
+
+
+class JobManager:
+    def __init__(self, db_path: str, workers: int = 1, nice: int = 10):
+        self.store = JobStore(db_path)
+        if celery_app is not None:
+            self.backend = CeleryBackend(db_path, celery_app)
+        else:
+            self.backend = LocalBackend(db_path, workers, nice)
+            failed = self.store.fail_interrupted()
+            if failed:
+                logger.warning(f"Marked {failed} interrupted jobs as failed")
+
+    def submit(self, kind: str, spec: dict, cfg: dict) -> dict:
+        if kind not in backtest.RUNNERS:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        job_id = self.store.create(kind, spec, backtest.result_columns(kind, spec))
+        self.backend.submit(job_id, cfg, on_crash=self._crashed)
+        logger.info(f"Queued {kind} job {job_id}")
+        return self.store.get(job_id)
+
+    def _crashed(self, job_id: str, error):
+        self.store.finish(job_id, "failed", error=f"worker crashed: {error}")
+
+    def cancel(self, job_id: str) -> str:
+        status = self.store.request_cancel(job_id)
+        if status == "cancelled":
+            self.backend.cancel(job_id)
+        return status
+
+    def shutdown(self):
+        if isinstance(self.backend, LocalBackend):
+            # Running jobs stop at their next progress flush instead of holding up exit
+            for job_id in self.backend.pending():
+                self.store.request_cancel(job_id)
+        self.backend.shutdown()
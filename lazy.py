@@ -0,0 +1,37 @@
+"""Deferred imports for heavy third-party modules.
+
+`np = lazy_import("numpy")` binds a module object whose real import runs on
+first attribute access, so importing `core` or `api` does not pay for numpy,
+pandas or yfinance until a request actually needs them. Modules using this
+must not touch the module at import time (defaults, annotations, constants);
+`from __future__ import annotations` keeps annotations unevaluated.
+
+The stand-in never replaces the real module in `sys.modules`: the first
+access imports it through the regular import system, whose per-module locks
+make concurrent first use from executor threads safe (`importlib.util.LazyLoader`
+is not thread-safe before Python 3.12.3), then copies its namespace so later
+lookups are plain attribute hits.
+"""
+import importlib
+import importlib.util
+import sys
+import types
+
+
+class _LazyModule(types.ModuleType):
+    def __getattr__(self, attr):
+        # Only reached for names not copied from the real module yet
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    # Only the top-level package is looked up: finding "scipy.signal" would
+    # import scipy (and numpy with it) right here
+    if importlib.util.find_spec(name.partition(".")[0]) is None:
+        raise ImportError(f"No module named '{name}'")
+    return _LazyModule(name)
@@ -0,0 +1,52 @@
+"""Single-instance roles for background work shared by API worker processes.
+
+Every uvicorn worker runs the startup event, but some work must happen once
+per deployment: the streaming pipeline (one feed connection, one analysis per
+closed bar), the paper-trading engine (one in-memory book) and the Telegram
+delivery drainer (one global rate limit). `lead`
+keeps trying a non-blocking flock on `<lock_dir>/<role>.lock`; the worker that
+gets it runs the role, the others wait and take over if the holder exits. The
+lock is released by the kernel when its process dies, so a crashed leader never
+leaves a stale lock behind.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+LOCK_DIR = "data/locks"
+RETRY_SECONDS = 5.0
+
+held = set()  # roles this process currently runs
+
+
+def try_acquire(role: str, lock_dir: str = None):
+    """Open file holding the role's lock, or None when another process has it"""
+    lock_dir = lock_dir or LOCK_DIR
+    os.makedirs(lock_dir, exist_ok=True)
+    handle = open(os.path.join(lock_dir, f"{role}.lock"), "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+async def lead(role: str, run, lock_dir: str = None, retry: float = RETRY_SECONDS):
+    """Await `run()` once this process holds the role's lock; returns what run() returns"""
+    handle = try_acquire(role, lock_dir)
+    if handle is None:
+        logger.info(f"Another worker runs {role}; standing by")
+        while handle is None:
+            await asyncio.sleep(retry)
+            handle = try_acquire(role, lock_dir)
+    held.add(role)
+    logger.info(f"Worker {os.getpid()} runs {role}")
+    try:
+        return await run()
+    finally:
+        held.discard(role)
+        handle.close()  # releases the lock
@@ -0,0 +1,302 @@
+"""Load-test harness for the api.py endpoints.
+
+The app runs either in-process (ASGI transport, no sockets) or as a local
+uvicorn server, always with stubbed backends: bars come from a seeded
+synthetic random walk through `core.BAR_SOURCE` and the Telegram sender only
+records. The harness app never touches the deployment's state: warm start,
+the stream feed, the shared cache and the model are off, and SQLite files,
+paper-trading state and role locks live in a per-process temporary directory
+removed on exit. A fixed number of concurrent clients send a weighted request
+mix, and the JSON report (throughput, p50/p95/p99 latency, error rate per
+endpoint) carries the git commit so runs can be compared across commits.
+
+  python loadtest.py --concurrency 50 --requests 5000
+  python loadtest.py --server --workers 2 --duration 30 --mix signal=1,analyze=3
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+import core
+from bars import Bars
+from streaming import TF_SECONDS
+
+DEFAULT_MIX = "signal=4,alert=1,analyze=4,analyze_many=1,health=1"
+SYNTH_BARS = 2000
+
+_synthetic = {}
+
+
+def synthetic_source(pair: str, tf: str, lookback: str = "7d"):
+    """Seeded random-walk bars, identical on every run for the same pair/timeframe"""
+    key = (pair.upper(), tf.lower())
+    if key not in _synthetic:
+        rng = np.random.default_rng(zlib.crc32(":".join(key).encode()))
+        base = 150.0 if "JPY" in key[0] else 1.1
+        close = base * np.exp(np.cumsum(rng.normal(0, 3e-4, SYNTH_BARS)))
+        open_ = np.r_[close[0], close[:-1]]
+        spread = base * rng.random(SYNTH_BARS) * 1e-4
+        step = TF_SECONDS[key[1]]
+        times = 1704067200 + np.arange(SYNTH_BARS) * step
+        _synthetic[key] = Bars(times, open_, np.maximum(open_, close) + spread,
+                               np.minimum(open_, close) - spread, close).to_frame()
+    return _synthetic[key]
+
+
+def _scratch_root() -> str:
+    """Temporary directory of this run (shared with server workers via LOADTEST_DIR)"""
+    root = os.environ.get("LOADTEST_DIR")
+    if not root:
+        root = os.environ["LOADTEST_DIR"] = tempfile.mkdtemp(prefix="loadtest-")
+        atexit.register(shutil.rmtree, root, ignore_errors=True)
+    return root
+
+
+def isolate_config(cfg: dict) -> str:
+    """Point every persistent side effect of the API at a scratch directory.
+
+    Must run before `api` is imported: the paper inbox, delivery store and
+    shared cache are built at import time. Each process gets its own directory,
+    so every server worker elects itself for its in-memory delivery queue.
+    """
+    workdir = tempfile.mkdtemp(prefix="worker-", dir=_scratch_root())
+    cfg["warm_start"] = dict(cfg["warm_start"], enabled=False, path=os.path.join(workdir, "warm_start.npz"))
+    cfg["stream"] = dict(cfg["stream"], feed="")
+    cfg["shared_cache"] = dict(cfg["shared_cache"], url="")
+    cfg["model"] = dict(cfg["model"], path="")
+    cfg["paper"] = dict(cfg["paper"], state_path=os.path.join(workdir, "paper_state.json"),
+                        trades_path=os.path.join(workdir, "paper_trades.jsonl"))
+    cfg["delivery"] = dict(cfg["delivery"], db_path=":memory:")
+    cfg["jobs"] = dict(cfg["jobs"], db_path=os.path.join(workdir, "jobs.db"), celery_broker="")
+    cfg["roles"] = dict(cfg["roles"], lock_dir=os.path.join(workdir, "locks"))
+    return workdir
+
+
+def create_app():
+    """api.app with stubbed data and Telegram (in-memory queue) backends"""
+    from config import cfg
+    isolate_config(cfg)
+    import api
+    from delivery import DeliveryStore
+    from replay import RecordingTelegramService
+
+    core.BAR_SOURCE = synthetic_source
+    api.telegram_service = RecordingTelegramService()
+    api.delivery_store = DeliveryStore()
+    api.delivery_store.ensure_subscriber(api.telegram_service.chat_id)
+    return api.app
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in REQUESTS:
+            raise ValueError(f"Unknown request kind '{name}' (use {', '.join(REQUESTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _signal(rng: random.Random, pairs: list) -> tuple:
+    return "POST", "/forex/signal", {
+        "pair": rng.choice(pairs), "action": rng.choice(["BUY", "SELL", "HOLD"]),
+        "price": 1.1, "confidence": 0.8, "stop_loss": 1.09, "take_profit": 1.12,
+    }
+
+
+def _alert(rng: random.Random, pairs: list) -> tuple:
+    return "POST", "/alerts/telegram", {"message": "load test", "priority": "normal"}
+
+
+def _analyze(rng: random.Random, pairs: list) -> tuple:
+    return "GET", f"/analyze/{rng.choice(pairs)}/{rng.choice(list(TF_SECONDS))}", None
+
+
+def _analyze_many(rng: random.Random, pairs: list) -> tuple:
+    return "GET", f"/analyze?pairs={','.join(pairs)}&tf={rng.choice(list(TF_SECONDS))}", None
+
+
+def _health(rng: random.Random, pairs: list) -> tuple:
+    return "GET", "/health", None
+
+
+REQUESTS = {
+    "signal": _signal,
+    "alert": _alert,
+    "analyze": _analyze,
+    "analyze_many": _analyze_many,
+    "health": _health,
+}
+
+
+def _summary(latencies: list, errors: int, elapsed: float) -> dict:
+    n = len(latencies)
+    out = {"requests": n, "errors": errors,
+           "error_rate": round(errors / n, 4) if n else 0.0,
+           "throughput_rps": round(n / elapsed, 1) if elapsed else None}
+    if n:
+        a = np.asarray(latencies) * 1000
+        out.update({
+            "p50_ms": round(float(np.percentile(a, 50)), 3),
+            "p95_ms": round(float(np.percentile(a, 95)), 3),
+            "p99_ms": round(float(np.percentile(a, 99)), 3),
+            "max_ms": round(float(a.max()), 3),
+        })
+    return out
+
+
+async def run_load(client, mix: dict, pairs: list, concurrency: int,
+                   total: int = None, duration: float = None, seed: int = 0) -> dict:
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    results = {k: {"lat": [], "errors": 0, "status": {}} for k in kinds}
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker(wid: int):
+        nonlocal issued
+        rng = random.Random(seed * 1000 + wid)
+        while True:
+            if total is not None and issued >= total:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            issued += 1
+            kind = rng.choices(kinds, weights)[0]
+            method, path, body = REQUESTS[kind](rng, pairs)
+            r = results[kind]
+            t0 = time.perf_counter()
+            try:
+                resp = await client.request(method, path, json=body)
+                status = resp.status_code
+            except Exception as e:
+                status = type(e).__name__
+            r["lat"].append(time.perf_counter() - t0)
+            r["status"][str(status)] = r["status"].get(str(status), 0) + 1
+            if status != 200:
+                r["errors"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    all_lat = [x for r in results.values() for x in r["lat"]]
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": _summary(all_lat, sum(r["errors"] for r in results.values()), elapsed),
+        "endpoints": {k: dict(_summary(r["lat"], r["errors"], elapsed), status=r["status"])
+                      for k, r in results.items()},
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_healthy(client, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError("Server did not become healthy")
+
+
+async def main_async(args) -> dict:
+    import httpx
+
+    mix = parse_mix(args.mix)
+    pairs = args.pairs.split(",")
+    server = None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.server:
+        _scratch_root()  # inherited by the server, removed when the harness exits
+        port = _free_port()
+        server = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "loadtest:create_app", "--factory",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers),
+            "--log-level", "warning",
+        ], cwd=os.path.dirname(os.path.abspath(__file__)))
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60)
+    else:
+        transport = httpx.ASGITransport(app=create_app())
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60)
+    try:
+        await _wait_healthy(client)
+        if args.warmup:
+            await run_load(client, mix, pairs, args.concurrency, total=args.warmup, seed=args.seed + 1)
+        report = await run_load(client, mix, pairs, args.concurrency, total=args.requests,
+                                duration=args.duration, seed=args.seed)
+    finally:
+        await client.aclose()
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "mode": "server" if args.server else "in-process",
+        "workers": args.workers if args.server else 1,
+        "concurrency": args.concurrency,
+        "mix": mix,
+        "pairs": pairs,
+        "seed": args.seed,
+        **report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API with stubbed backends")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--warmup", type=int, default=50, help="untimed requests before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="kind=weight list: " + ",".join(REQUESTS))
+    parser.add_argument("--pairs", default="EURUSD,GBPUSD,USDJPY")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", action="store_true", help="run a local uvicorn server instead of in-process")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --server")
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.requests = 1000
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
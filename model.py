@@ -0,0 +1,151 @@
+"""Model-scoring stage for the analysis confidence.
+
+A model maps indicator features of a scored bar to the probability that
+price moves up. `core.analyze_batch` builds one feature matrix for every
+pair/timeframe in a cycle and makes a single `predict` call; the probability,
+read in the direction of the rule score, is blended into `confidence` before
+the threshold guards run.
+
+Supported model files, loaded once at startup:
+  .npz             logistic regression (weights, bias, feature names); numpy only
+  .joblib / .pkl   scikit-learn estimator with predict_proba (trusted files only)
+  .keras / .h5     TensorFlow/Keras model with one sigmoid output
+"""
+from __future__ import annotations
+
+import logging
+import os
+
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ("score", "rsi", "macd_hist_atr", "ema20_dist", "ema50_dist", "ema200_dist",
+            "sma_trend", "bb_position", "bb_width", "atr_pct")
+
+MODEL = None
+MODEL_PATH = None
+
+
+def feature_columns(score, price, v: dict) -> list:
+    """FEATURES from a score, price and indicator values (indicator distances are in
+    ATRs, so pairs are comparable). Works on scalars for one bar and on arrays for a
+    whole history (feature_store); NaNs from short history are zeroed in feature_matrix.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        atr = np.where(v["atr"] > 0, v["atr"], np.nan)
+        band = v["bb_upper"] - v["bb_lower"]
+        return [
+            score,
+            v["rsi"] / 100.0,
+            v["macd_hist"] / atr,
+            (price - v["ema20"]) / atr,
+            (price - v["ema50"]) / atr,
+            (price - v["ema200"]) / atr,
+            (v["sma20"] - v["sma50"]) / atr,
+            np.where(band > 0, (price - v["bb_lower"]) / band, 0.5),
+            band / atr,
+            atr / price,
+        ]
+
+
+def features(res) -> list:
+    """Feature row for a SignalResult"""
+    return [float(c) for c in feature_columns(res.score, res.price, res.indicators.latest())]
+
+
+def feature_matrix(rows):
+    """(n, len(FEATURES)) float32 matrix; missing values (short history, zero ATR) become 0"""
+    X = np.asarray(rows, dtype=np.float64).reshape(len(rows), len(FEATURES))
+    X[~np.isfinite(X)] = 0.0
+    return X.astype(np.float32)
+
+
+class LogisticModel:
+    def __init__(self, weights, bias: float, feature_names=FEATURES):
+        if tuple(feature_names) != FEATURES:
+            raise ValueError("Model was trained on a different feature set")
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+
+    def predict(self, X):
+        return 1.0 / (1.0 + np.exp(-(X @ self.weights + self.bias)))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, weights=self.weights, bias=np.float32(self.bias), features=np.array(FEATURES))
+
+    @classmethod
+    def load(cls, path: str) -> "LogisticModel":
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]), [str(f) for f in data["features"]])
+
+
+class SklearnModel:
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def predict(self, X):
+        return self.estimator.predict_proba(X)[:, 1]
+
+
+class KerasModel:
+    def __init__(self, keras_model):
+        self.keras_model = keras_model
+
+    def predict(self, X):
+        return np.asarray(self.keras_model.predict(X, verbose=0)).reshape(-1)
+
+
+def load(path: str):
+    """Load a model file and make it the active one"""
+    global MODEL, MODEL_PATH
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npz":
+        loaded = LogisticModel.load(path)
+    elif ext in (".joblib", ".pkl"):
+        try:
+            import joblib
+        except ImportError:
+            raise RuntimeError("scikit-learn models require the 'joblib' package")
+        loaded = SklearnModel(joblib.load(path))
+    elif ext in (".keras", ".h5"):
+        try:
+            from tensorflow import keras
+        except ImportError:
+            raise RuntimeError("Keras models require the 'tensorflow' package")
+        loaded = KerasModel(keras.models.load_model(path))
+    else:
+        raise ValueError(f"Unsupported model file '{path}'")
+    MODEL, MODEL_PATH = loaded, path
+    logger.info(f"Loaded {type(loaded).__name__} from {path}")
+    return loaded
+
+
+def ensure_loaded(path: str):
+    """Load the configured model unless it is already active (job worker processes)"""
+    if path and path != MODEL_PATH:
+        load(path)
+
+
+def fingerprint(path: str) -> str:
+    """Identifies a model file version, for cache keys and ETags"""
+    if not path or not os.path.exists(path):
+        return ""
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def predict(rows: list):
+    """Up-move probabilities for feature rows in one batched call; None without a model"""
+    if MODEL is None or not rows:
+        return None
+    p = np.asarray(MODEL.predict(feature_matrix(rows)), dtype=np.float64).reshape(-1)
+    return np.clip(np.nan_to_num(p, nan=0.5), 0.0, 1.0).tolist()
+
+
+def directional_confidence(prob: float, score: float) -> float:
+    """Model confidence (0-100) in the direction the rule score points"""
+    return 100.0 * (prob if score >= 0 else 1.0 - prob)
@@ -0,0 +1,475 @@
+"""Event-driven paper-trading engine.
+
+BUY/SELL results from `core.analyze_pair_tf` open simulated positions at their
+entry with the result's stop_loss/take_profit. Open positions are indexed per
+pair in four price-ordered heaps (long SL, long TP, short SL, short TP), so a
+new bar only pops the positions whose level it actually crossed. Closed heap
+entries are removed lazily and the heaps are compacted when stale entries
+outnumber live ones.
+
+Books are kept per pair and timeframe: a position is resolved by the bars of
+the timeframe that opened it, and each (pair, tf) remembers the last bar it
+processed and the last bar it opened a position on, so repeated polls of the
+same history neither replay old bars nor open duplicate positions.
+
+The engine lives in memory in one process. With a state file, every open,
+close and new bar is appended as one line to `<state_path>.journal`, and the
+full JSON snapshot is only written every `save_interval` seconds and on
+`save()`, which also empties the journal; loading replays the journal over
+the snapshot. Closed trades are also appended to a JSONL trade log. API
+workers that do not own the engine hand their results to it through a
+`PaperInbox`.
+"""
+import bisect
+import fcntl
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+from core import pip_value
+
+logger = logging.getLogger(__name__)
+
+SAVE_INTERVAL = 30.0         # seconds between snapshots; the journal covers the gap
+INBOX_BARS = 500             # bars handed over with a worker's first result for a pair
+INBOX_COMPACT_BYTES = 1 << 20
+SIGNAL_FIELDS = ("pair", "timeframe", "direction", "entry", "stop_loss", "take_profit", "bar_time")
+
+
+class Position:
+    __slots__ = ("id", "pair", "timeframe", "direction", "entry", "stop_loss", "take_profit",
+                 "opened_at", "closed_at", "exit_price", "outcome", "pnl_pips")
+
+    def __init__(self, id: int, pair: str, timeframe: str, direction: str, entry: float,
+                 stop_loss: float, take_profit: float, opened_at: int,
+                 closed_at: int = None, exit_price: float = None, outcome: str = None,
+                 pnl_pips: float = None):
+        self.id = id
+        self.pair = pair
+        self.timeframe = timeframe
+        self.direction = direction
+        self.entry = entry
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.opened_at = opened_at
+        self.closed_at = closed_at
+        self.exit_price = exit_price
+        self.outcome = outcome      # "tp" or "sl" once closed
+        self.pnl_pips = pnl_pips
+
+    @property
+    def is_open(self) -> bool:
+        return self.outcome is None
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class _PairBook:
+    __slots__ = ("long_sl", "long_tp", "short_sl", "short_tp", "stale", "last_time", "last_open")
+
+    def __init__(self):
+        self.long_sl = []    # (-stop, id): highest stop first, hit when low <= stop
+        self.long_tp = []    # (target, id): lowest target first, hit when high >= target
+        self.short_sl = []   # (stop, id): lowest stop first, hit when high >= stop
+        self.short_tp = []   # (-target, id): highest target first, hit when low <= target
+        self.stale = 0       # heap entries whose position is already closed
+        self.last_time = None  # last bar processed
+        self.last_open = None  # bar the last position was opened on
+
+    def size(self) -> int:
+        return len(self.long_sl) + len(self.long_tp) + len(self.short_sl) + len(self.short_tp)
+
+
+class PaperEngine:
+    def __init__(self, state_path: str = None, trades_path: str = None,
+                 save_interval: float = SAVE_INTERVAL):
+        self.state_path = state_path
+        self.trades_path = trades_path
+        self.save_interval = save_interval
+        self.positions = {}    # id -> open Position
+        self.books = {}        # (pair, tf) -> _PairBook
+        self.totals = {}       # pair -> {"closed", "wins", "losses", "pips"}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._dirty = False    # journal holds events the snapshot does not
+        self._saved_at = time.monotonic()
+        self._journal_path = state_path + ".journal" if state_path else None
+        self._journal_file = None
+        self._seen = None      # stats of the snapshot and journal as last loaded
+        if state_path:
+            self._load()
+            logger.info(f"Loaded {len(self.positions)} open paper positions from {state_path}")
+
+    def _book(self, pair: str, tf: str) -> _PairBook:
+        book = self.books.get((pair, tf))
+        if book is None:
+            book = self.books[(pair, tf)] = _PairBook()
+        return book
+
+    # --- opening -----------------------------------------------------------
+
+    def open_from_signal(self, result: dict):
+        """Open a position for a BUY/SELL analysis result; other results and
+        repeats for a bar that already opened one are ignored"""
+        if result.get("direction") not in ("BUY", "SELL"):
+            return None
+        if result.get("stop_loss") is None or result.get("take_profit") is None:
+            return None
+        return self.open(result["pair"], result["timeframe"], result["direction"],
+                         float(result["entry"]), float(result["stop_loss"]),
+                         float(result["take_profit"]), result.get("bar_time") or int(time.time()))
+
+    def open(self, pair: str, timeframe: str, direction: str, entry: float, stop_loss: float,
+             take_profit: float, opened_at: int):
+        """Open a position; None when (pair, timeframe) already opened one on this bar"""
+        pair = pair.upper()
+        with self._lock:
+            book = self._book(pair, timeframe)
+            if book.last_open is not None and opened_at <= book.last_open:
+                return None
+            pos = Position(self._next_id, pair, timeframe, direction, entry,
+                           stop_loss, take_profit, opened_at)
+            self._next_id += 1
+            book.last_open = opened_at
+            self._index(pos)
+            self._journal([dict(pos.as_dict(), event="open")])
+            self._maybe_save()
+        return pos
+
+    def _index(self, pos: Position):
+        self.positions[pos.id] = pos
+        book = self._book(pos.pair, pos.timeframe)
+        if pos.direction == "BUY":
+            heapq.heappush(book.long_sl, (-pos.stop_loss, pos.id))
+            heapq.heappush(book.long_tp, (pos.take_profit, pos.id))
+        else:
+            heapq.heappush(book.short_sl, (pos.stop_loss, pos.id))
+            heapq.heappush(book.short_tp, (-pos.take_profit, pos.id))
+
+    # --- bar processing ----------------------------------------------------
+
+    def on_bar(self, pair: str, tf: str, bar_time: int, high: float, low: float) -> list:
+        """Resolve SL/TP hits for one bar; returns the positions closed"""
+        return self.on_bars(pair, tf, [bar_time], [high], [low])
+
+    def on_bars(self, pair: str, tf: str, times, highs, lows) -> list:
+        """Resolve SL/TP hits for every bar from the last one processed on; returns the positions closed.
+
+        Bars older than the last one seen for (pair, tf) are skipped, so
+        repeated polls of the same history are harmless while bars that
+        arrived between polls are all replayed. The last bar is processed
+        again on the next poll since it may still have been forming. When a
+        bar crosses both levels of a position the stop is assumed to have
+        been hit first.
+        """
+        pair = pair.upper()
+        with self._lock:
+            book = self._book(pair, tf)
+            since = book.last_time if book.last_time is not None else book.last_open
+            if since is None:
+                start = len(times) - 1  # nothing open here yet; just note the latest bar
+            else:
+                start = bisect.bisect_left(times, since)
+            closed = []
+            for bar_time, high, low in zip(times[start:], highs[start:], lows[start:]):
+                bar_time, high, low = int(bar_time), float(high), float(low)
+                # Stops first, so a bar spanning both levels counts as a loss
+                closed += self._pop_hits(book.long_sl, lambda k: -k >= low, bar_time, "sl", book)
+                closed += self._pop_hits(book.short_sl, lambda k: k <= high, bar_time, "sl", book)
+                closed += self._pop_hits(book.long_tp, lambda k: k <= high, bar_time, "tp", book)
+                closed += self._pop_hits(book.short_tp, lambda k: -k >= low, bar_time, "tp", book)
+            events = [{"event": "close", "id": p.id, "closed_at": p.closed_at, "outcome": p.outcome}
+                      for p in closed]
+            if start < len(times) and book.last_time != int(times[-1]):
+                book.last_time = int(times[-1])
+                events.append({"event": "bar", "pair": pair, "timeframe": tf, "time": book.last_time})
+
+            if book.stale > 64 and book.stale * 2 > book.size():
+                self._compact(book)
+            self._journal(events)
+            if closed:
+                self._log_trades(closed)
+            self._maybe_save()
+        return closed
+
+    def _pop_hits(self, heap: list, crossed, bar_time: int, outcome: str, book: _PairBook) -> list:
+        closed = []
+        while heap:
+            key, pid = heap[0]
+            pos = self.positions.get(pid)
+            if pos is None:
+                heapq.heappop(heap)
+                book.stale -= 1
+                continue
+            if not crossed(key):
+                break
+            heapq.heappop(heap)
+            self._close(pos, bar_time, outcome)
+            book.stale += 1  # its entry in the opposite heap is now stale
+            closed.append(pos)
+        return closed
+
+    def _close(self, pos: Position, bar_time: int, outcome: str):
+        pos.exit_price = pos.stop_loss if outcome == "sl" else pos.take_profit
+        move = pos.exit_price - pos.entry if pos.direction == "BUY" else pos.entry - pos.exit_price
+        pos.pnl_pips = round(move / pip_value(pos.pair), 1)
+        pos.closed_at = bar_time
+        pos.outcome = outcome
+        del self.positions[pos.id]
+        t = self.totals.setdefault(pos.pair, {"closed": 0, "wins": 0, "losses": 0, "pips": 0.0})
+        t["closed"] += 1
+        t["wins" if pos.pnl_pips > 0 else "losses"] += 1
+        t["pips"] = round(t["pips"] + pos.pnl_pips, 1)
+
+    def _compact(self, book: _PairBook):
+        live = self.positions
+        for name in ("long_sl", "long_tp", "short_sl", "short_tp"):
+            heap = [e for e in getattr(book, name) if e[1] in live]
+            heapq.heapify(heap)
+            setattr(book, name, heap)
+        book.stale = 0
+
+    # --- reporting ---------------------------------------------------------
+
+    def open_positions(self, pair: str = None) -> list:
+        with self._lock:
+            return [p.as_dict() for p in self.positions.values()
+                    if pair is None or p.pair == pair.upper()]
+
+    def summary(self) -> dict:
+        with self._lock:
+            open_by_pair = {}
+            for p in self.positions.values():
+                open_by_pair[p.pair] = open_by_pair.get(p.pair, 0) + 1
+            pairs = {}
+            for pair in set(open_by_pair) | set(self.totals):
+                t = self.totals.get(pair, {"closed": 0, "wins": 0, "losses": 0, "pips": 0.0})
+                pairs[pair] = dict(t, open=open_by_pair.get(pair, 0))
+            closed = sum(t["closed"] for t in self.totals.values())
+            wins = sum(t["wins"] for t in self.totals.values())
+            return {
+                "open_positions": len(self.positions),
+                "closed_trades": closed,
+                "wins": wins,
+                "losses": closed - wins,
+                "win_rate": round(100.0 * wins / closed, 1) if closed else 0.0,
+                "total_pips": round(sum(t["pips"] for t in self.totals.values()), 1),
+                "pairs": pairs,
+            }
+
+    # --- persistence -------------------------------------------------------
+
+    def _log_trades(self, closed: list):
+        if not self.trades_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.trades_path) or ".", exist_ok=True)
+            with open(self.trades_path, "a") as f:
+                for pos in closed:
+                    f.write(json.dumps(pos.as_dict()) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to log paper trades: {e}")
+
+    def _journal(self, events: list):
+        if not self.state_path or not events:
+            return
+        try:
+            self._journal_handle().write("".join(json.dumps(e) + "\n" for e in events))
+            self._journal_file.flush()
+            self._dirty = True
+        except OSError as e:
+            logger.error(f"Failed to journal paper-trading events: {e}")
+
+    def _journal_handle(self):
+        if self._journal_file is None:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            self._journal_file = open(self._journal_path, "a")
+        return self._journal_file
+
+    def _maybe_save(self):
+        if self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+            self._write()
+
+    def save(self):
+        """Write the snapshot now and empty the journal (for shutdown hooks)"""
+        with self._lock:
+            if self.state_path and self._dirty:
+                self._write()
+
+    def _write(self):
+        state = {
+            "next_id": self._next_id,
+            "positions": [p.as_dict() for p in self.positions.values()],
+            "totals": self.totals,
+            "books": {f"{pair}:{tf}": {"last_time": b.last_time, "last_open": b.last_open}
+                      for (pair, tf), b in self.books.items()},
+        }
+        self._saved_at = time.monotonic()
+        try:
+            tmp = self.state_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_path)
+            # Replaying the journal over this snapshot is harmless, so a crash
+            # between these two steps loses nothing
+            self._journal_handle().truncate(0)
+            self._dirty = False
+        except OSError as e:
+            logger.error(f"Failed to save paper-trading state: {e}")
+
+    @staticmethod
+    def _stat(path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def reload_if_changed(self):
+        """Reload a read-only copy when the owning process has written since"""
+        with self._lock:
+            if (self._stat(self.state_path), self._stat(self._journal_path)) != self._seen:
+                self._load()
+
+    def _load(self):
+        self._seen = (self._stat(self.state_path), self._stat(self._journal_path))
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            state = {}
+        try:
+            with open(self._journal_path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        self.positions, self.books = {}, {}
+        self._next_id = state.get("next_id", 1)
+        self.totals = state.get("totals", {})
+        for d in state.get("positions", []):
+            self._index(Position(**d))
+        for key, b in state.get("books", {}).items():
+            pair, tf = key.rsplit(":", 1)
+            book = self._book(pair, tf)
+            book.last_time, book.last_open = b["last_time"], b["last_open"]
+        for line in lines:
+            if not line.endswith("\n"):
+                break  # torn final write
+            try:
+                self._replay(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Skipping bad paper journal entry: {e}")
+        self._dirty = bool(lines)
+
+    def _replay(self, event: dict):
+        kind = event.pop("event")
+        if kind == "open":
+            if event["id"] < self._next_id:
+                return  # already in the snapshot
+            pos = Position(**event)
+            self._next_id = pos.id + 1
+            self._book(pos.pair, pos.timeframe).last_open = pos.opened_at
+            self._index(pos)
+        elif kind == "close":
+            pos = self.positions.get(event["id"])
+            if pos is not None:
+                self._close(pos, event["closed_at"], event["outcome"])
+                self._book(pos.pair, pos.timeframe).stale += 2
+        elif kind == "bar":
+            self._book(event["pair"], event["timeframe"]).last_time = event["time"]
+
+
+class PaperInbox:
+    """Append-only hand-off of analysis results from API workers to the engine's owner.
+
+    Each result travels with the bars since this worker last handed over the
+    same (pair, tf), so the owner replays them without fetching anything and
+    no bar is skipped whichever worker served the poll; a result whose last
+    bar and direction did not change since is dropped. Lines are appended in
+    one write under a shared flock; the owner empties the file under an
+    exclusive one once it has read everything.
+    """
+
+    def __init__(self, path: str, max_bars: int = INBOX_BARS):
+        self.path = path
+        self.max_bars = max_bars
+        self.offset = 0       # owner side: bytes already drained
+        self._sent = {}       # (pair, tf) -> ((time, high, low) of the last bar, direction)
+        self._lock = threading.Lock()
+
+    def submit(self, result: dict, bars) -> bool:
+        """Queue a result for the owner; False when nothing changed since the last one"""
+        key = (result["pair"], result["timeframe"])
+        n = len(bars)
+        last = (int(bars.time[-1]), float(bars.high[-1]), float(bars.low[-1])) if n else None
+        with self._lock:
+            prev = self._sent.get(key)
+            if prev == (last, result.get("direction")):
+                return False
+            if prev is not None and prev[0] is not None:
+                start = bisect.bisect_left(bars.time, prev[0][0])
+            else:
+                start = max(0, n - self.max_bars)
+            entry = {
+                "result": {k: result.get(k) for k in SIGNAL_FIELDS},
+                "time": [int(t) for t in bars.time[start:]],
+                "high": [float(h) for h in bars.high[start:]],
+                "low": [float(v) for v in bars.low[start:]],
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                os.write(fd, (json.dumps(entry) + "\n").encode())
+            finally:
+                os.close(fd)
+            self._sent[key] = (last, result.get("direction"))
+        return True
+
+    def drain(self) -> list:
+        """Entries appended since the last drain, oldest first (owner side)"""
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < self.offset:
+                    self.offset = 0  # emptied by a previous owner
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        end = data.rfind(b"\n") + 1  # a line still being written is read next time
+        self.offset += end
+        entries = self._parse(data[:end])
+        if self.offset >= INBOX_COMPACT_BYTES:
+            entries += self._compact()
+        return entries
+
+    def _compact(self) -> list:
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.lseek(fd, self.offset, os.SEEK_SET)
+            chunks = []
+            while True:
+                chunk = os.read(fd, 1 << 16)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            os.ftruncate(fd, 0)
+            self.offset = 0
+        finally:
+            os.close(fd)
+        return self._parse(b"".join(chunks))
+
+    @staticmethod
+    def _parse(data: bytes) -> list:
+        entries = []
+        for line in data.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError as e:
+                logger.warning(f"Skipping bad paper inbox entry: {e}")
+        return entries
@@ -0,0 +1,228 @@
+"""Chart patterns: swing points, double tops/bottoms, 20-bar breakouts and pivots.
+
+Rolling max/min are vectorized sliding-window reductions, swing points come
+from a centred rolling max/min, and double tops and bottoms only search for
+their neckline break up to the next swing point. `scan` returns every hit in
+the history so backtests can reuse it; `detect` only looks at the swings and
+bars that can confirm on the most recent bars, for `core.score_signal`.
+"""
+from __future__ import annotations
+
+from bars import Bars
+from indicators import rolling_mean, true_range
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+SWING_K = 3            # bars on each side that a swing high/low must dominate
+BREAKOUT_BARS = 20
+DOUBLE_TOL_ATR = 0.5   # tops/bottoms within this many ATRs count as equal
+RECENT_BARS = 3        # how far back a hit still counts as "current"
+
+# Score contribution per pattern, added to the indicator score in core.score_signal
+PATTERN_WEIGHTS = {
+    "double_bottom": 1.0,
+    "double_top": -1.0,
+    "breakout_up": 1.0,
+    "breakout_down": -1.0,
+}
+
+PATTERN_LABELS = {
+    "double_bottom": "Double bottom",
+    "double_top": "Double top",
+    "breakout_up": f"{BREAKOUT_BARS}-bar breakout up",
+    "breakout_down": f"{BREAKOUT_BARS}-bar breakout down",
+}
+
+DAY = 86400
+PIVOT_CACHE = {}  # (pair, tf, kind) -> (session_start, pivot levels)
+
+
+class PatternHit:
+    __slots__ = ("name", "index", "time", "level")
+
+    def __init__(self, name: str, index: int, time: int, level: float):
+        self.name = name
+        self.index = index    # bar where the pattern confirmed
+        self.time = time
+        self.level = level    # neckline or broken range level
+
+    @property
+    def weight(self) -> float:
+        return PATTERN_WEIGHTS[self.name]
+
+    def reason(self) -> str:
+        return f"{PATTERN_LABELS[self.name]} ({self.level:.5f})"
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "index": self.index, "time": self.time,
+                "level": self.level, "weight": self.weight}
+
+    def __repr__(self) -> str:
+        return f"PatternHit({self.as_dict()!r})"
+
+
+def _rolling_extreme(x: np.ndarray, window: int, is_max: bool) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= window:
+        view = np.lib.stride_tricks.sliding_window_view(x, window)
+        out[window - 1:] = view.max(axis=1) if is_max else view.min(axis=1)
+    return out
+
+
+def rolling_max(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_extreme(np.asarray(x, dtype=np.float64), window, True)
+
+
+def rolling_min(x: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_extreme(np.asarray(x, dtype=np.float64), window, False)
+
+
+def swing_points(high: np.ndarray, low: np.ndarray, k: int = SWING_K) -> tuple:
+    """Indices of swing highs and lows (extreme of the surrounding 2k+1 bars)"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    n = len(high)
+    w = 2 * k + 1
+    if n < w:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    # rolling_*[i + k] is the extreme of the window centred on i
+    centred_max = rolling_max(high, w)[w - 1:]
+    centred_min = rolling_min(low, w)[w - 1:]
+    core_high = high[k:n - k]
+    core_low = low[k:n - k]
+    swing_high = np.flatnonzero(core_high == centred_max) + k
+    swing_low = np.flatnonzero(core_low == centred_min) + k
+    return swing_high, swing_low
+
+
+def _double(name: str, price: np.ndarray, other: np.ndarray, close: np.ndarray,
+            swings: np.ndarray, atr: np.ndarray, k: int, time: np.ndarray, since: int = 0) -> list:
+    # price/other are highs/lows for tops and lows/highs for bottoms
+    top = name == "double_top"
+    n = len(close)
+    hits = []
+    # A pair ending at swing j can only confirm before the next swing + k
+    ends = np.append(swings[1:] + k, n)
+    for j in np.flatnonzero(ends > since).tolist():
+        if j == 0:
+            continue
+        a, b = swings[j - 1], swings[j]
+        tol = atr[b] * DOUBLE_TOL_ATR
+        if not tol > 0 or abs(price[a] - price[b]) > tol:
+            continue
+        between = other[a + 1:b]
+        if not len(between):
+            continue
+        neck = between.min() if top else between.max()
+        # The second swing is only known k bars later; stop at the next swing
+        start = b + k
+        end = swings[j + 1] + k if j + 1 < len(swings) else n
+        seg = close[start:end]
+        broke = np.flatnonzero(seg < neck if top else seg > neck)
+        if len(broke):
+            i = int(start + broke[0])
+            hits.append(PatternHit(name, i, int(time[i]), float(neck)))
+    return hits
+
+
+def scan(bars: Bars, atr: np.ndarray = None, k: int = SWING_K, since: int = 0) -> list:
+    """Every pattern hit confirmed at bar index `since` or later, ordered by confirmation bar"""
+    high = np.asarray(bars.high, dtype=np.float64)
+    low = np.asarray(bars.low, dtype=np.float64)
+    close = np.asarray(bars.close, dtype=np.float64)
+    n = len(close)
+    if n <= BREAKOUT_BARS:
+        return []
+    if atr is None:
+        atr = rolling_mean(true_range(high, low, close), 14)
+
+    swing_high, swing_low = swing_points(high, low, k)
+    hits = _double("double_top", high, low, close, swing_high, atr, k, bars.time, since)
+    hits += _double("double_bottom", low, high, close, swing_low, atr, k, bars.time, since)
+
+    # Close through the range of the previous BREAKOUT_BARS bars (only bars from `since` on)
+    first = max(since, 1)
+    offset = max(0, first - BREAKOUT_BARS)
+    prior = np.arange(first, n) - 1 - offset  # index of the bar before i in the windows below
+    prior_high = rolling_max(high[offset:-1], BREAKOUT_BARS)[prior]
+    prior_low = rolling_min(low[offset:-1], BREAKOUT_BARS)[prior]
+    for j in np.flatnonzero(close[first:] > prior_high):
+        i = first + j
+        hits.append(PatternHit("breakout_up", int(i), int(bars.time[i]), float(prior_high[j])))
+    for j in np.flatnonzero(close[first:] < prior_low):
+        i = first + j
+        hits.append(PatternHit("breakout_down", int(i), int(bars.time[i]), float(prior_low[j])))
+
+    hits = [h for h in hits if h.index >= since]
+    hits.sort(key=lambda h: h.index)
+    return hits
+
+
+def detect(bars: Bars, atr: np.ndarray = None, recent: int = RECENT_BARS) -> list:
+    """Hits confirmed on the last `recent` bars, at most one per pattern"""
+    latest = {}
+    for hit in scan(bars, atr, since=len(bars) - recent):
+        latest[hit.name] = hit
+    return list(latest.values())
+
+
+def _session_ids(time: np.ndarray, kind: str) -> np.ndarray:
+    days = time // DAY
+    if kind == "weekly":
+        return (days + 3) // 7  # epoch day 0 is a Thursday; weeks start Monday
+    return days
+
+
+def _session_start(session_id: int, kind: str) -> int:
+    return int(session_id * 7 - 3) * DAY if kind == "weekly" else int(session_id) * DAY
+
+
+def pivots(bars: Bars, kind: str = "daily", pair: str = None, tf: str = None) -> dict:
+    """Classic floor pivots for the current session from the previous session's H/L/C.
+
+    Levels only change when a new session opens, so they are cached per
+    pair, timeframe and session when a pair is given.
+    """
+    if len(bars) == 0:
+        return {}
+    time = bars.time
+    sid = _session_ids(time, kind)
+    current = int(sid[-1])
+    start = _session_start(current, kind)
+    cached = PIVOT_CACHE.get((pair, tf, kind))
+    if pair is not None and cached is not None and cached[0] == start:
+        return cached[1]
+
+    prev_mask = sid == current - 1
+    if not prev_mask.any():
+        # Fall back to the most recent complete session in the data (weekends/holidays)
+        earlier = sid[sid < current]
+        if not len(earlier):
+            return {}
+        prev_mask = sid == earlier[-1]
+    h = float(np.max(bars.high[prev_mask]))
+    l = float(np.min(bars.low[prev_mask]))
+    c = float(bars.close[prev_mask][-1])
+    p = (h + l + c) / 3
+    levels = {
+        "pivot": p,
+        "r1": 2 * p - l, "s1": 2 * p - h,
+        "r2": p + (h - l), "s2": p - (h - l),
+    }
+    if pair is not None:
+        PIVOT_CACHE[(pair, tf, kind)] = (start, levels)
+    return levels
+
+
+def key_levels(price: float, *level_sets: dict) -> dict:
+    """Nearest pivot level below (support) and above (resistance) the price"""
+    below = [v for levels in level_sets for v in levels.values() if v < price]
+    above = [v for levels in level_sets for v in levels.values() if v > price]
+    out = {}
+    if below:
+        out["support"] = max(below)
+    if above:
+        out["resistance"] = min(above)
+    return out
@@ -0,0 +1,150 @@
+"""In-process fan-out of analysis results and signals to push subscribers.
+
+Each API worker process has its own hub and only sees what that process
+publishes; there is no cross-worker relay.
+
+Topics are "PAIR:tf" for analysis results (e.g. "EURUSD:5m"), a bare "PAIR"
+for every timeframe of a pair, and "signals" for /forex/signal events; "*"
+receives everything. Each published message is serialized once and the same
+text is queued for every subscriber. Subscriber queues are bounded: a client
+that falls `max_queue` messages behind is dropped rather than slowing down
+everyone else.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SIGNALS_TOPIC = "signals"
+ALL_TOPICS = "*"
+MAX_QUEUE = 256
+
+
+class Subscriber:
+    __slots__ = ("queue", "topics", "dropped")
+
+    def __init__(self, max_queue: int):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.topics = set()
+        self.dropped = False
+
+    async def next_message(self):
+        """Next serialized message, or None once the subscriber was dropped"""
+        msg = await self.queue.get()
+        return None if self.dropped else msg
+
+
+class SignalHub:
+    def __init__(self, max_queue: int = MAX_QUEUE):
+        self.max_queue = max_queue
+        self.topics = {}  # topic -> set of Subscriber
+        self.loop = None
+        self.published = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def bind_loop(self, loop):
+        """Event loop the subscriber queues live on (set at app startup)"""
+        self.loop = loop
+
+    def subscribe(self, topics, max_queue: int = None) -> Subscriber:
+        sub = Subscriber(max_queue or self.max_queue)
+        self.add_topics(sub, topics)
+        return sub
+
+    def add_topics(self, sub: Subscriber, topics):
+        with self._lock:
+            for topic in topics:
+                topic = normalize_topic(topic)
+                sub.topics.add(topic)
+                self.topics.setdefault(topic, set()).add(sub)
+
+    def remove_topics(self, sub: Subscriber, topics):
+        with self._lock:
+            for topic in topics:
+                topic = normalize_topic(topic)
+                sub.topics.discard(topic)
+                subs = self.topics.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self.topics[topic]
+
+    def unsubscribe(self, sub: Subscriber):
+        self.remove_topics(sub, list(sub.topics))
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len({s for subs in self.topics.values() for s in subs})
+
+    def publish(self, topic: str, data) -> int:
+        """Serialize once and queue for every subscriber; safe to call from any thread"""
+        if not self.topics:
+            return 0
+        text = json.dumps({"topic": topic, "data": data}, default=str)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if self.loop is not None and running is not self.loop:
+            self.loop.call_soon_threadsafe(self._deliver, topic, text)
+            return 0
+        return self._deliver(topic, text)
+
+    def _deliver(self, topic: str, text: str) -> int:
+        with self._lock:
+            targets = set(self.topics.get(topic, ()))
+            targets.update(self.topics.get(ALL_TOPICS, ()))
+            if ":" in topic:
+                targets.update(self.topics.get(topic.partition(":")[0], ()))
+        delivered = 0
+        for sub in targets:
+            if sub.dropped:
+                continue
+            try:
+                sub.queue.put_nowait(text)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._drop(sub)
+        self.published += 1
+        return delivered
+
+    def _drop(self, sub: Subscriber):
+        sub.dropped = True
+        self.dropped += 1
+        self.unsubscribe(sub)
+        # Wake the sender so it notices the drop; the queue is full, so make room
+        try:
+            sub.queue.get_nowait()
+            sub.queue.put_nowait(None)
+        except (asyncio.QueueEmpty, asyncio.QueueFull):
+            pass
+        logger.warning("Dropped slow push subscriber")
+
+    def stats(self) -> dict:
+        with self._lock:
+            topic_counts = {t: len(s) for t, s in self.topics.items()}
+        return {
+            "subscribers": self.subscriber_count(),
+            "topics": topic_counts,
+            "published": self.published,
+            "dropped_subscribers": self.dropped,
+        }
+
+
+def normalize_topic(topic: str) -> str:
+    topic = topic.strip()
+    if topic in (ALL_TOPICS, SIGNALS_TOPIC):
+        return topic
+    pair, _, tf = topic.partition(":")
+    return f"{pair.upper()}:{tf.lower()}" if tf else pair.upper()
+
+
+def parse_topics(spec) -> list:
+    if not spec:
+        return []
+    if isinstance(spec, str):
+        spec = spec.split(",")
+    return [t for t in (s.strip() for s in spec) if t]
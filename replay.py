@@ -0,0 +1,251 @@
+"""Accelerated historical replay through the full signal pipeline.
+
+Recorded bars are served to `core.fetch_bars` (via `core.BAR_SOURCE`) up to a
+virtual clock. At every step each pair goes through the production path:
+fetch -> analyze -> POST /forex/signal -> Telegram formatting, with the
+outbound Telegram sender replaced by a recorder. The report gives end-to-end
+signals per second and per-stage latency.
+
+Record bars once, then replay them:
+  python replay.py --record bars.csv --tf 5m
+  python replay.py bars.csv --tf 5m --speed 0       # as fast as possible
+  python replay.py bars.csv --tf 5m --speed 600     # 600x real time
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import time
+
+import numpy as np
+
+import core
+from bars import Bars
+from delivery import DeliveryStore, DeliveryWorker
+from streaming import TF_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MIN_HISTORY = 60  # analyze_bars needs this many bars
+
+
+def record(path: str, pairs: list, tf: str, lookback: str = None):
+    """Write bars from the live data source to a replay file"""
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["pair", "timeframe", "time", "open", "high", "low", "close"])
+        for pair in pairs:
+            bars = core.fetch_bar_arrays(pair, tf, lookback=lookback or core.default_lookback(tf),
+                                         dtype=np.float64)
+            for i in range(len(bars)):
+                w.writerow([pair.upper(), tf, int(bars.time[i]), repr(float(bars.open[i])),
+                            repr(float(bars.high[i])), repr(float(bars.low[i])),
+                            repr(float(bars.close[i]))])
+
+
+def load_bars(path: str, tf: str) -> dict:
+    """pair -> Bars for one timeframe from a replay file"""
+    rows = {}
+    with open(path, newline="") as f:
+        for rec in csv.DictReader(f):
+            if rec.get("timeframe", tf).lower() != tf.lower():
+                continue
+            rows.setdefault(rec["pair"].upper(), []).append(
+                (int(rec["time"]), float(rec["open"]), float(rec["high"]),
+                 float(rec["low"]), float(rec["close"])))
+    out = {}
+    for pair, r in rows.items():
+        r.sort()
+        a = np.array(r)
+        out[pair] = Bars(a[:, 0], a[:, 1], a[:, 2], a[:, 3], a[:, 4], dtype=core.BAR_DTYPE)
+    return out
+
+
+def _lookback_seconds(lookback: str) -> int:
+    units = {"d": 86400, "h": 3600, "m": 60}
+    return int(lookback[:-1]) * units[lookback[-1].lower()]
+
+
+class VirtualClock:
+    """Replay time; sleeps so `speed` seconds of bar time pass per wall second (0 = never)"""
+
+    def __init__(self, speed: float = 0.0):
+        self.speed = speed
+        self.now = None
+        self._origin = None  # (virtual, monotonic)
+
+    async def advance(self, to: int):
+        if self.speed > 0:
+            if self._origin is None:
+                self._origin = (to, time.monotonic())
+            delay = (to - self._origin[0]) / self.speed - (time.monotonic() - self._origin[1])
+            if delay > 0:
+                await asyncio.sleep(delay)
+        self.now = to
+
+
+class ReplaySource:
+    """core.BAR_SOURCE that serves recorded bars up to the virtual clock"""
+
+    def __init__(self, bars: dict, tf: str, clock: VirtualClock):
+        self.tf = tf.lower()
+        self.clock = clock
+        self.bars = bars
+        self.frames = {pair: b.to_frame() for pair, b in bars.items()}
+
+    def __call__(self, pair: str, tf: str, lookback: str = "7d"):
+        pair = pair.upper()
+        if tf.lower() != self.tf or pair not in self.bars:
+            return self.frames[next(iter(self.frames))].iloc[0:0]
+        times = self.bars[pair].time
+        end = int(np.searchsorted(times, self.clock.now, side="right"))
+        start = int(np.searchsorted(times, self.clock.now - _lookback_seconds(lookback), side="left"))
+        return self.frames[pair].iloc[start:end]
+
+
+class RecordingTelegramService:
+    """Stands in for api.TelegramService: formats as usual, records instead of sending"""
+
+    def __init__(self):
+        from api import TelegramService
+        self._real = TelegramService("replay", "replay")
+        self.sent = []
+
+    def format_forex_signal(self, signal) -> str:
+        return self._real.format_forex_signal(signal)
+
+    async def send_message(self, message: str, parse_mode: str = "HTML", chat_id: str = None,
+                           raise_permanent: bool = False) -> bool:
+        self.sent.append(message)
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+def _percentiles(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    a = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(a.mean()), 3),
+        "p50_ms": round(float(np.percentile(a, 50)), 3),
+        "p95_ms": round(float(np.percentile(a, 95)), 3),
+        "p99_ms": round(float(np.percentile(a, 99)), 3),
+    }
+
+
+def signal_payload(result: dict) -> dict:
+    """/forex/signal body for an analysis result"""
+    return {
+        "pair": result["pair"],
+        "action": result["direction"] if result["direction"] in ("BUY", "SELL") else "HOLD",
+        "price": result["entry"],
+        "confidence": result["confidence"] / 100.0,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(result["bar_time"])),
+        "stop_loss": result["stop_loss"],
+        "take_profit": result["take_profit"],
+        "timeframe": result["timeframe"],
+    }
+
+
+async def run_replay(path: str, tf: str, cfg: dict, speed: float = 0.0, post_all: bool = False,
+                     limit: int = None) -> dict:
+    import api
+    from fastapi.testclient import TestClient
+
+    bars = load_bars(path, tf)
+    if not bars:
+        raise ValueError(f"No {tf} bars in {path}")
+    clock = VirtualClock(speed)
+    source = ReplaySource(bars, tf, clock)
+    steps = np.unique(np.concatenate([b.time for b in bars.values()]))
+    if limit:
+        steps = steps[:limit]
+
+    stages = {"fetch": [], "analyze": [], "signal": [], "total": []}
+    counts = {"steps": 0, "analyses": 0, "skipped": 0, "signals_posted": 0, "errors": 0}
+    telegram = RecordingTelegramService()
+    store = DeliveryStore()
+    store.ensure_subscriber(telegram.chat_id)
+    saved = (core.BAR_SOURCE, core.BAR_CACHE_TTL, api.telegram_service, api.delivery_store)
+    core.BAR_SOURCE, core.BAR_CACHE_TTL, api.telegram_service, api.delivery_store = source, 0.0, telegram, store
+    client = TestClient(api.app)
+    started = time.perf_counter()
+    try:
+        for t in steps:
+            await clock.advance(int(t))
+            counts["steps"] += 1
+            for pair in bars:
+                t0 = time.perf_counter()
+                # analyze_pair_tf is get_bars + analyze_bars; timed separately here
+                pair_bars = core.get_bars(pair, tf)
+                t1 = time.perf_counter()
+                if len(pair_bars) < MIN_HISTORY or pair_bars.time[-1] != t:
+                    counts["skipped"] += 1
+                    continue
+                result = core.analyze_bars(pair, tf, pair_bars, cfg)
+                t2 = time.perf_counter()
+                counts["analyses"] += 1
+                stages["fetch"].append(t1 - t0)
+                stages["analyze"].append(t2 - t1)
+                if "error" in result:
+                    counts["errors"] += 1
+                    continue
+                if post_all or result["direction"] in ("BUY", "SELL"):
+                    resp = client.post("/forex/signal", json=signal_payload(result))
+                    t3 = time.perf_counter()
+                    if resp.status_code != 200:
+                        counts["errors"] += 1
+                    else:
+                        counts["signals_posted"] += 1
+                    stages["signal"].append(t3 - t2)
+                stages["total"].append(time.perf_counter() - t0)
+        # Alerts are queued by /forex/signal; deliver them without rate limits
+        await DeliveryWorker(store, telegram.send_message, rate=0, per_chat_interval=0).drain()
+    finally:
+        core.BAR_SOURCE, core.BAR_CACHE_TTL, api.telegram_service, api.delivery_store = saved
+        core.BAR_CACHE.clear()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "file": path,
+        "timeframe": tf,
+        "pairs": sorted(bars),
+        "speed": speed,
+        "wall_seconds": round(elapsed, 3),
+        **counts,
+        "telegram_messages": len(telegram.sent),
+        "analyses_per_second": round(counts["analyses"] / elapsed, 1) if elapsed else None,
+        "signals_per_second": round(counts["signals_posted"] / elapsed, 1) if elapsed else None,
+        "stages": {name: _percentiles(s) for name, s in stages.items()},
+    }
+
+
+def main():
+    from config import cfg
+
+    parser = argparse.ArgumentParser(description="Replay recorded bars through the full pipeline")
+    parser.add_argument("file", help="bar file (CSV: pair,timeframe,time,open,high,low,close)")
+    parser.add_argument("--tf", default="5m", choices=sorted(TF_SECONDS))
+    parser.add_argument("--speed", type=float, default=0.0, help="bar-time multiple of real time, 0 = max")
+    parser.add_argument("--post-all", action="store_true", help="POST HOLD results too, not only BUY/SELL")
+    parser.add_argument("--limit", type=int, help="stop after this many clock steps")
+    parser.add_argument("--record", action="store_true", help="record bars for config pairs into FILE and exit")
+    parser.add_argument("--pairs", help="comma-separated pairs to record (default: config pairs)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.record:
+        pairs = args.pairs.split(",") if args.pairs else cfg["pairs"]
+        record(args.file, pairs, args.tf)
+        print(f"Recorded {len(pairs)} pairs ({args.tf}) to {args.file}")
+        return
+    report = asyncio.run(run_replay(args.file, args.tf, cfg, args.speed, args.post_all, args.limit))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
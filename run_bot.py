@@ -1,15 +1,37 @@
 """
 AI Forex Bot Launcher
 Starts both the FastAPI analysis server and Telegram bot in one terminal
+
+  python run_bot.py                      # development: single worker with --reload
+  python run_bot.py --prod               # production: supervised uvicorn, one worker per CPU
+  python run_bot.py --prod --workers 4   # production: supervised uvicorn, four workers
+
+--prod runs one worker per CPU unless --workers/WEB_CONCURRENCY says
+otherwise. With several workers the stream pipeline, the paper engine and
+the Telegram drainer still run once (role locks), and the shared cache
+(SHARED_CACHE_URL, defaulting to a local SQLite file) carries bars,
+analyses, the latest signals and push messages between workers, so every
+worker gives the same answers.
 """
 
+import argparse
 import subprocess
 import sys
 import time
 import signal
 import os
+import urllib.request
 from threading import Thread
 
+HEALTH_POLL_INTERVAL = 0.05   # seconds between /health probes
+HEALTH_PROBE_TIMEOUT = 0.2    # per-probe timeout inside the supervisor loop
+HEALTH_TIMEOUT = 30.0         # give up waiting for the API after this long
+BACKOFF_BASE = 0.5            # first restart delay; doubles per consecutive crash
+BACKOFF_MAX = 60.0
+STABLE_AFTER = 60.0           # a child that ran this long resets its backoff
+GRACEFUL_TIMEOUT = 25         # seconds to drain in-flight work on shutdown
+DEFAULT_SHARED_CACHE_URL = "sqlite:///data/shared_cache.db"  # for multi-worker runs without one
+
 def run_api_server():
     """Run the FastAPI server."""
     print("🚀 Starting FastAPI Analysis Server...")
@@ -38,12 +60,143 @@ def run_telegram_bot():
     except KeyboardInterrupt:
         print("🛑 Telegram Bot stopped by user")
 
+def probe_health(url: str, timeout: float = 1.0) -> bool:
+    """One request to the API health endpoint; True when it answers 200"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status == 200
+    except OSError:
+        return False
+
+def wait_for_health(url: str, timeout: float = HEALTH_TIMEOUT, process=None) -> bool:
+    """Poll the API health endpoint until it answers 200 (or the process dies)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        if probe_health(url):
+            return True
+        time.sleep(HEALTH_POLL_INTERVAL)
+    return False
+
+class SupervisedChild:
+    """A child process that is restarted with exponential backoff when it dies"""
+    
+    def __init__(self, name: str, cmd: list, env: dict = None):
+        self.name = name
+        self.cmd = cmd
+        self.env = env
+        self.process = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = None
+    
+    def start(self):
+        # Own session: a terminal Ctrl+C reaches only the supervisor, which stops children in order
+        self.process = subprocess.Popen(self.cmd, start_new_session=True, env=self.env)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        print(f"▶️ {self.name} started (pid {self.process.pid})")
+    
+    def check(self, now: float) -> bool:
+        """Schedule or perform a restart; returns True when the child was just restarted"""
+        if self.process is None or self.process.poll() is None:
+            return False
+        if self.restart_at is None:
+            if now - self.started_at >= STABLE_AFTER:
+                self.failures = 0
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** self.failures))
+            self.failures += 1
+            self.restart_at = now + delay
+            print(f"⚠️ {self.name} exited with code {self.process.returncode}; restarting in {delay:.1f}s")
+            return False
+        if now >= self.restart_at:
+            self.start()
+            return True
+        return False
+    
+    def stop(self, timeout: float):
+        if self.process is None or self.process.poll() is not None:
+            return
+        print(f"🛑 Stopping {self.name}...")
+        # SIGTERM lets uvicorn stop accepting connections and finish in-flight requests
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️ Force killing {self.name}...")
+            self.process.kill()
+            self.process.wait()
+
+def run_production(host: str, port: int, workers: int):
+    """Supervise a multi-worker uvicorn API and the Telegram bot until SIGINT/SIGTERM"""
+    print(f"🏭 Production mode: {workers} API workers on http://{host}:{port}")
+    env = dict(os.environ)
+    if workers > 1 and not env.get("SHARED_CACHE_URL"):
+        # Without a shared tier each worker would answer from its own signals and subscribers
+        env["SHARED_CACHE_URL"] = DEFAULT_SHARED_CACHE_URL
+        print(f"🔗 Sharing state between workers through {DEFAULT_SHARED_CACHE_URL}")
+    api = SupervisedChild("FastAPI Server", [
+        sys.executable, "-m", "uvicorn", "api:app",
+        "--host", host, "--port", str(port), "--workers", str(workers),
+        "--timeout-graceful-shutdown", str(GRACEFUL_TIMEOUT),
+    ], env=env)
+    bot = SupervisedChild("Telegram Bot", [sys.executable, "telegram_bot.py"])
+    health_url = f"http://127.0.0.1:{port}/health"
+    
+    stopping = []
+    def request_stop(signum, frame):
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    
+    started = time.monotonic()
+    api.start()
+    if wait_for_health(health_url, process=api.process):
+        print(f"✅ API healthy after {time.monotonic() - started:.2f}s")
+    else:
+        print("⚠️ API not healthy yet; starting the bot anyway")
+    bot.start()
+    
+    health_deadline = None  # set while a restarted API has not answered /health yet
+    try:
+        while not stopping:
+            now = time.monotonic()
+            if api.check(now):
+                health_deadline = now + HEALTH_TIMEOUT
+            if health_deadline is not None and api.process.poll() is None:
+                if probe_health(health_url, timeout=HEALTH_PROBE_TIMEOUT):
+                    print(f"✅ API healthy again after {time.monotonic() - api.started_at:.2f}s")
+                    health_deadline = None
+                elif now >= health_deadline:
+                    print(f"⚠️ API not healthy {HEALTH_TIMEOUT:.0f}s after restart")
+                    health_deadline = None
+            bot.check(now)
+            time.sleep(0.2)
+    finally:
+        print("\n🧹 Draining and stopping all services...")
+        # Bot first so it stops sending requests, then let the API drain
+        bot.stop(timeout=10)
+        api.stop(timeout=GRACEFUL_TIMEOUT + 5)
+        print("✅ All services stopped.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Start the AI Forex Bot API and Telegram bot")
+    parser.add_argument("--prod", action="store_true",
+                        help="uvicorn without reload, supervised with restarts")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="uvicorn workers with --prod (default WEB_CONCURRENCY, else the CPU count)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    return parser.parse_args()
+
 def main():
     """Main launcher function."""
+    args = parse_args()
     print("=" * 60)
     print("🚀 AI Forex Bot - Complete System Launcher")
     print("=" * 60)
-    print("📡 Starting FastAPI Analysis Server on http://127.0.0.1:8000")
+    print(f"📡 Starting FastAPI Analysis Server on http://127.0.0.1:{args.port}")
     print("🤖 Starting Telegram Bot (@alce_trade_bot)")
     print("=" * 60)
     print()
@@ -59,6 +212,10 @@ def main():
         print("Make sure telegram_bot.py is in the same directory.")
         sys.exit(1)
     
+    if args.prod:
+        run_production(args.host, args.port, args.workers)
+        return
+    
     # Create processes list to track
     processes = []
     
@@ -67,13 +224,14 @@ def main():
         print("🚀 Launching FastAPI server...")
         api_process = subprocess.Popen([
             sys.executable, "-m", "uvicorn", 
-            "api:app", "--reload", "--host", "0.0.0.0", "--port", "8000"
+            "api:app", "--reload", "--host", args.host, "--port", str(args.port)
         ])
         processes.append(("FastAPI Server", api_process))
         
         # Wait for server to start
         print("⏳ Waiting for API server to initialize...")
-        time.sleep(5)
+        if not wait_for_health(f"http://127.0.0.1:{args.port}/health", process=api_process):
+            print("⚠️ API server did not report healthy; starting the bot anyway")
         
         # Start Telegram bot
         print("🤖 Launching Telegram bot...")
@@ -83,7 +241,7 @@ def main():
         print()
         print("✅ Both services are now running!")
         print("📱 Go to @alce_trade_bot on Telegram and type /start")
-        print("🌐 API documentation: http://127.0.0.1:8000/docs")
+        print(f"🌐 API documentation: http://127.0.0.1:{args.port}/docs")
         print()
         print("Press Ctrl+C to stop both services...")
         
@@ -0,0 +1,445 @@
+"""Cache tier shared by every API worker process on a host (or a Redis cluster).
+
+Each uvicorn worker keeps its own `core.BAR_CACHE`; this tier sits behind it
+so a bar download or an analysis computed by one worker is reused by the
+others. `SharedCache.get_or_compute` is single-flight across processes: the
+first worker to miss a key takes a short-lived lock and computes the value,
+the rest wait for it to appear instead of repeating the work.
+
+Backends: Redis ("redis://host:6379/0", needs the `redis` package) or a local
+SQLite file ("sqlite:///data/shared_cache.db") for single-host deployments
+and offline tests.
+
+The same backend carries a `SignalRelay`: the latest analysis per "PAIR:tf"
+that any worker can read, and push messages published by one worker that
+every other worker forwards to its own WebSocket/SSE subscribers (Redis
+pub/sub, or an events table the SQLite backend polls).
+"""
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+
+from bars import Bars
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+LOCK_TTL = 30.0       # a crashed lock holder blocks the key for at most this long
+WAIT_POLL = 0.02
+PURGE_EVERY = 500     # SQLite: drop expired rows every N writes
+RELAY_POLL = 0.1      # SQLite: seconds between polls for relayed messages
+EVENT_TTL = 60.0      # SQLite: relayed messages are kept this long for slow pollers
+
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS latest (topic TEXT PRIMARY KEY, value BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS pushed (topic TEXT PRIMARY KEY, bar_time INTEGER NOT NULL,
+                                               direction TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, value BLOB NOT NULL,
+                                               at REAL NOT NULL);
+        """)
+        self._writes = 0
+        self._events = 0
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ? AND expires > ?",
+                                   (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, value, now + ttl))
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO locks VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET"
+                " owner = excluded.owner, expires = excluded.expires WHERE locks.expires <= ?",
+                (key, owner, now + ttl, now))
+            return cur.rowcount == 1
+
+    def locked(self, key: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM locks WHERE key = ? AND expires > ?",
+                                    (key, time.time())).fetchone() is not None
+
+    def release(self, key: str, owner: str):
+        with self._lock:
+            self._db.execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
+
+    def set_latest(self, topic: str, value: bytes):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO latest VALUES (?, ?)", (topic, value))
+
+    def get_latest(self) -> dict:
+        with self._lock:
+            return dict(self._db.execute("SELECT topic, value FROM latest").fetchall())
+
+    def claim_push(self, topic: str, bar_time: int, direction: str) -> bool:
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO pushed VALUES (?, ?, ?) ON CONFLICT (topic) DO UPDATE SET"
+                " bar_time = excluded.bar_time, direction = excluded.direction"
+                " WHERE excluded.bar_time > pushed.bar_time"
+                " OR (excluded.bar_time = pushed.bar_time AND excluded.direction != pushed.direction)",
+                (topic, bar_time, direction))
+            return cur.rowcount == 1
+
+    def publish(self, value: bytes):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT INTO events (value, at) VALUES (?, ?)", (value, now))
+            self._events += 1
+            if self._events % PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM events WHERE at <= ?", (now - EVENT_TTL,))
+
+    def listen(self, stop: threading.Event, callback, ready: threading.Event):
+        """Call callback(value) for every message published once ready is set, until stop is set"""
+        with self._lock:
+            seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+        ready.set()
+        while not stop.wait(RELAY_POLL):
+            with self._lock:
+                rows = self._db.execute("SELECT seq, value FROM events WHERE seq > ? ORDER BY seq",
+                                        (seq,)).fetchall()
+            for seq, value in rows:
+                callback(value)
+
+
+class RedisBackend:
+    # Delete the lock only if we still own it (it may have expired and been re-taken)
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    # Record (bar_time, direction) for a topic unless it is older than or equal to the stored one
+    _CLAIM_PUSH = """
+        local cur = redis.call('hget', KEYS[1], ARGV[1])
+        if cur then
+            local t, d = string.match(cur, '^(%d+):(.*)$')
+            t = tonumber(t)
+            local nt = tonumber(ARGV[2])
+            if nt < t or (nt == t and d == ARGV[3]) then return 0 end
+        end
+        redis.call('hset', KEYS[1], ARGV[1], ARGV[2] .. ':' .. ARGV[3])
+        return 1
+    """
+
+    def __init__(self, url: str, prefix: str = "forexbot:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The Redis shared cache requires the 'redis' package")
+        self.url = url
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._release = self._redis.register_script(self._RELEASE)
+        self._claim_push = self._redis.register_script(self._CLAIM_PUSH)
+
+    def get(self, key: str):
+        return self._redis.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._redis.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        return bool(self._redis.set(self.prefix + "lock:" + key, owner, nx=True, px=int(ttl * 1000)))
+
+    def locked(self, key: str) -> bool:
+        return bool(self._redis.exists(self.prefix + "lock:" + key))
+
+    def release(self, key: str, owner: str):
+        self._release(keys=[self.prefix + "lock:" + key], args=[owner])
+
+    def set_latest(self, topic: str, value: bytes):
+        self._redis.hset(self.prefix + "latest", topic, value)
+
+    def get_latest(self) -> dict:
+        return {k.decode(): v for k, v in self._redis.hgetall(self.prefix + "latest").items()}
+
+    def claim_push(self, topic: str, bar_time: int, direction: str) -> bool:
+        return bool(self._claim_push(keys=[self.prefix + "pushed"], args=[topic, bar_time, direction]))
+
+    def publish(self, value: bytes):
+        self._redis.publish(self.prefix + "events", value)
+
+    def listen(self, stop: threading.Event, callback, ready: threading.Event):
+        """Call callback(value) for every message published once ready is set, until stop is set"""
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.prefix + "events")
+        ready.set()
+        try:
+            while not stop.is_set():
+                msg = pubsub.get_message(timeout=1.0)
+                if msg is not None:
+                    callback(msg["data"])
+        finally:
+            pubsub.close()
+
+
+class SharedCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.computed = 0
+        self.waited = 0
+        self.errors = 0
+
+    def get_or_compute(self, key: str, ttl: float, compute, encode, decode, wait_timeout: float = LOCK_TTL):
+        """Cached value for key, computing it in at most one process at a time.
+
+        Backend failures fall back to computing locally, so an unavailable
+        Redis degrades to per-process caching instead of failing requests.
+        Values `encode` maps to None (e.g. errors) are returned but not stored.
+        """
+        try:
+            blob = self.backend.get(key)
+        except Exception as e:
+            return self._fallback(key, compute, e)
+        if blob is not None:
+            self.hits += 1
+            return decode(blob)
+        self.misses += 1
+
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + wait_timeout
+        waited = False
+        while True:
+            try:
+                if self.backend.acquire(key, owner, LOCK_TTL):
+                    break
+                time.sleep(WAIT_POLL)
+                waited = True
+                blob = self.backend.get(key)
+            except Exception as e:
+                return self._fallback(key, compute, e)
+            if blob is not None:
+                self.waited += 1
+                return decode(blob)
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for shared cache key {key}; computing locally")
+                return compute()
+
+        try:
+            # Another worker may have finished between our miss and taking the lock
+            blob = self.backend.get(key) if waited else None
+            if blob is not None:
+                self.waited += 1
+                return decode(blob)
+            value = compute()
+            self.computed += 1
+            blob = encode(value)
+            if blob is not None:
+                self.backend.set(key, blob, ttl)
+            return value
+        finally:
+            try:
+                self.backend.release(key, owner)
+            except Exception as e:
+                logger.error(f"Failed to release shared cache lock {key}: {str(e)}")
+
+    def get_or_compute_many(self, keys: list, ttl: float, compute_many, encode, decode,
+                            wait_timeout: float = LOCK_TTL) -> list:
+        """get_or_compute for several keys at once.
+
+        The keys this process gets to compute are passed together to
+        `compute_many(indexes)` (one batch); keys another worker is already
+        computing are waited for one by one afterwards.
+        """
+        values = [None] * len(keys)
+        owner = uuid.uuid4().hex
+        owned, others = [], []
+        try:
+            for i, key in enumerate(keys):
+                blob = self.backend.get(key)
+                if blob is not None:
+                    self.hits += 1
+                    values[i] = decode(blob)
+                elif self.backend.acquire(key, owner, LOCK_TTL):
+                    owned.append(i)
+                else:
+                    others.append(i)
+        except Exception as e:
+            self._release_all([keys[i] for i in owned], owner)
+            missing = [i for i, key in enumerate(keys) if values[i] is None]
+            for i, value in zip(missing, self._fallback(keys[missing[0]], lambda: compute_many(missing), e)):
+                values[i] = value
+            return values
+        self.misses += len(owned) + len(others)
+
+        try:
+            if owned:
+                for i, value in zip(owned, compute_many(owned)):
+                    values[i] = value
+                    blob = encode(value)
+                    if blob is not None:
+                        self.backend.set(keys[i], blob, ttl)
+                self.computed += len(owned)
+        finally:
+            self._release_all([keys[i] for i in owned], owner)
+        for i in others:
+            values[i] = self.get_or_compute(keys[i], ttl, lambda i=i: compute_many([i])[0],
+                                            encode, decode, wait_timeout)
+        return values
+
+    def _release_all(self, keys: list, owner: str):
+        for key in keys:
+            try:
+                self.backend.release(key, owner)
+            except Exception as e:
+                logger.error(f"Failed to release shared cache lock {key}: {str(e)}")
+
+    def _fallback(self, key: str, compute, error):
+        self.errors += 1
+        logger.error(f"Shared cache unavailable for {key}: {str(error)}")
+        return compute()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "computed": self.computed,
+            "waited_for_other_worker": self.waited,
+            "errors": self.errors,
+        }
+
+
+class SignalRelay:
+    """Latest results and push messages shared by every API worker.
+
+    `publish` reaches the other workers only; each one hands what it receives
+    to `deliver(topic, message)` on the relay's listener thread. `claim_push`
+    makes sure a new signal is pushed by one worker, not by every worker that
+    analyzes the same bar. Backend failures are logged and counted, never
+    raised into requests.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.origin = uuid.uuid4().hex
+        self.relayed = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, topic: str, result: dict):
+        try:
+            self.backend.set_latest(topic, encode_json(result))
+        except Exception as e:
+            self._error("store the latest result", e)
+
+    def latest(self) -> dict:
+        """topic -> latest result recorded by any worker (raises when the backend is down)"""
+        return {topic: decode_json(v) for topic, v in self.backend.get_latest().items()}
+
+    def claim_push(self, topic: str, bar_time: int, direction: str) -> bool:
+        """True for the first worker to report this (bar, direction) for a topic, and
+        not for an older bar; True when the backend is down so signals still go out"""
+        try:
+            return self.backend.claim_push(topic, int(bar_time or 0), str(direction))
+        except Exception as e:
+            self._error("claim a push", e)
+            return True
+
+    def publish(self, topic: str, message):
+        try:
+            self.backend.publish(json.dumps({"origin": self.origin, "topic": topic, "data": message},
+                                            default=str).encode())
+        except Exception as e:
+            self._error("relay a message", e)
+
+    def start(self, deliver, timeout: float = 5.0):
+        """Start the listener thread; returns once it receives messages (or after timeout)"""
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(deliver, ready), name="signal-relay",
+                                        daemon=True)
+        self._thread.start()
+        ready.wait(timeout)
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, deliver, ready: threading.Event):
+        def on_message(blob):
+            msg = json.loads(blob)
+            if msg["origin"] != self.origin:
+                self.relayed += 1
+                deliver(msg["topic"], msg["data"])
+
+        while not self._stop.is_set():
+            try:
+                self.backend.listen(self._stop, on_message, ready)
+            except Exception as e:
+                self._error("receive relayed messages", e)
+                self._stop.wait(1.0)
+
+    def _error(self, action: str, error):
+        self.errors += 1
+        logger.error(f"Shared cache failed to {action}: {str(error)}")
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__, "relayed_from_other_workers": self.relayed,
+                "errors": self.errors}
+
+
+def cache_from_url(url: str):
+    """SharedCache for a 'redis://' or 'sqlite:///path' URL; None for an empty URL"""
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return SharedCache(RedisBackend(url))
+    if url.startswith("sqlite:///"):
+        return SharedCache(SQLiteBackend(url[len("sqlite:///"):]))
+    raise ValueError(f"Unsupported shared cache URL '{url}' (use redis:// or sqlite:///)")
+
+
+# Value codecs
+
+_BARS_HEADER = struct.Struct("<dQ8s")  # fetched_at, bar count, price dtype
+
+
+def encode_bars(value: tuple) -> bytes:
+    """(fetched_at, Bars) as a fixed header plus the raw column buffers"""
+    fetched_at, bars = value
+    header = _BARS_HEADER.pack(fetched_at, len(bars), bars.close.dtype.str.encode())
+    prices = np.stack([bars.open, bars.high, bars.low, bars.close])
+    return header + np.ascontiguousarray(bars.time, dtype=np.int64).tobytes() + prices.tobytes()
+
+
+def decode_bars(blob: bytes) -> tuple:
+    fetched_at, n, dtype = _BARS_HEADER.unpack_from(blob)
+    dtype = np.dtype(dtype.rstrip(b"\0").decode())
+    offset = _BARS_HEADER.size
+    times = np.frombuffer(blob, dtype=np.int64, count=n, offset=offset)
+    prices = np.frombuffer(blob, dtype=dtype, count=4 * n, offset=offset + 8 * n).reshape(4, n)
+    return fetched_at, Bars(times, *prices, dtype=dtype)
+
+
+def encode_json(value) -> bytes:
+    return json.dumps(value, default=float).encode()
+
+
+def decode_json(blob: bytes):
+    return json.loads(blob)
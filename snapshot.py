@@ -0,0 +1,99 @@
+"""Warm-start snapshot of the API's in-memory state.
+
+On shutdown the API writes the bar cache (`core.BAR_CACHE`), the pivot cache
+and the latest analysis result per pair/timeframe (with its indicator
+summary) to one compressed .npz file. Bar arrays are stored natively and
+everything else as a JSON blob, so loading needs no pickle. On startup a
+recent enough snapshot is loaded back so the first requests after a deploy
+hit warm caches instead of the data source. Recency is checked twice: the
+snapshot's `saved_at`, and the newest bar of every cached series and signal,
+which must still be forming or have closed within `max_age` seconds - a
+snapshot written by a harness or replay over old bars is skipped series by
+series.
+"""
+import json
+import os
+import time
+
+import core
+import patterns
+from bars import Bars
+from lazy import lazy_import
+from streaming import TF_SECONDS
+
+np = lazy_import("numpy")
+
+SNAPSHOT_VERSION = 2
+BAR_FIELDS = ("time", "open", "high", "low", "close")
+
+
+def save(path: str, signals: dict) -> dict:
+    """Write the snapshot atomically; returns counts and size"""
+    arrays = {}
+    bar_meta = []
+    for i, (key, (fetched_at, bars)) in enumerate(list(core.BAR_CACHE.items())):
+        for field in BAR_FIELDS:
+            arrays[f"b{i}_{field}"] = getattr(bars, field)
+        bar_meta.append({"key": list(key), "fetched_at": fetched_at})
+    pivots = [[pair, tf, kind, start, levels]
+              for (pair, tf, kind), (start, levels) in list(patterns.PIVOT_CACHE.items())]
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "bars": bar_meta,
+        "pivots": pivots,
+        "signals": signals,
+    }
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, path)
+    return {"bars": len(bar_meta), "signals": len(signals), "bytes": os.path.getsize(path)}
+
+
+def _bars_fresh(tf: str, last_time, now: float, max_age: float) -> bool:
+    # The newest bar is still forming, or closed no more than max_age ago
+    return last_time is not None and now - last_time <= TF_SECONDS.get(tf.lower(), 0) + max_age
+
+
+def load(path: str, max_age: float) -> tuple:
+    """Restore caches from a snapshot no older than max_age seconds.
+
+    Returns (signals, stats). Restored bars count as freshly fetched, so they
+    are served for one cache TTL after startup and then refreshed as usual.
+    """
+    if not os.path.exists(path):
+        return {}, {"restored": False, "reason": "no snapshot"}
+    with np.load(path) as data:
+        meta = json.loads(bytes(data["meta"]).decode())
+        now = time.time()
+        age = now - meta.get("saved_at", 0)
+        if meta.get("version") != SNAPSHOT_VERSION:
+            return {}, {"restored": False, "reason": "version mismatch"}
+        if age > max_age:
+            return {}, {"restored": False, "reason": "stale", "age_seconds": round(age, 1)}
+        restored = set()
+        for i, m in enumerate(meta["bars"]):
+            pair, tf = m["key"][0], m["key"][1]
+            times = data[f"b{i}_time"]
+            if not _bars_fresh(tf, int(times[-1]) if len(times) else None, now, max_age):
+                continue
+            cols = [times] + [data[f"b{i}_{field}"] for field in BAR_FIELDS[1:]]
+            core.cache_bars(tuple(m["key"]), now, Bars(*cols, dtype=cols[-1].dtype))
+            restored.add((pair, tf))
+    for pair, tf, kind, start, levels in meta["pivots"]:
+        if (pair, tf) in restored:
+            patterns.PIVOT_CACHE[(pair, tf, kind)] = (start, levels)
+    signals = {topic: result for topic, result in meta["signals"].items()
+               if _bars_fresh(result.get("timeframe", ""), result.get("bar_time"), now, max_age)}
+    return signals, {
+        "restored": True,
+        "age_seconds": round(age, 1),
+        "bars": len(restored),
+        "stale_bars": len(meta["bars"]) - len(restored),
+        "signals": len(signals),
+        "stale_signals": len(meta["signals"]) - len(signals),
+    }
@@ -0,0 +1,392 @@
+"""Streaming quote ingestion with ring-buffer bar aggregation.
+
+A `QuoteFeed` yields ticks; `BarAggregator` folds them into bars for every
+timeframe and keeps the closed bars of each pair/timeframe in a fixed-size
+`RingBars`. When a bar closes, `StreamingPipeline` runs `core.analyze_bars`
+on a copy of that ring in the default executor, off the event loop, and hands
+the result to its listeners there, so the signal is ready milliseconds after
+the close instead of after the next poll. Closes of one pair/timeframe are
+analyzed in order; at most `MAX_PENDING` analyses are queued before the feed
+is paused.
+
+Feeds:
+  ReplayFeed     - CSV/JSONL tick file, as fast as possible or at N x real time
+  WebSocketFeed  - JSON ticks from a WebSocket (needs the `websockets` package),
+                   reconnecting with jittered exponential backoff
+
+Run a replay from the command line:
+  python streaming.py --replay ticks.csv --speed 0
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import random
+import time
+from collections import deque
+
+import core
+from bars import Bars
+from lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+TF_SECONDS = {"5m": 300, "15m": 900, "4h": 14400}
+RING_CAPACITY = 1000
+MAX_PENDING = 64  # queued bar-close analyses before the feed is paused
+
+
+class Tick:
+    __slots__ = ("pair", "time", "price")
+
+    def __init__(self, pair: str, time: float, price: float):
+        self.pair = pair
+        self.time = time    # epoch seconds
+        self.price = price  # mid price
+
+    @classmethod
+    def from_record(cls, rec: dict) -> "Tick":
+        if rec.get("price") not in (None, ""):
+            price = float(rec["price"])
+        else:
+            price = (float(rec["bid"]) + float(rec["ask"])) / 2
+        return cls(rec["pair"].upper(), float(rec["time"]), price)
+
+
+class QuoteFeed:
+    """Base class for tick sources; subclasses implement `ticks()`"""
+    live = False  # live feeds close bars on the wall clock as well as on ticks
+
+    async def ticks(self):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+
+class ReplayFeed(QuoteFeed):
+    """Ticks from a CSV (pair,time,price or pair,time,bid,ask) or JSONL file.
+
+    speed=0 replays as fast as possible; speed=N sleeps so that N seconds of
+    tick time pass per second of wall time.
+    """
+
+    def __init__(self, path: str, speed: float = 0.0):
+        self.path = path
+        self.speed = speed
+
+    def _records(self):
+        with open(self.path, newline="") as f:
+            if self.path.endswith((".jsonl", ".json")):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from csv.DictReader(f)
+
+    async def ticks(self):
+        first_tick = first_wall = None
+        for n, rec in enumerate(self._records()):
+            tick = Tick.from_record(rec)
+            if self.speed > 0:
+                if first_tick is None:
+                    first_tick, first_wall = tick.time, time.monotonic()
+                delay = (tick.time - first_tick) / self.speed - (time.monotonic() - first_wall)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif n % 1000 == 0:
+                await asyncio.sleep(0)  # let other tasks run during long replays
+            yield tick
+
+
+class WebSocketFeed(QuoteFeed):
+    """JSON ticks ({"pair", "time", "price"} or bid/ask) from a WebSocket URL.
+
+    A dropped or refused connection is retried after a delay that doubles from
+    `min_backoff` up to `max_backoff` (with jitter) and resets once connected;
+    malformed messages are logged and skipped.
+    """
+    live = True
+
+    def __init__(self, url: str, min_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.url = url
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connects = 0
+
+    async def ticks(self):
+        try:
+            import websockets
+        except ImportError:
+            raise RuntimeError("WebSocketFeed requires the 'websockets' package")
+        delay = self.min_backoff
+        while True:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    self.connects += 1
+                    delay = self.min_backoff
+                    logger.info(f"Connected to tick feed {self.url}")
+                    async for message in ws:
+                        try:
+                            data = json.loads(message)
+                            ticks = [Tick.from_record(rec) for rec in (data if isinstance(data, list) else [data])]
+                        except (ValueError, KeyError, TypeError, AttributeError) as e:
+                            logger.warning(f"Skipping malformed tick message: {e}")
+                            continue
+                        for tick in ticks:
+                            yield tick
+                logger.warning(f"Tick feed {self.url} closed the connection")
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                logger.warning(f"Tick feed {self.url} unavailable: {e}")
+            wait = delay * random.uniform(0.5, 1.0)
+            logger.info(f"Reconnecting to {self.url} in {wait:.1f}s")
+            await asyncio.sleep(wait)
+            delay = min(delay * 2, self.max_backoff)
+
+
+class RingBars:
+    """Fixed-size ring buffer of closed bars for one pair/timeframe"""
+    __slots__ = ("capacity", "count", "head", "time", "open", "high", "low", "close")
+
+    def __init__(self, capacity: int = RING_CAPACITY, dtype=core.BAR_DTYPE):
+        self.capacity = capacity
+        self.count = 0
+        self.head = 0  # next write position
+        self.time = np.zeros(capacity, dtype=np.int64)
+        self.open = np.zeros(capacity, dtype=dtype)
+        self.high = np.zeros(capacity, dtype=dtype)
+        self.low = np.zeros(capacity, dtype=dtype)
+        self.close = np.zeros(capacity, dtype=dtype)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def push(self, t: int, o: float, h: float, l: float, c: float):
+        i = self.head
+        self.time[i] = t
+        self.open[i] = o
+        self.high[i] = h
+        self.low[i] = l
+        self.close[i] = c
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def extend(self, bars: Bars):
+        for i in range(max(0, len(bars) - self.capacity), len(bars)):
+            self.push(int(bars.time[i]), bars.open[i], bars.high[i], bars.low[i], bars.close[i])
+
+    def update_last(self, h: float, l: float, c: float):
+        """Fold a later view of the newest bar into it (the open stays)"""
+        i = self.head - 1
+        self.high[i] = max(self.high[i], h)
+        self.low[i] = min(self.low[i], l)
+        self.close[i] = c
+
+    def last_time(self):
+        return int(self.time[self.head - 1]) if self.count else None
+
+    def to_bars(self) -> Bars:
+        """Copy of the closed bars in chronological order"""
+        if self.count < self.capacity:
+            order = np.arange(self.count)
+        else:
+            order = np.r_[self.head:self.capacity, 0:self.head]
+        return Bars(self.time[order], self.open[order], self.high[order], self.low[order],
+                    self.close[order], dtype=self.close.dtype)
+
+
+class _FormingBar:
+    __slots__ = ("start", "open", "high", "low", "close")
+
+    def __init__(self, start: int, price: float):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+
+
+class BarAggregator:
+    """Folds ticks into bars for every timeframe and calls on_close(pair, tf, ring)"""
+
+    def __init__(self, timeframes: list, on_close, capacity: int = RING_CAPACITY):
+        self.timeframes = [(tf, TF_SECONDS[tf.lower()]) for tf in timeframes]
+        self.on_close = on_close
+        self.capacity = capacity
+        self.rings = {}    # (pair, tf) -> RingBars
+        self.forming = {}  # (pair, tf) -> _FormingBar
+
+    def ring(self, pair: str, tf: str) -> RingBars:
+        key = (pair, tf)
+        ring = self.rings.get(key)
+        if ring is None:
+            ring = self.rings[key] = RingBars(self.capacity)
+        return ring
+
+    def seed(self, pair: str, tf: str, bars: Bars):
+        """Preload history so analysis can run from the first closed bar"""
+        self.ring(pair, tf).extend(bars)
+
+    def on_tick(self, tick: Tick):
+        for tf, secs in self.timeframes:
+            key = (tick.pair, tf)
+            start = int(tick.time) - int(tick.time) % secs
+            bar = self.forming.get(key)
+            if bar is None or start > bar.start:
+                if bar is not None:
+                    self._close(key, bar)
+                self.forming[key] = _FormingBar(start, tick.price)
+            elif start == bar.start:
+                p = tick.price
+                if p > bar.high:
+                    bar.high = p
+                elif p < bar.low:
+                    bar.low = p
+                bar.close = p
+            # ticks older than the forming bar are late and dropped
+
+    def close_due(self, now: float):
+        """Close forming bars whose period has ended (live feeds with sparse ticks)"""
+        for (pair, tf), bar in list(self.forming.items()):
+            if now >= bar.start + TF_SECONDS[tf.lower()]:
+                del self.forming[(pair, tf)]
+                self._close((pair, tf), bar)
+
+    def next_close(self):
+        if not self.forming:
+            return None
+        return min(bar.start + TF_SECONDS[tf.lower()] for (_, tf), bar in self.forming.items())
+
+    def _close(self, key: tuple, bar: _FormingBar):
+        ring = self.ring(*key)
+        last = ring.last_time()
+        if last is not None and bar.start < last:
+            return  # older than the seeded history
+        if bar.start == last:
+            # Seeded history ends with this bar, fetched while it was still forming
+            ring.update_last(bar.high, bar.low, bar.close)
+        else:
+            ring.push(bar.start, bar.open, bar.high, bar.low, bar.close)
+        self.on_close(key[0], key[1], ring)
+
+
+class StreamingPipeline:
+    """Runs analysis the moment a bar closes and fans results out to listeners"""
+
+    def __init__(self, feed: QuoteFeed, cfg: dict, timeframes: list = None,
+                 capacity: int = RING_CAPACITY):
+        self.feed = feed
+        self.cfg = cfg
+        self.aggregator = BarAggregator(timeframes or cfg["timeframes"], self._on_close, capacity)
+        self.listeners = []  # callables taking (result dict, bars)
+        self.latencies_ms = deque(maxlen=1000)
+        self.signals = 0
+        self.ticks = 0
+        self._pending = set()  # analysis tasks not finished yet
+        self._last_task = {}   # (pair, tf) -> latest analysis task, to keep closes in order
+
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    def seed_from_history(self, pairs: list):
+        for pair in pairs:
+            for tf, _ in self.aggregator.timeframes:
+                try:
+                    self.aggregator.seed(pair.upper(), tf, core.get_bars(pair, tf))
+                except Exception as e:
+                    logger.warning(f"Could not seed {pair} {tf}: {e}")
+
+    def _on_close(self, pair: str, tf: str, ring: RingBars):
+        # The ring keeps changing while the executor works, so analyze a copy
+        key = (pair, tf)
+        task = asyncio.get_running_loop().create_task(
+            self._analyze(pair, tf, ring.to_bars(), time.perf_counter(), self._last_task.get(key)))
+        self._last_task[key] = task
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _analyze(self, pair: str, tf: str, bars: Bars, started: float, previous):
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        await asyncio.get_running_loop().run_in_executor(None, self._process, pair, tf, bars, started)
+
+    def _process(self, pair: str, tf: str, bars: Bars, started: float):
+        try:
+            result = core.analyze_bars(pair, tf, bars, self.cfg)
+        except Exception as e:
+            logger.error(f"Streaming analysis failed for {pair} {tf}: {e}")
+            return
+        if "error" in result:
+            return
+        self.latencies_ms.append((time.perf_counter() - started) * 1000)
+        self.signals += 1
+        for fn in self.listeners:
+            try:
+                fn(result, bars)
+            except Exception as e:
+                logger.error(f"Streaming listener failed: {e}")
+
+    async def _clock(self):
+        while True:
+            due = self.aggregator.next_close()
+            delay = 1.0 if due is None else max(0.0, due - time.time())
+            await asyncio.sleep(delay)
+            self.aggregator.close_due(time.time())
+
+    async def run(self):
+        clock = asyncio.create_task(self._clock()) if self.feed.live else None
+        try:
+            async for tick in self.feed.ticks():
+                self.ticks += 1
+                self.aggregator.on_tick(tick)
+                if len(self._pending) >= MAX_PENDING:
+                    await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+            if self._pending:
+                await asyncio.wait(self._pending)
+        finally:
+            if clock is not None:
+                clock.cancel()
+            for task in self._pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        lat = sorted(self.latencies_ms)
+        pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 3) if lat else None
+        return {
+            "ticks": self.ticks,
+            "signals": self.signals,
+            "close_to_signal_ms": {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)},
+            "open_bars": len(self.aggregator.forming),
+            "pending_analyses": len(self._pending),
+        }
+
+
+def feed_from_spec(spec: str, speed: float = 0.0) -> QuoteFeed:
+    """'ws://...' / 'wss://...' for a WebSocket, anything else is a replay file"""
+    if spec.startswith(("ws://", "wss://")):
+        return WebSocketFeed(spec)
+    return ReplayFeed(spec, speed)
+
+
+def main():
+    from config import cfg
+
+    parser = argparse.ArgumentParser(description="Stream ticks into bars and analyze on bar close")
+    parser.add_argument("--replay", help="tick file (CSV or JSONL)")
+    parser.add_argument("--ws", help="WebSocket URL of a tick feed")
+    parser.add_argument("--speed", type=float, default=0.0, help="replay speed multiple, 0 = max")
+    parser.add_argument("--seed", action="store_true", help="preload history via core.get_bars")
+    args = parser.parse_args()
+    if not (args.replay or args.ws):
+        parser.error("one of --replay or --ws is required")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    pipeline = StreamingPipeline(feed_from_spec(args.ws or args.replay, args.speed), cfg)
+    if args.seed:
+        pipeline.seed_from_history(cfg["pairs"])
+    pipeline.add_listener(lambda r, _: r["direction"] in ("BUY", "SELL") and print(
+        f"{r['pair']} {r['timeframe']} {r['direction']} @ {r['entry']} conf {r['confidence']}"))
+    asyncio.run(pipeline.run())
+    print(json.dumps(pipeline.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import core
+import loadtest
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = loadtest.create_app()
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def frames(monkeypatch):
+    """Bars served per pair; tests move a pair's last bar to simulate a price update"""
+    frames = {}
+    def source(pair, tf, lookback="7d"):
+        if pair not in frames:
+            frames[pair] = loadtest.synthetic_source(pair, tf)
+        return frames[pair]
+    monkeypatch.setattr(core, "BAR_SOURCE", source)
+    monkeypatch.setattr(core, "BAR_CACHE_TTL", 0.0)
+    return frames
+
+
+def tick(frames, pair):
+    df = frames[pair].copy()
+    df.iloc[-1, df.columns.get_loc("Close")] += 0.0001
+    df.iloc[-1, df.columns.get_loc("High")] = df["Close"].iloc[-1] + 0.001
+    frames[pair] = df
+
+
+def test_single_pair_etag(client, frames):
+    first = client.get("/analyze/EURUSD/5m")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    again = client.get("/analyze/EURUSD/5m", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["ETag"] == etag
+    strong = client.get("/analyze/EURUSD/5m", headers={"If-None-Match": etag[2:]})
+    assert strong.status_code == 304
+
+    tick(frames, "EURUSD")
+    changed = client.get("/analyze/EURUSD/5m", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+def test_combined_etag(client, frames):
+    first = client.get("/analyze", params={"pairs": "EURUSD,GBPUSD", "tf": "5m"})
+    assert first.status_code == 200
+    body = first.json()
+    tags = {r["pair"]: r["etag"] for r in body["results"]}
+    assert set(tags) == {"EURUSD", "GBPUSD"} and body["unchanged"] == []
+    combined = first.headers["ETag"]
+
+    same = client.get("/analyze", params={"pairs": "EURUSD,GBPUSD", "tf": "5m"},
+                      headers={"If-None-Match": combined})
+    assert same.status_code == 304 and same.headers["ETag"] == combined
+    per_pair = client.get("/analyze", params={"pairs": "EURUSD,GBPUSD", "tf": "5m"},
+                          headers={"If-None-Match": ", ".join(tags.values())})
+    assert per_pair.status_code == 304
+
+    tick(frames, "GBPUSD")
+    partial = client.get("/analyze", params={"pairs": "EURUSD,GBPUSD", "tf": "5m"},
+                         headers={"If-None-Match": ", ".join(tags.values())})
+    assert partial.status_code == 200 and partial.headers["ETag"] != combined
+    body = partial.json()
+    assert body["unchanged"] == ["EURUSD"]
+    fresh = {r["pair"]: r["etag"] for r in body["results"]}
+    assert fresh["GBPUSD"] != tags["GBPUSD"]
+
+
+def test_sse_subscribes_only_while_streaming(client):
+    import api
+    async def scenario():
+        before = api.signal_hub.subscriber_count()
+        # A client that disconnects before the body starts leaves nothing behind
+        await api.sse_signals("EURUSD:5m")
+        assert api.signal_hub.subscriber_count() == before
+
+        response = await api.sse_signals("EURUSD:5m")
+        first = asyncio.ensure_future(response.body_iterator.__anext__())
+        await asyncio.sleep(0)
+        assert api.signal_hub.subscriber_count() == before + 1
+        first.cancel()  # the client goes away while waiting for a signal
+        await asyncio.gather(first, return_exceptions=True)
+        assert api.signal_hub.subscriber_count() == before
+    asyncio.run(scenario())
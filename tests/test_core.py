@@ -0,0 +1,14 @@
+import numpy as np
+
+import core
+import loadtest
+from bars import Bars
+
+
+def test_score_series_matches_score_signal_bar_by_bar():
+    bars = Bars.from_frame(loadtest.synthetic_source("EURUSD", "5m"))[:400]
+    series = core.score_series(bars)
+    assert len(series) == len(bars)
+    for i in range(30, len(bars), 9):
+        assert series[i] == core.score_signal(bars[:i + 1]).score, i
+    assert np.count_nonzero(series[30:]), "the history should produce non-zero scores"
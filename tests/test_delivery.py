@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import delivery
+from delivery import DeliveryStore, DeliveryWorker, PermanentDeliveryError
+
+
+def queue(n=3):
+    store = DeliveryStore()
+    store.enqueue([f"chat{i}" for i in range(n)], "hello")
+    return store
+
+
+def test_claimed_rows_are_leased_until_acked_or_expired():
+    store = queue()
+    rows = store.claim(limit=2, lease=60)
+    assert [r[1] for r in rows] == ["chat0", "chat1"]
+    assert [r[1] for r in store.claim(lease=60)] == ["chat2"]
+    assert store.claim() == []
+
+    store.ack(rows[0][0])
+    assert store.pending() == 2
+
+    expired = queue(1)
+    first = expired.claim(lease=0)
+    again = expired.claim(lease=60)
+    assert [r[0] for r in again] == [r[0] for r in first]
+
+
+def test_retry_backs_off_and_gives_up_after_max_attempts():
+    store = queue(1)
+    (delivery_id, *_), = store.claim()
+    before = time.time()
+    store.retry(delivery_id, 3, max_attempts=4)
+    assert store.claim() == []
+    next_attempt, attempts = store._db.execute(
+        "SELECT next_attempt, attempts FROM deliveries WHERE id = ?", (delivery_id,)).fetchone()
+    assert attempts == 3 and next_attempt >= before + 2 ** 3
+
+    store.retry(delivery_id, 4, max_attempts=4)
+    assert store.stats()["pending"] == 0 and store.stats()["failed"] == 1
+
+
+def test_worker_acks_retries_and_dead_letters():
+    store = queue(3)
+    async def send(message, parse_mode, chat_id):
+        if chat_id == "chat1":
+            return False
+        if chat_id == "chat2":
+            raise PermanentDeliveryError("chat not found")
+        return True
+
+    worker = DeliveryWorker(store, send, rate=0)
+    asyncio.run(worker.drain())
+    assert (worker.sent, worker.failed, worker.dead_lettered) == (1, 1, 1)
+    stats = store.stats()
+    assert stats["pending"] == 1 and stats["failed"] == 1
+    assert [r[1] for r in store._db.execute(
+        "SELECT id, chat_id FROM deliveries WHERE failed = 0 AND attempts = 1")] == ["chat1"]
+
+
+def test_claims_fit_the_rate_limit_within_a_lease():
+    assert DeliveryWorker(queue(1), None, rate=25.0).claim_limit() == delivery.CLAIM_BATCH
+    assert DeliveryWorker(queue(1), None, rate=2.0, lease=10.0).claim_limit() == 10
+    assert DeliveryWorker(queue(1), None, rate=0.01, lease=10.0).claim_limit() == 1
+
+
+def test_slow_sends_renew_the_lease_instead_of_sending_twice():
+    store = queue(4)
+    sent = []
+    async def send(message, parse_mode, chat_id):
+        sent.append(chat_id)
+        await asyncio.sleep(0.15)
+        return True
+
+    # One slot and a short lease: the last rows start after their claim has expired
+    worker = DeliveryWorker(store, send, rate=0, per_chat_interval=0, concurrency=1, lease=0.2)
+    asyncio.run(worker.drain())
+    assert sorted(sent) == ["chat0", "chat1", "chat2", "chat3"]
+    assert store.pending() == 0
@@ -0,0 +1,45 @@
+import numpy as np
+
+import loadtest
+from bars import Bars
+from feature_store import FeatureStore, feature_rows
+
+
+def history(n=600):
+    return Bars.from_frame(loadtest.synthetic_source("EURUSD", "5m"), dtype="float32")[:n]
+
+
+def test_incremental_update_matches_a_full_build(tmp_path):
+    bars = history()
+    store = FeatureStore(str(tmp_path), horizon=12)
+    assert store.update("EURUSD", "5m", bars[:400]) == 400
+    assert store.update("EURUSD", "5m", bars) == 200
+    assert store.update("EURUSD", "5m", bars) == 0
+
+    fs = store.open("EURUSD", "5m")
+    X, _ = feature_rows(bars)
+    assert len(fs) == 600 and np.array_equal(np.asarray(fs.time), bars.time)
+    assert np.array_equal(np.asarray(fs.X), X)
+
+
+def test_update_rewrites_the_stored_last_bar(tmp_path):
+    bars = history()
+    # The first fetch ended on a bar that was still forming: lower high, other close
+    high, close = bars.high[:400].copy(), bars.close[:400].copy()
+    high[-1] = close[-1] = bars.open[399]
+    forming = Bars(bars.time[:400], bars.open[:400], high, bars.low[:400], close, dtype="float32")
+    assert (forming.high[-1], forming.close[-1]) != (bars.high[399], bars.close[399])
+    store = FeatureStore(str(tmp_path), horizon=12)
+    store.update("EURUSD", "5m", forming)
+
+    assert store.update("EURUSD", "5m", bars[:401]) == 1
+
+    fs = store.open("EURUSD", "5m")
+    assert len(fs) == 401 and fs.meta["last_time"] == int(bars.time[400])
+    assert np.array_equal(np.asarray(fs.ohlc[399]),
+                          [bars.open[399], bars.high[399], bars.low[399], bars.close[399]])
+    fresh = FeatureStore(str(tmp_path / "fresh"), horizon=12)
+    fresh.update("EURUSD", "5m", bars[:401])
+    rebuilt = fresh.open("EURUSD", "5m")
+    assert np.array_equal(np.asarray(fs.X), np.asarray(rebuilt.X))
+    assert np.array_equal(np.asarray(fs.labels), np.asarray(rebuilt.labels))
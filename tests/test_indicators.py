@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+import loadtest
+from bars import Bars
+from indicators import compute_indicators
+
+
+def baseline(df):
+    """The original pandas implementation the NumPy kernels replaced"""
+    close, high, low = df["Close"], df["High"], df["Low"]
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    rs = gain / loss.replace(0, np.nan)
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    signal = macd.ewm(span=9, adjust=False).mean()
+    prev = close.shift()
+    tr = pd.concat([high - low, (high - prev).abs(), (low - prev).abs()], axis=1).max(axis=1)
+    mid = close.rolling(20).mean()
+    std = close.rolling(20).std(ddof=0)
+    return {
+        "rsi": 100 - 100 / (1 + rs),
+        "macd": macd, "macd_signal": signal, "macd_hist": macd - signal,
+        "ema20": close.ewm(span=20, adjust=False).mean(),
+        "ema50": close.ewm(span=50, adjust=False).mean(),
+        "ema200": close.ewm(span=200, adjust=False).mean(),
+        "atr": tr.rolling(14).mean(),
+        "sma20": mid, "sma50": close.rolling(50).mean(),
+        "bb_upper": mid + 2 * std, "bb_mid": mid, "bb_lower": mid - 2 * std,
+    }
+
+
+def test_indicators_match_the_pandas_baseline():
+    df = loadtest.synthetic_source("EURUSD", "5m")[:800]
+    ind = compute_indicators(Bars.from_frame(df, dtype="float64"))
+    for name, expected in baseline(df).items():
+        np.testing.assert_allclose(getattr(ind, name), expected.to_numpy(), rtol=1e-9, atol=1e-12,
+                                   equal_nan=True, err_msg=name)
+
+
+def test_flat_prices_have_no_rsi():
+    df = loadtest.synthetic_source("EURUSD", "5m")[:60].copy()
+    df[["Open", "High", "Low", "Close"]] = 1.1
+    ind = compute_indicators(Bars.from_frame(df, dtype="float64"))
+    assert np.isnan(ind.rsi).all()
+    assert np.allclose(ind.atr[13:], 0)
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_api_loads_no_heavy_dependency(tmp_path):
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); import api; "
+            "print(','.join(m for m in ('numpy', 'scipy', 'pandas', 'yfinance') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code, ROOT], cwd=tmp_path,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_lazy_submodule_resolves_on_first_access():
+    from lazy import lazy_import
+
+    signal = lazy_import("scipy.signal")
+    assert callable(signal.lfilter)
@@ -0,0 +1,129 @@
+import json
+
+from bars import Bars
+from paper import PaperEngine, PaperInbox
+
+T0 = 1704067200
+STEP = 300
+
+
+def bars(highs, lows, start=T0):
+    times = [start + i * STEP for i in range(len(highs))]
+    mids = [(h + l) / 2 for h, l in zip(highs, lows)]
+    return Bars(times, mids, highs, lows, mids)
+
+
+def test_bar_only_pops_positions_whose_level_it_crossed():
+    engine = PaperEngine()
+    near = engine.open("EURUSD", "5m", "BUY", 1.1000, 1.0950, 1.1010, T0)
+    engine.books[("EURUSD", "5m")].last_open = None  # allow several positions on one bar
+    far = engine.open("EURUSD", "5m", "BUY", 1.1000, 1.0950, 1.1050, T0)
+    engine.books[("EURUSD", "5m")].last_open = None
+    short = engine.open("EURUSD", "5m", "SELL", 1.1000, 1.1060, 1.0950, T0)
+
+    closed = engine.on_bar("EURUSD", "5m", T0 + STEP, 1.1020, 1.0990)
+
+    assert [p.id for p in closed] == [near.id]
+    assert near.outcome == "tp" and near.closed_at == T0 + STEP and near.pnl_pips == 10.0
+    assert set(engine.positions) == {far.id, short.id}
+    book = engine.books[("EURUSD", "5m")]
+    assert book.long_tp[0] == (1.1050, far.id)  # the untouched target is next in line
+    assert book.stale == 1                      # near's stop entry is dropped lazily
+
+
+def test_bar_crossing_stop_and_target_closes_at_the_stop():
+    engine = PaperEngine()
+    long = engine.open("EURUSD", "5m", "BUY", 1.1000, 1.0990, 1.1010, T0)
+    short = engine.open("GBPUSD", "5m", "SELL", 1.3000, 1.3010, 1.2990, T0)
+
+    engine.on_bar("EURUSD", "5m", T0 + STEP, 1.1020, 1.0980)
+    engine.on_bar("GBPUSD", "5m", T0 + STEP, 1.3020, 1.2980)
+
+    assert (long.outcome, long.exit_price, long.pnl_pips) == ("sl", 1.0990, -10.0)
+    assert (short.outcome, short.exit_price, short.pnl_pips) == ("sl", 1.3010, -10.0)
+    assert engine.summary()["losses"] == 2
+
+
+def test_repeated_signal_for_a_bar_opens_one_position():
+    engine = PaperEngine()
+    signal = {"pair": "EURUSD", "timeframe": "5m", "direction": "BUY", "entry": 1.1,
+              "stop_loss": 1.099, "take_profit": 1.101, "bar_time": T0 + STEP}
+
+    assert engine.open_from_signal(signal) is not None
+    assert engine.open_from_signal(signal) is None
+    assert engine.open_from_signal(dict(signal, bar_time=T0)) is None          # older bar
+    assert engine.open_from_signal(dict(signal, timeframe="15m")) is not None  # own book
+    assert engine.open_from_signal(dict(signal, direction="NEUTRAL", bar_time=T0 + 2 * STEP)) is None
+    assert len(engine.positions) == 2
+
+
+def test_bars_missed_between_polls_are_replayed_once():
+    engine = PaperEngine()
+    pos = engine.open("EURUSD", "5m", "BUY", 1.1000, 1.0950, 1.1030, T0)
+    engine.on_bars("EURUSD", "5m", [T0], [1.1005], [1.0995])
+
+    # Next poll arrives five bars later; the target was hit on the third of them
+    history = bars([1.1005, 1.1010, 1.1020, 1.1035, 1.1010, 1.1000],
+                   [1.0995, 1.1000, 1.1005, 1.1020, 1.0960, 1.0990])
+    closed = engine.on_bars("EURUSD", "5m", history.time, history.high, history.low)
+
+    assert closed == [pos] and pos.closed_at == T0 + 3 * STEP and pos.outcome == "tp"
+
+    # A position opened on the last bar is not resolved by the history before it
+    later = engine.open("EURUSD", "5m", "SELL", 1.1000, 1.1010, 1.0980, T0 + 5 * STEP)
+    assert engine.on_bars("EURUSD", "5m", history.time, history.high, history.low) == []
+    assert later.is_open
+
+
+def test_journal_restores_state_without_a_snapshot(tmp_path):
+    path = str(tmp_path / "paper.json")
+    engine = PaperEngine(path, save_interval=3600)
+    engine.open("EURUSD", "5m", "BUY", 1.1000, 1.0950, 1.1010, T0)
+    engine.open("EURUSD", "5m", "SELL", 1.1000, 1.1050, 1.0990, T0 + STEP)
+    engine.on_bars("EURUSD", "5m", [T0 + STEP, T0 + 2 * STEP], [1.1005, 1.1015], [1.0995, 1.1000])
+
+    restored = PaperEngine(path)  # as after a crash: only the journal holds these events
+    assert restored.summary() == engine.summary()
+    assert restored.books[("EURUSD", "5m")].last_time == T0 + 2 * STEP
+    assert restored.open("EURUSD", "5m", "BUY", 1.1, 1.09, 1.11, T0 + STEP) is None
+
+    engine.save()
+    assert (tmp_path / "paper.json.journal").read_text() == ""
+    assert PaperEngine(path).summary() == engine.summary()
+
+
+def test_inbox_hands_results_and_new_bars_to_the_owner(tmp_path):
+    path = str(tmp_path / "paper.json.inbox")
+    worker, owner = PaperInbox(path), PaperInbox(path)
+    history = bars([1.1005, 1.1010, 1.1015], [1.0995, 1.1000, 1.1005])
+    signal = {"pair": "EURUSD", "timeframe": "5m", "direction": "BUY", "entry": 1.1,
+              "stop_loss": 1.095, "take_profit": 1.102, "bar_time": int(history.time[-1])}
+
+    assert worker.submit(signal, history)
+    assert not worker.submit(signal, history)  # nothing changed since
+    longer = bars([1.1005, 1.1010, 1.1015, 1.1025], [1.0995, 1.1000, 1.1005, 1.1010])
+    assert worker.submit(dict(signal, direction="NEUTRAL"), longer)
+
+    first, second = owner.drain()
+    assert first["time"] == [int(t) for t in history.time]
+    assert second["time"] == [int(t) for t in longer.time[-2:]]  # from the last bar handed over
+    assert owner.drain() == []
+
+    engine = PaperEngine()
+    for entry in (first, second):
+        r = entry["result"]
+        engine.on_bars(r["pair"], r["timeframe"], entry["time"], entry["high"], entry["low"])
+        engine.open_from_signal(r)
+    assert engine.summary()["wins"] == 1
+
+
+def test_inbox_is_emptied_once_drained_past_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr("paper.INBOX_COMPACT_BYTES", 1)
+    path = tmp_path / "inbox"
+    worker, owner = PaperInbox(str(path)), PaperInbox(str(path))
+    worker.submit({"pair": "EURUSD", "timeframe": "5m", "direction": "SELL"}, bars([1.1], [1.0]))
+
+    assert len(owner.drain()) == 1
+    assert path.read_bytes() == b"" and owner.offset == 0
+    worker.submit({"pair": "GBPUSD", "timeframe": "5m", "direction": "SELL"}, bars([1.3], [1.2]))
+    assert [json.loads(line)["result"]["pair"] for line in path.read_text().splitlines()] == ["GBPUSD"]
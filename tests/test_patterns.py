@@ -0,0 +1,21 @@
+import loadtest
+import patterns
+from bars import Bars
+from indicators import compute_indicators
+
+
+def test_detect_matches_the_recent_hits_of_a_full_scan():
+    bars = Bars.from_frame(loadtest.synthetic_source("EURUSD", "5m"))
+    seen = set()
+    for end in range(120, 900, 7):
+        window = bars[:end]
+        atr = compute_indicators(window).atr
+        latest = {}
+        for hit in patterns.scan(window, atr):
+            if hit.index >= end - patterns.RECENT_BARS:
+                latest[hit.name] = hit
+        got = patterns.detect(window, atr)
+        assert {h.name: (h.index, h.time, h.level) for h in got} == \
+            {h.name: (h.index, h.time, h.level) for h in latest.values()}
+        seen.update(latest)
+    assert seen, "the synthetic history should trigger some patterns"
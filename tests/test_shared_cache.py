@@ -0,0 +1,41 @@
+import threading
+
+from shared_cache import SignalRelay, SQLiteBackend
+
+
+def test_relay_shares_latest_results_and_forwards_messages_to_other_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    a, b = SignalRelay(SQLiteBackend(path)), SignalRelay(SQLiteBackend(path))
+    received = {"a": [], "b": []}
+    got = threading.Event()
+
+    def deliver(name):
+        def on_message(topic, message):
+            received[name].append((topic, message))
+            got.set()
+        return on_message
+
+    a.start(deliver("a"))
+    b.start(deliver("b"))
+    try:
+        a.record("EURUSD:5m", {"pair": "EURUSD", "direction": "BUY"})
+        assert b.latest() == {"EURUSD:5m": {"pair": "EURUSD", "direction": "BUY"}}
+
+        a.publish("EURUSD:5m", {"direction": "BUY"})
+        assert got.wait(5)
+        assert received == {"a": [], "b": [("EURUSD:5m", {"direction": "BUY"})]}
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_only_the_first_worker_claims_a_new_signal(tmp_path):
+    path = str(tmp_path / "shared.db")
+    a, b = SignalRelay(SQLiteBackend(path)), SignalRelay(SQLiteBackend(path))
+
+    assert a.claim_push("EURUSD:5m", 300, "BUY")
+    assert not b.claim_push("EURUSD:5m", 300, "BUY")
+    assert b.claim_push("EURUSD:5m", 300, "SELL")     # direction changed on the same bar
+    assert not a.claim_push("EURUSD:5m", 0, "BUY")    # a worker with stale bars
+    assert a.claim_push("EURUSD:5m", 600, "SELL")
+    assert a.claim_push("GBPUSD:5m", 300, "BUY")
@@ -0,0 +1,44 @@
+import asyncio
+import csv
+import random
+import threading
+import time
+
+import loadtest
+from bars import Bars
+from config import cfg
+from streaming import ReplayFeed, StreamingPipeline
+
+PAIRS = ("EURUSD", "GBPUSD")
+CLOSES = 12
+
+
+def test_replay_analyzes_every_close_in_order(tmp_path):
+    history = {p: Bars.from_frame(loadtest.synthetic_source(p, "5m"))[:300] for p in PAIRS}
+    start = int(history["EURUSD"].time[-1]) + 300
+    path = tmp_path / "ticks.csv"
+    with open(path, "w", newline="") as f:
+        out = csv.writer(f)
+        out.writerow(["pair", "time", "price"])
+        # One tick a minute per pair; the tick opening bar i + 1 closes bar i
+        for t in range(start, start + (CLOSES + 1) * 300, 60):
+            for pair in PAIRS:
+                out.writerow([pair, t, 1.1 + (t - start) * 1e-6])
+
+    pipeline = StreamingPipeline(ReplayFeed(str(path)), cfg, timeframes=["5m"])
+    for pair in PAIRS:
+        pipeline.aggregator.seed(pair, "5m", history[pair])
+    seen = {p: [] for p in PAIRS}
+    lock = threading.Lock()
+    rng = random.Random(7)
+
+    def listener(result, bars):
+        # Uneven work so later closes would overtake earlier ones without the per-key chain
+        time.sleep(rng.random() * 0.02)
+        with lock:
+            seen[result["pair"]].append(int(bars.time[-1]))
+
+    pipeline.add_listener(listener)
+    asyncio.run(pipeline.run())
+    for pair in PAIRS:
+        assert seen[pair] == [start + 300 * i for i in range(CLOSES)], pair